@@ -121,6 +121,7 @@ class Jmp(JumpCommand): name = "jmp"
 class Movsx(ASMCommandMultiSize): name = "movsx"
 class Movzx(ASMCommandMultiSize): name = "movzx"
 class Mov(ASMCommand): name = "mov"
+class Xchg(ASMCommand): name = "xchg"
 class BitwiseAnd(ASMCommand): name = "and"
 class Add(ASMCommand): name = "add"
 class Sub(ASMCommand): name = "sub"
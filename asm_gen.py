@@ -2,7 +2,13 @@
 
 from spots import Spot, RegSpot, MemSpot, LiteralSpot
 from il_cmds.control import DIRECT_VAL
+from flow import bits, get_basic_blocks, get_block_live_in
+import collections
+import csv
 import itertools
+import json
+import multiprocessing
+import time
 import asm_cmds
 import spots
 
@@ -67,9 +73,9 @@ class MASMCode(ASMCode):
         """
 
         names = []
-        names_len = len(DIRECT_VAL) / 2
+        names_len = len(DIRECT_VAL)
         if self.string_exist:
-            for name in DIRECT_VAL[-int(names_len):]:
+            for name in DIRECT_VAL:
                 self.add_res(name)
                 names.append(str(name))
 
@@ -106,133 +112,458 @@ class MASMCode(ASMCode):
         return "\n".join(header + footer)
 
 
+class SpillRequired(Exception):
+    """ Raised by get_reg when every register is taken at a command, so that a value would have to be spilled """
+    pass
+
+
 class NodeGraph:
-    """Graph storing conflict and preference information.
-        self.real_nodes - list of all real nodes in this graph.
-        self.all_nodes - list of all nodes in this graph, including precolored.
-        self.conf - dictionary mapping each node to nodes with which it has a conflict edge.
-        self.pref - dictionary mapping each node to nodes with which it has a preference edge.
-    The conflict and preference relations are symmetric.
+    """Graph storing conflict and preference information. Each node is given an integer ID when it is added to the
+    graph, and the edges are stored by ID.
+        self._nodes_by_id - list of the node with each ID.
+        self._ids - dictionary mapping each node ever added to this graph to its ID.
+        self._real_nodes - IDs of all real nodes in this graph, in the order they were added.
+        self._all_nodes - IDs of all nodes in this graph, including precolored, in the order they were added.
+        self._conf - list mapping each ID to a bitset of the IDs with which it has a conflict edge.
+        self._degree - list mapping each ID to the number of nodes with which it has a conflict edge.
+        self._pref - list mapping each ID to the IDs with which it has a preference edge, in the order the edges
+        were added, or None once the node is removed.
+    The conflict and preference relations are symmetric. The sets of IDs in this graph are dictionaries with None
+    values, so that they keep their order.
     """
 
     def __init__(self, nodes=None):
         """ Initialize NodeGraph """
-        self._real_nodes = nodes if nodes else []
-        self._all_nodes = self._real_nodes[:]
-        self._conf = {n: [] for n in self._all_nodes}
-        self._pref = {n: [] for n in self._all_nodes}
+        self._nodes_by_id = []
+        self._ids = {}
+        self._real_nodes = {}
+        self._all_nodes = {}
+        self._conf = []
+        self._degree = []
+        self._pref = []
+
+        for n in nodes or []:
+            self._real_nodes[self._add_node(n)] = None
+
+    def _add_node(self, n):
+        """ Add node n to the graph with no edges, and return its ID """
+        i = len(self._nodes_by_id)
+        self._nodes_by_id.append(n)
+        self._ids[n] = i
+        self._all_nodes[i] = None
+        self._conf.append(0)
+        self._degree.append(0)
+        self._pref.append({})
+        return i
+
+    def _members(self, ids):
+        """ Return the list of nodes with the given IDs """
+        return [self._nodes_by_id[i] for i in ids]
 
     def is_node(self, n):
         """ Check whether given node is in the graph """
-        return n in self._conf and n in self._pref
+        return self._ids.get(n) in self._all_nodes
 
     def add_imitation_node(self, v):
         """ Add a imitation node to graph """
-        self._all_nodes.append(v)
-        self._conf[v] = []
-        self._pref[v] = []
+        i = self._add_node(v)
 
         # Imitation nodes must mutually conflict
-        for n in self._all_nodes:
-            if n not in self._real_nodes and n != v: self.add_conflict(n, v)
+        for n in list(self._all_nodes):
+            if n not in self._real_nodes and n != i: self._add_conflict(n, i)
 
     def add_conflict(self, n1, n2):
         """ Add a conflict edge between n1 and n2 """
-        if n2 not in self._conf[n1]: self._conf[n1].append(n2)
-        if n1 not in self._conf[n2]: self._conf[n2].append(n1)
+        self._add_conflict(self._ids[n1], self._ids[n2])
+
+    def _add_conflict(self, i1, i2):
+        """ Add a conflict edge between the nodes with IDs i1 and i2 """
+        if not self._conf[i1] >> i2 & 1:
+            self._conf[i1] |= 1 << i2
+            self._degree[i1] += 1
+        if not self._conf[i2] >> i1 & 1:
+            self._conf[i2] |= 1 << i1
+            self._degree[i2] += 1
 
     def add_pref(self, n1, n2):
         """ Add a preference edge between n1 and n2 """
-        if n2 not in self._pref[n1]: self._pref[n1].append(n2)
-        if n1 not in self._pref[n2]: self._pref[n2].append(n1)
+        i1, i2 = self._ids[n1], self._ids[n2]
+        self._pref[i1][i2] = None
+        self._pref[i2][i1] = None
 
     def pop(self, n):
         """ Remove and return node n from this graph """
-        del self._conf[n]
-        del self._pref[n]
+        i = self._ids[n]
+        del self._all_nodes[i]
+        self._real_nodes.pop(i, None)
 
-        if n in self._real_nodes: self._real_nodes.remove(n)
-        self._all_nodes.remove(n)
+        bit = 1 << i
+        for c in bits(self._conf[i] & ~bit):
+            self._conf[c] &= ~bit
+            self._degree[c] -= 1
 
-        for v in self._conf:
-            if n in self._conf[v]: self._conf[v].remove(n)
-        for v in self._pref:
-            if n in self._pref[v]: self._pref[v].remove(n)
+        for c in self._pref[i]:
+            if c != i: del self._pref[c][i]
+
+        self._conf[i] = 0
+        self._degree[i] = 0
+        self._pref[i] = None
         return n
 
     def merge(self, n1, n2):
         """Merge nodes n1 and n2. This function merges n2 into n1. That is, it removes n2 from the graph and n1 gets
         the preference neighbors and conflict neighbors that n2 previously had.
         """
+        i1, i2 = self._ids[n1], self._ids[n2]
+        bit1, bit2 = 1 << i1, 1 << i2
 
-        # Merge conflict lists
-        total_conf = self._conf[n1][:]
-        for c in self._conf[n2]:
-            if c not in total_conf: total_conf.append(c)
+        # Merge conflict sets, and restore symmetric invariant
+        total_conf = self._conf[i1] | self._conf[i2]
+        self._conf[i1] = total_conf
+        self._degree[i1] = bin(total_conf).count("1")
 
-        self._conf[n1] = total_conf
+        for c in bits(total_conf & ~bit1):
+            if not self._conf[c] & bit1: self._degree[c] += 1
+            if self._conf[c] & bit2: self._degree[c] -= 1
+            self._conf[c] = self._conf[c] & ~bit2 | bit1
 
-        # Restore symmetric invariant
-        for c in self._conf[n1]:
-            if n2 in self._conf[c]: self._conf[c].remove(n2)
-            if n1 not in self._conf[c]: self._conf[c].append(n1)
-
-        # Merge preference lists
-        total_pref = self._pref[n1][:]
-        for p in self._pref[n2]:
-            if p not in total_pref: total_pref.append(p)
-
-        if n1 in total_pref: total_pref.remove(n1)
-        if n2 in total_pref: total_pref.remove(n2)
-        self._pref[n1] = total_pref
+        # Merge preference sets
+        total_pref = self._pref[i1]
+        total_pref.update(self._pref[i2])
+        total_pref.pop(i1, None)
+        total_pref.pop(i2, None)
 
         # Restore symmetric invariant
-        for c in self._pref[n1]:
-            if n2 in self._pref[c]: self._pref[c].remove(n2)
-            if n1 not in self._pref[c]: self._pref[c].append(n1)
+        for c in total_pref:
+            self._pref[c].pop(i2, None)
+            self._pref[c][i1] = None
 
-        del self._conf[n2]
-        del self._pref[n2]
-        self._real_nodes.remove(n2)
-        self._all_nodes.remove(n2)
+        self._conf[i2] = 0
+        self._degree[i2] = 0
+        self._pref[i2] = None
+        del self._real_nodes[i2]
+        del self._all_nodes[i2]
 
     def remove_pref(self, n1, n2):
         """ Remove the preference edge between n1 and n2 """
-        self._pref[n1].remove(n2)
-        self._pref[n2].remove(n1)
+        i1, i2 = self._ids[n1], self._ids[n2]
+        del self._pref[i1][i2]
+        del self._pref[i2][i1]
 
     def prefs(self, n):
         """ Return the list of nodes to which n has a preference edge """
-        return self._pref[n]
+        return self._members(self._pref[self._ids[n]])
 
     def confs(self, n):
         """ Return the list of nodes with which n has a conflict edge """
-        return self._conf[n]
+        return self._members(bits(self._conf[self._ids[n]]))
+
+    def has_pref(self, n1, n2):
+        """ Check whether n1 and n2 have a preference edge """
+        return self._ids[n2] in self._pref[self._ids[n1]]
+
+    def has_conf(self, n1, n2):
+        """ Check whether n1 and n2 have a conflict edge """
+        return bool(self._conf[self._ids[n1]] >> self._ids[n2] & 1)
+
+    def conf_degree(self, n):
+        """ Return the number of nodes with which n has a conflict edge """
+        return self._degree[self._ids[n]]
+
+    def merged_conf_degree(self, n1, n2):
+        """ Return the number of nodes with which n1 or n2 has a conflict edge """
+        return bin(self._conf[self._ids[n1]] | self._conf[self._ids[n2]]).count("1")
+
+    def count_edges(self):
+        """ Return the number of conflict edges and the number of preference edges in the graph """
+        conf = sum(self._degree[i] for i in self._all_nodes) // 2
+        pref = sum(len(self._pref[i]) for i in self._all_nodes) // 2
+        return conf, pref
 
     def nodes(self):
         """ Return the real nodes currently in this graph """
-        return self._real_nodes
+        return self._members(self._real_nodes)
 
     def all_nodes(self):
         """ Return all nodes in this graph, including pseudonodes """
-        return self._all_nodes
+        return self._members(self._all_nodes)
 
     def copy(self):
         """ Return a deep copy of this graph, but with same ILValue objects """
         g = NodeGraph()
 
-        g._real_nodes = self._real_nodes[:]
-        g._all_nodes = self._all_nodes[:]
-        for n in self._all_nodes:
-            g._conf[n] = self._conf[n][:]
-            g._pref[n] = self._pref[n][:]
+        g._nodes_by_id = self._nodes_by_id[:]
+        g._ids = self._ids.copy()
+        g._real_nodes = self._real_nodes.copy()
+        g._all_nodes = self._all_nodes.copy()
+
+        # The conflict bitsets are integers, so only the preference sets need copying
+        g._conf = self._conf[:]
+        g._degree = self._degree[:]
+        g._pref = [None if pref is None else pref.copy() for pref in self._pref]
 
         return g
 
     def __str__(self):
         """ Return this graph as a string for debugging purposes """
-        return ("Conf\n" + "\n".join(str((v, self._conf[v])) for v in self._all_nodes)
-                + "\nPref\n" + "\n".join(str((v, self._pref[v])) for v in self._all_nodes))
+        return ("Conf\n" + "\n".join(str((v, self.confs(v))) for v in self.all_nodes())
+                + "\nPref\n" + "\n".join(str((v, self.prefs(v))) for v in self.all_nodes()))
+
+
+class IteratedCoalescing:
+    """Simplify, coalesce and freeze steps of the register allocator, driven by worklists as in iterated register
+    coalescing. Each real node is kept in the worklist for its conflict degree and preference edges, and each preference
+    edge which may be coalesced in the move worklist, so that each step finds its next node or edge without scanning
+    the graph. Nodes of high conflict degree are kept in no worklist, and are left in the graph to be spilled.
+        g (NodeGraph) - Graph being colored.
+        k (int) - Number of registers available for allocation.
+        removed_nodes (List) - Stack of nodes removed from the graph by simplification.
+        merged_nodes (Dict) - Mapping from node to list of nodes merged into it.
+        simplify_list - Real nodes of low conflict degree with no preference edges.
+        freeze_buckets - For each low conflict degree, the real nodes of that degree with preference edges.
+        moves - Preference edges to try to coalesce, by the set of their two nodes.
+        active_moves - Preference edges which could not be coalesced, but may be once conflict degrees drop.
+        worklist - Mapping from each node in a worklist to that worklist.
+        stats (Counter) - Time spent in each step, and the numbers of moves coalesced and preferences frozen.
+    The worklists are dictionaries with None values, so that they keep their order.
+    """
+
+    def __init__(self, g, k, stats=None):
+        """ Initialize IteratedCoalescing with every node and preference edge of g in its worklist """
+        self.g = g
+        self.k = k
+        self.stats = collections.Counter() if stats is None else stats
+        self.removed_nodes = []
+        self.merged_nodes = {}
+
+        self.simplify_list = {}
+        self.freeze_buckets = [{} for _ in range(k)]
+        self.moves = {}
+        self.active_moves = {}
+        self.worklist = {}
+
+        for n in g.nodes():
+            self.classify(n)
+            for n1 in g.prefs(n):
+                self.moves.setdefault(frozenset((n, n1)), (n, n1))
+
+    def run(self):
+        """ Simplify, coalesce and freeze until every real node left in the graph has high conflict degree """
+        while True:
+            start = time.perf_counter()
+            if self.simplify_list:
+                self.removed_nodes.append(self.remove(next(iter(self.simplify_list))))
+                step = "simplify_time"
+            elif self.moves:
+                key = next(iter(self.moves))
+                self.coalesce(key, self.moves.pop(key))
+                step = "coalesce_time"
+            elif any(self.freeze_buckets):
+                self.freeze()
+                step = "freeze_time"
+            else:
+                return
+
+            self.stats[step] += time.perf_counter() - start
+
+    def classify(self, n):
+        """ Move real node n to the worklist for its current conflict degree and preference edges """
+        if n in self.worklist: del self.worklist.pop(n)[n]
+        if isinstance(n, Spot) or not self.g.is_node(n): return
+
+        degree = self.g.conf_degree(n)
+        if degree < self.k:
+            worklist = self.freeze_buckets[degree] if self.g.prefs(n) else self.simplify_list
+            worklist[n] = None
+            self.worklist[n] = worklist
+
+    def enable_moves(self, n):
+        """ Move the preference edges of n which could not be coalesced back to the move worklist """
+        for n1 in self.g.prefs(n):
+            key = frozenset((n, n1))
+            if key in self.active_moves: self.moves[key] = self.active_moves.pop(key)
+            else: self.moves.setdefault(key, (n, n1))
+
+    def degree_dropped(self, n):
+        """ Update the worklists after the conflict degree of n may have dropped """
+        self.classify(n)
+        self.enable_moves(n)
+
+        # Nodes which conflict with n may now be coalesced with a register
+        if self.g.conf_degree(n) == self.k - 1:
+            for n1 in self.g.confs(n): self.enable_moves(n1)
+
+    def remove(self, n):
+        """ Remove and return node n from the graph, as when it is simplified or spilled """
+        neighbors, prefs = self.g.confs(n), self.g.prefs(n)
+        self.g.pop(n)
+        self.classify(n)
+
+        for n1 in prefs: self.classify(n1)
+        for n1 in neighbors: self.degree_dropped(n1)
+        return n
+
+    def coalesce(self, key, move):
+        """ Merge the nodes of the given preference edge if that cannot make the graph harder to color """
+        g = self.g
+        v1, v2 = move
+        if not g.is_node(v1) or not g.is_node(v2) or not g.has_pref(v1, v2): return
+
+        # If the two nodes conflict, they can never be merged
+        if g.has_conf(v1, v2):
+            g.remove_pref(v1, v2)
+            self.classify(v1)
+            self.classify(v2)
+            return
+
+        # If one is a spot, merge into it if every conflict of the other either has low degree or already conflicts
+        # with the spot. Otherwise, merge if the merged node would have low degree.
+        if isinstance(v1, Spot): v1, v2 = v2, v1
+        if isinstance(v2, Spot):
+            can_merge = all(g.has_conf(T, v2) or g.conf_degree(T) < self.k for T in g.confs(v1))
+            v1, v2 = v2, v1
+        else:
+            can_merge = g.merged_conf_degree(v1, v2) < self.k
+
+        if not can_merge:
+            self.active_moves[key] = move
+            return
+
+        # Merge v2 into v1. The nodes which conflicted with both now lose a conflict.
+        neighbors = g.confs(v2)
+        g.merge(v1, v2)
+        self.merged_nodes.setdefault(v1, []).append(v2)
+        self.stats["coalesced_moves"] += 1
+
+        self.classify(v2)
+        self.classify(v1)
+        self.enable_moves(v1)
+        for n in neighbors: self.degree_dropped(n)
+
+    def freeze(self):
+        """ Give up coalescing the preference edges of a node of lowest conflict degree, so it can be simplified """
+        n = next(iter(next(bucket for bucket in self.freeze_buckets if bucket)))
+        for n1 in self.g.prefs(n):
+            self.g.remove_pref(n, n1)
+            key = frozenset((n, n1))
+            self.moves.pop(key, None)
+            self.active_moves.pop(key, None)
+            self.classify(n1)
+            self.stats["frozen_prefs"] += 1
+
+        self.classify(n)
+
+
+class AllocReport:
+    """Statistics of the register allocator for each function, which can be written out as JSON or CSV.
+        rows (List[Dict]) - Statistics of each function allocated, in order, with a value for every field.
+    """
+
+    # Fields of each row. Times are in seconds.
+    fields = ["function", "allocator", "nodes", "conflict_edges", "pref_edges", "spill_rounds", "spilled_values",
+              "coalesced_moves", "frozen_prefs", "liveness_time", "graph_time", "simplify_time", "coalesce_time",
+              "freeze_time", "scan_time", "spotmap_time"]
+
+    def __init__(self):
+        """ Initialize an empty AllocReport """
+        self.rows = []
+
+    def add(self, function, stats):
+        """Add the statistics of a function.
+            function (str) - Name of the function.
+            stats (Counter) - Statistics recorded while allocating the function. Fields not recorded are reported as 0.
+        """
+        row = {field: stats[field] for field in self.fields}
+        row["function"] = function
+        self.rows.append(row)
+
+    def write(self, file):
+        """ Write the report to the given file object, as CSV if its name ends in .csv and as JSON otherwise """
+        if file.name.endswith(".csv"):
+            writer = csv.DictWriter(file, self.fields, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(self.rows)
+        else:
+            json.dump(self.rows, file, indent=2)
+
+
+class CommandInfo:
+    """Metadata of an ILCommand, read once for all phases of register allocation. The command builds fresh lists and
+    dictionaries each time one of its methods is called, and the allocator reads them many times over. Each attribute
+    other than command holds the return value of the ILCommand method of the same name.
+        command (ILCommand) - Command described.
+    """
+
+    __slots__ = ("command", "inputs", "outputs", "clobber", "rel_spot_conflict", "abs_spot_conflict",
+                 "rel_spot_preference", "abs_spot_preference", "references", "label_name", "targets")
+
+    def __init__(self, command):
+        """ Initialize CommandInfo from the given command """
+        self.command = command
+        self.inputs = command.inputs()
+        self.outputs = command.outputs()
+        self.clobber = command.clobber()
+        self.rel_spot_conflict = command.rel_spot_conflict()
+        self.abs_spot_conflict = command.abs_spot_conflict()
+        self.rel_spot_preference = command.rel_spot_preference()
+        self.abs_spot_preference = command.abs_spot_preference()
+        self.references = command.references()
+        self.label_name = command.label_name()
+        self.targets = command.targets()
+
+
+class FunctionAllocation:
+    """Registers allocated to the values of one function, from which its code is generated.
+        infos (List[CommandInfo]) - Metadata of each command of the function.
+        free_values (Dict) - Ordered set of the values allocated a register or spilled, as from get_free_values.
+        mem_values (Dict) - Ordered set of the values which need a permanent memory spot, because they may be referenced
+        or will not fit in a register.
+        live_vars - Live range information from get_live_vars.
+        spotmap (Dict) - Register allocated to each value which was not spilled.
+        spilled (List) - Values which must be spilled to the stack, in order.
+        alloc_time (float) - Seconds taken to allocate the registers.
+        stats (Counter) - Register allocator statistics, as reported by AllocReport.
+    """
+
+    def __init__(self, infos, free_values, mem_values, live_vars, spotmap, spilled, alloc_time, stats):
+        """ Initialize FunctionAllocation """
+        self.infos = infos
+        self.free_values = free_values
+        self.mem_values = mem_values
+        self.live_vars = live_vars
+        self.spotmap = spotmap
+        self.spilled = spilled
+        self.alloc_time = alloc_time
+        self.stats = stats
+
+    def pack(self, global_spotmap):
+        """Return this allocation in a form which can be passed to another process. An ILValue passed to another
+        process is a copy, so each ILValue is replaced by its index in the values of the function, as found by
+        get_free_values.
+        """
+        index = {v: i for i, v in enumerate(ASMGen.get_free_values(self.infos, global_spotmap))}
+
+        def indices(values):
+            return [index[v] for v in values]
+
+        return (indices(self.free_values), indices(self.mem_values),
+                [(indices(in_live), indices(out_live)) for in_live, out_live in self.live_vars],
+                {index[v]: spot for v, spot in self.spotmap.items() if v in index}, indices(self.spilled),
+                self.alloc_time, self.stats)
+
+    @classmethod
+    def unpack(cls, commands, global_spotmap, packed):
+        """ Return the FunctionAllocation of the given commands from the result of pack """
+        infos = [CommandInfo(command) for command in commands]
+        values = list(ASMGen.get_free_values(infos, global_spotmap))
+        free_values, mem_values, live_vars, spotmap, spilled, alloc_time, stats = packed
+
+        def members(indices):
+            return [values[i] for i in indices]
+
+        return cls(infos, dict.fromkeys(members(free_values)), dict.fromkeys(members(mem_values)),
+                   [(members(in_live), members(out_live)) for in_live, out_live in live_vars],
+                   {values[i]: spot for i, spot in spotmap.items()}, members(spilled), alloc_time, stats)
 
 
 class ASMGen:
@@ -241,6 +572,7 @@ class ASMGen:
         asm_code (ASMCode) - ASMCode object to populate with ASM.
         arguments - Arguments passed via command line.
         offset (int) - Current offset from RBP for allocating on stack.
+        report (AllocReport) - Register allocator statistics, if a report was requested on the command line.
     """
 
     # List of registers used for allocation, sorted preferred-first
@@ -257,15 +589,23 @@ class ASMGen:
         self.arguments = arguments
 
         self.offset = 0
-
-    def make_asm(self):
-        """ Generate ASM code """
+        self.report = AllocReport() if arguments.reg_alloc_report else None
+
+    def make_asm(self, allocations=None):
+        """Generate ASM code.
+            allocations (List[FunctionAllocation]) - Registers allocated to each function, as returned by make_asm of
+            another ASMGen for the same IL. If not given, the registers are allocated here.
+            returns - list of the FunctionAllocation of each function, from which ASM code of another kind can be
+            generated without allocating registers again.
+        """
 
         global_spotmap = self.get_global_spotmap()
+        if allocations is None: allocations = self.allocate(global_spotmap)
 
-        for func in self.il_code.commands:
+        for func, allocation in zip(self.il_code.commands, allocations):
             self.asm_code.add(asm_cmds.LabelFunc(func))
-            self._make_asm(self.il_code.commands[func], global_spotmap)
+            stats = self._make_asm(allocation, global_spotmap)
+            if self.report: self.report.add(func, stats)
             self.asm_code.add(asm_cmds.LabelEndFunc(func))
 
         if len(self.il_code.string_literals) == 0:
@@ -278,25 +618,57 @@ class ASMGen:
         #         counter += 1
         # else: self.asm_code.output.append("\t\t\t\"Program Result: %d\", 0ah, 0ah,")
 
-    def _make_asm(self, commands, global_spotmap):
-        """ Generate ASM code for given command list """
+        return allocations
+
+    def allocate(self, global_spotmap):
+        """Allocate registers for every function. Allocation emits no code, so its result can be used to generate any
+        kind of ASM code for the IL.
+            returns - list of the FunctionAllocation of each function, in order.
+        """
+        if self.arguments.jobs > 1: return self.allocate_parallel(global_spotmap)
+
+        functions = self.il_code.commands
+        return [self.allocate_function(functions[func], global_spotmap) for func in functions]
+
+    def allocate_parallel(self, global_spotmap):
+        """Allocate registers for every function in a pool of processes, as many as given on the command line. Code is
+        not emitted in the pool, because emitting it takes labels from a counter shared by all functions, so the pool
+        only finds the live ranges and registers of each function.
+            returns - list of the FunctionAllocation of each function, in order.
+        """
+        functions = self.il_code.commands
+        with multiprocessing.Pool(self.arguments.jobs, _init_worker,
+                                  (functions, global_spotmap, self.arguments)) as pool:
+            packed = pool.map(_allocate_in_worker, functions)
+
+        return [FunctionAllocation.unpack(functions[func], global_spotmap, allocation)
+                for func, allocation in zip(functions, packed)]
+
+    def allocate_function(self, commands, global_spotmap):
+        """Find the live ranges of the values in given command list, and allocate them registers. This emits no code
+        and assigns no stack offsets, so the functions may be allocated in any order.
+            returns - FunctionAllocation of the commands.
+        """
+
+        # Read the metadata of each command once, for every phase of allocation to use
+        infos = [CommandInfo(command) for command in commands]
 
         # Get free values
-        free_values = self.get_free_values(commands, global_spotmap)
+        free_values = self.get_free_values(infos, global_spotmap)
 
-        # If any variable may have its address referenced, assign it a permanent memory spot if it doesn't yet have one.
+        # If any variable may have its address referenced, it needs a permanent memory spot if it doesn't yet have one.
         move_to_mem = []
-        for command in commands:
-            refs = command.references().values()
+        for info in infos:
+            refs = info.references.values()
             for line in refs:
                 for v in line:
                     if v not in refs: move_to_mem.append(v)
 
+        mem_values = {}
         for v in move_to_mem:
             if v in free_values:
-                self.offset += v.ctype.size
-                global_spotmap[v] = MemSpot(spots.EBP, -self.offset)
-                free_values.remove(v)
+                mem_values[v] = None
+                del free_values[v]
 
         # In addition, move all IL values of strange size to memory because they won't fit in a register.
         for v in free_values:
@@ -305,84 +677,324 @@ class ASMGen:
 
         for v in move_to_mem:
             if v in free_values:
-                self.offset += v.ctype.size
-                global_spotmap[v] = MemSpot(spots.EBP, -self.offset)
-                free_values.remove(v)
+                mem_values[v] = None
+                del free_values[v]
+
+        # Perform liveliness analysis
+        stats = collections.Counter()
+        start = time.perf_counter()
+        live_vars = self.get_live_vars(infos, free_values)
+        stats["liveness_time"] = time.perf_counter() - start
+
+        # Assign registers to the free values, by linear scan or by coloring the conflict graph
+        allocate = self.linear_scan if self.arguments.linear_scan else self.color_graph
+        alloc_start = time.perf_counter()
+        spotmap, spilled_nodes = allocate(infos, free_values, live_vars, stats)
+
+        # If the code of a command would find no register free for scratch, spill the cheapest value held in a register
+        # across that command, and allocate the other values again
+        forced_spills = {}
+        while True:
+            stack_values = list(forced_spills) + spilled_nodes + list(mem_values)
+            i = self.find_scratch_shortage(infos, live_vars, spotmap, stack_values, global_spotmap)
+            if i is None: break
+
+            if not forced_spills: spill_costs = self.get_spill_costs(infos, free_values)
+            v = self.choose_scratch_spill(infos[i], live_vars[i], spotmap, spill_costs)
+            if v is None: break
+            forced_spills[v] = None
+
+            values = {n: None for n in free_values if n not in forced_spills}
+            live = [([v for v in in_live if v in values], [v for v in out_live if v in values])
+                    for in_live, out_live in live_vars]
+            spotmap, spilled_nodes = allocate(infos, values, live, stats)
+
+        spilled_nodes = list(forced_spills) + spilled_nodes
+        alloc_time = time.perf_counter() - alloc_start
+
+        stats["allocator"] = allocate.__name__
+        stats["nodes"] = len(free_values)
+        stats["spilled_values"] = len(spilled_nodes)
 
-            # Perform liveliness analysis
-        live_vars = self.get_live_vars(commands, free_values)
+        return FunctionAllocation(infos, free_values, mem_values, live_vars, spotmap, spilled_nodes, alloc_time, stats)
+
+    def _make_asm(self, allocation, global_spotmap):
+        """Generate ASM code for the commands of given FunctionAllocation.
+            returns - Counter of register allocator statistics for the commands, as reported by AllocReport.
+        """
+        infos, free_values, live_vars = allocation.infos, allocation.free_values, allocation.live_vars
+
+        # Assign a permanent memory spot to each value which needs one
+        for v in allocation.mem_values:
+            self.offset += v.ctype.size
+            global_spotmap[v] = MemSpot(spots.EBP, -self.offset)
 
+        # Assign stack values to the spilled nodes
+        spotmap = dict(allocation.spotmap)
+        for v in allocation.spilled:
+            self.offset += v.ctype.size
+            spotmap[v] = MemSpot(spots.EBP, -self.offset)
+
+        # Merge global spotmap into this spotmap
+        for v in global_spotmap:
+            spotmap[v] = global_spotmap[v]
+
+        if self.arguments.show_reg_alloc_perf:  # pragma: no cover
+            prefs = self.get_prefs(infos, free_values)
+            matched_prefs = sum(1 for n1, n2 in prefs if spotmap.get(n1, n1) == spotmap.get(n2, n2))
+
+            print("total prefs", len(prefs))
+            print("matched prefs", matched_prefs)
+            print("total ILValues", len(free_values))
+            print("register ILValues", len(free_values) - len(allocation.spilled))
+
+            # Compare the selected allocator against the other one, whose result is discarded
+            other = self.color_graph if self.arguments.linear_scan else self.linear_scan
+            other_start = time.perf_counter()
+            _, other_spilled = other(infos, free_values, live_vars, collections.Counter())
+            other_time = time.perf_counter() - other_start
+
+            for name, seconds, spilled in ((allocation.stats["allocator"], allocation.alloc_time, allocation.spilled),
+                                           (other.__name__, other_time, other_spilled)):
+                print(f"{name} allocator: {seconds * 1000:.3f} ms, {len(spilled)} spilled ILValues")
+
+        # Generate assembly code
+        self.generate_asm(infos, live_vars, spotmap)
+        return allocation.stats
+
+    def color_graph(self, infos, free_values, live_vars, stats):
+        """Assign registers to the free values by coloring the conflict/preference graph, coalescing preferred pairs of
+        nodes where that is safe.
+            infos - CommandInfo of each command.
+            free_values - Ordered set of ILValues to assign registers, as from get_free_values.
+            live_vars - Live range information from get_live_vars.
+            stats (Counter) - Statistics to which the graph size, spill rounds, steps and their times are added.
+            returns - tuple of a spotmap from ILValues to registers and a list of the ILValues which must be spilled.
+        """
         # Generate conflict and preference graph
-        g_bak = self.generate_graph(commands, free_values, live_vars)
+        start = time.perf_counter()
+        g_bak = self.generate_graph(infos, free_values, live_vars)
+        stats["graph_time"] += time.perf_counter() - start
+        stats["conflict_edges"], stats["pref_edges"] = g_bak.count_edges()
+
+        # In incremental mode, several nodes are spilled from the graph at once and allocation continues on the same
+        # graph. Otherwise, one node is spilled at a time and allocation restarts from the full graph.
+        spill_batch = self.arguments.spill_batch
+        if spill_batch: spill_costs = self.get_spill_costs(infos, free_values)
 
         spilled_nodes = []
+        g = None
 
         while True:
-            g = g_bak.copy()
+            if not spill_batch or g is None:
+                g = g_bak.copy()
 
-            # Remove all nodes that have been spilled for this iteration
-            for n in spilled_nodes:
-                g.pop(n)
+                # Remove all nodes that have been spilled for this iteration
+                for n in spilled_nodes:
+                    g.pop(n)
 
-            removed_nodes = []
-            merged_nodes = {}
+                coalescing = IteratedCoalescing(g, len(self.alloc_registers), stats)
 
-            # Repeat simplification, coalescing, and freeze until freeze does not work.
-            while True:
-                # Repeat simplification and coalescing until nothing happens.
-                while True:
-                    simplified = self.simplify_all(removed_nodes, g)
-                    merged = self.coalesce_all(merged_nodes, g)
-
-                    if not simplified and not merged: break
-
-                if not self.freeze(g):
-                    break
+            # Simplify, coalesce and freeze until only nodes of high conflict degree remain
+            coalescing.run()
 
             # If no nodes remain, we are done
             if not g.nodes():
                 break
+            # If nodes do remain in incremental mode, spill the cheapest of them and continue
+            elif spill_batch:
+                spilled_nodes += self.spill_cheapest(coalescing, spill_costs, spill_batch)
             # If nodes do remain, spill one of them and retry
             else:
                 # Spill node with highest number of conflicts. This node will never be a merged node because we merge
                 # nodes conservatively, so any recently merged node can be simplified immediately.
-                n = max(g.nodes(), key=lambda n: len(g.confs(n)))
+                n = max(g.nodes(), key=g.conf_degree)
                 spilled_nodes.append(n)
 
+            stats["spill_rounds"] += 1
+
         # Move any remaining nodes from graph into removed_nodes. This accounts for pseudonodes which cannot be removed
         # in the simplify phase.
-        while g.all_nodes():
-            removed_nodes.append(g.pop(g.all_nodes()[0]))
+        removed_nodes = coalescing.removed_nodes
+        for n in g.all_nodes():
+            removed_nodes.append(g.pop(n))
 
         # Pop values off the stack to generate spot assignments.
-        spotmap = self.generate_spotmap(removed_nodes, merged_nodes, g_bak)
+        start = time.perf_counter()
+        spotmap = self.generate_spotmap(removed_nodes, coalescing.merged_nodes, g_bak)
+        stats["spotmap_time"] += time.perf_counter() - start
+        return spotmap, spilled_nodes
+
+    def linear_scan(self, infos, free_values, live_vars, stats):
+        """Assign registers to the free values by a linear scan over their live ranges, in order of where each range
+        begins. The live range of a value is kept as a bitset of the positions at which it is live, used or defined, so
+        a register held by a value is free again in the holes of its range. This is faster to allocate than the
+        conflict graph, but considers the values one at a time.
+
+        A value may not be given a register which conflicts with it in abs_spot_conflict, or which is clobbered by a
+        command it is live across. Registers preferred by abs_spot_preference, or held by values preferred by
+        rel_spot_preference, are tried first. When no register is left for a value, it takes the register of a value
+        live at the same time which stays live longer, and that value is spilled instead. Otherwise, it is spilled.
+            infos - CommandInfo of each command.
+            free_values - Ordered set of ILValues to assign registers, as from get_free_values.
+            live_vars - Live range information from get_live_vars.
+            stats (Counter) - Statistics to which the time of the scan is added.
+            returns - tuple of a spotmap from ILValues to registers and a list of the ILValues which must be spilled.
+        """
+        scan_start = time.perf_counter()
+
+        # Bits 2i and 2i + 1 of a live range are the entry to and the exit from command i
+        ranges = dict.fromkeys(free_values, 0)
+        forbidden = {v: set() for v in free_values}
+        prefs = {v: [] for v in free_values}
+        for i, info in enumerate(infos):
+            in_live, out_live = live_vars[i]
+            for v in in_live + info.inputs:
+                if v in ranges: ranges[v] |= 1 << 2 * i
+            for v in out_live + info.outputs:
+                if v in ranges: ranges[v] |= 2 << 2 * i
+
+            # Values in relative conflict both cover this command, so that their ranges overlap
+            for v1, conflicts in info.rel_spot_conflict.items():
+                for v2 in conflicts:
+                    if v1 in ranges and v2 in ranges:
+                        ranges[v1] |= 3 << 2 * i
+                        ranges[v2] |= 3 << 2 * i
+
+            for v, spot_list in info.abs_spot_conflict.items():
+                if v in forbidden: forbidden[v].update(spot_list)
+
+            # Clobbered registers are forbidden for every variable live during both entry and exit from this command
+            clobbered = info.clobber
+            if clobbered:
+                for v in set(in_live).intersection(out_live): forbidden[v].update(clobbered)
+
+            for v1, pref_list in info.rel_spot_preference.items():
+                for v2 in pref_list:
+                    if v1 in prefs and v2 in prefs:
+                        prefs[v1].append(v2)
+                        prefs[v2].append(v1)
+
+            for v, spot_list in info.abs_spot_preference.items():
+                if v in prefs: prefs[v] += spot_list
+
+        def start(v):
+            return (ranges[v] & -ranges[v]).bit_length()
+
+        def end(v):
+            return ranges[v].bit_length()
+
+        # Values given each register, and the positions at which each register is held
+        holders = {reg: [] for reg in self.alloc_registers}
+        held = dict.fromkeys(self.alloc_registers, 0)
 
-        # Assign stack values to the spilled nodes
-        for v in spilled_nodes:
-            self.offset += v.ctype.size
-            spotmap[v] = MemSpot(spots.EBP, -self.offset)
+        spotmap = {}
+        spilled = []
+        for v in sorted((v for v in ranges if ranges[v]), key=start):
+            # Try preferred registers first, then the rest in order of preference
+            choices = [spotmap.get(p, p) for p in prefs[v]] + self.alloc_registers
+            reg = next((r for r in choices if r in held and not held[r] & ranges[v] and r not in forbidden[v]), None)
+
+            if reg is None:
+                # Take a register held by only one value live at the same time as v, the one which stays live longest,
+                # if it stays live longer than v
+                victims = []
+                for r in self.alloc_registers:
+                    overlapping = [a for a in holders[r] if ranges[a] & ranges[v]]
+                    if r not in forbidden[v] and len(overlapping) == 1 and end(overlapping[0]) > end(v):
+                        victims.append(overlapping[0])
+
+                if not victims:
+                    spilled.append(v)
+                    continue
+
+                victim = max(victims, key=end)
+                reg = spotmap.pop(victim)
+                holders[reg].remove(victim)
+                held[reg] = 0
+                for a in holders[reg]: held[reg] |= ranges[a]
+                spilled.append(victim)
+
+            spotmap[v] = reg
+            holders[reg].append(v)
+            held[reg] |= ranges[v]
+
+        stats["scan_time"] += time.perf_counter() - scan_start
+        return spotmap, spilled
 
-        # Merge global spotmap into this spotmap
-        for v in global_spotmap:
-            spotmap[v] = global_spotmap[v]
+    @staticmethod
+    def get_prefs(infos, free_values):
+        """Return the set of preferred pairs of nodes in the conflict/preference graph, as generate_graph would form
+        them. Each pair is a frozenset of two ILValues, or of an ILValue and a Spot.
+        """
+        prefs = set()
+        for info in infos:
+            for v1, pref_list in info.rel_spot_preference.items():
+                for v2 in pref_list:
+                    if v1 in free_values and v2 in free_values and v1 != v2: prefs.add(frozenset((v1, v2)))
 
-        if self.arguments.show_reg_alloc_perf:  # pragma: no cover
-            total_prefs = 0
-            matched_prefs = 0
+            for v, spot_list in info.abs_spot_preference.items():
+                for s in spot_list:
+                    if v in free_values: prefs.add(frozenset((v, s)))
+        return prefs
 
-            for n1, n2 in itertools.combinations(g_bak.all_nodes(), 2):
-                if n2 in g_bak.prefs(n1):
-                    total_prefs += 1
-                    if spotmap[n1] == spotmap[n2]:
-                        matched_prefs += 1
+    @staticmethod
+    def get_spill_costs(infos, free_values):
+        """Estimate the cost of spilling each free value, as the number of times it is used or defined. Each use or
+        definition counts ten times more for each loop around it. A loop is taken to be a jump back to an earlier block
+        and the blocks between.
+            returns - dictionary mapping each free ILValue to its spill cost.
+        """
+        blocks, successors = get_basic_blocks(infos)
+
+        # Count the loops which begin and end at each command, then the loops around each command
+        loop_starts = [0] * (len(infos) + 1)
+        for b, succ in enumerate(successors):
+            for b2 in succ:
+                if b2 <= b:
+                    loop_starts[blocks[b2][0]] += 1
+                    loop_starts[blocks[b][1]] -= 1
+
+        costs = dict.fromkeys(free_values, 0)
+        depth = 0
+        for i, info in enumerate(infos):
+            depth += loop_starts[i]
+            for v in info.inputs + info.outputs:
+                if v in costs: costs[v] += 10 ** depth
+
+        return costs
+
+    def spill_cheapest(self, coalescing, spill_costs, count):
+        """Spill up to count nodes from the graph, choosing those which cost least to spill for the conflicts they
+        remove. The spill cost of a node is divided by the square of its conflict degree, which favours nodes that
+        relieve the most register pressure. A node is only spilled if it still has high conflict degree after the nodes
+        chosen before it.
+            coalescing - IteratedCoalescing of the graph. A spilled node takes with it the nodes merged into it.
+            spill_costs - Spill cost of each node, as given by get_spill_costs.
+            returns - list of the spilled ILValues.
+        """
+        g, merged_nodes = coalescing.g, coalescing.merged_nodes
 
-            print("total prefs", total_prefs)
-            print("matched prefs", matched_prefs)
-            print("total ILValues", len(g_bak.nodes()))
-            print("register ILValues", len(g_bak.nodes()) - len(spilled_nodes))
+        def group(n):
+            nodes = [n]
+            for n1 in nodes: nodes.extend(merged_nodes.get(n1, []))
+            return nodes
 
-        # Generate assembly code
-        self.generate_asm(commands, live_vars, spotmap)
+        candidates = sorted(g.nodes(), key=lambda n: sum(spill_costs[n1] for n1 in group(n)) / g.conf_degree(n) ** 2)
+
+        spilled = []
+        for n in candidates:
+            if g.conf_degree(n) < len(self.alloc_registers): continue
+
+            nodes = group(n)
+            for n1 in nodes: merged_nodes.pop(n1, None)
+            spilled += nodes
+            coalescing.remove(n)
+
+            count -= 1
+            if not count: break
+
+        return spilled
 
     def get_global_spotmap(self):
         """Generate global spotmap and add global values to ASM. This function generates a spotmap for variables which
@@ -443,76 +1055,59 @@ class ASMGen:
             return MemSpot(name)
 
     @staticmethod
-    def get_free_values(commands, global_spotmap):
-        """Generate list of free values. Returns a list of the free values, variables which need allocation on the stack
+    def get_free_values(infos, global_spotmap):
+        """Generate the free values, variables which need allocation on the stack. Returns a dictionary with None values
+        which maps each free value in order of first appearance, so that it serves as an ordered set.
         """
-        free_values = []
-        for command in commands:
-            for value in command.inputs() + command.outputs():
-                if value and value not in free_values and value not in global_spotmap:
-                    free_values.append(value)
+        free_values = {}
+        for info in infos:
+            for value in info.inputs + info.outputs:
+                if value and value not in global_spotmap:
+                    free_values[value] = None
 
         return free_values
 
     @staticmethod
-    def get_live_vars(commands, free_values):
+    def get_live_vars(infos, free_values):
         """Given a set of free ILValues, find when those ILValues are live.
-            free_values - list of ILValues for which to perform liveliness analysis.
+            infos - CommandInfo of each command.
+            free_values - ILValues for which to perform liveliness analysis, in order.
             returns - array mapping command indices to a tuple where first element is a list of variables live coming
             into the command and the second is a list of the variables live exiting the command.
-        """
-        # Preprocess all commands to get a mapping from labels to command number.
-        labels = {c.label_name(): i for i, c in enumerate(commands) if c.label_name()}
-
-        # Last iteration of live variables
-        prev_live_vars = None
-
-        # This iteration of live variables
-        live_vars = [([], []) for i in range(len(commands))]
-
-        while live_vars != prev_live_vars:
-            prev_live_vars = live_vars[:]
 
-            # List of currently live variables
-            cur_live = []
-
-            # Iterate through commands in backwards order
-            for i, command in list(enumerate(commands))[::-1]:
-                # If current command is a jump, add the live inputs of all possible targets to the current live list.
-                for label in command.targets():
-                    i2 = labels[label]
-                    for v in prev_live_vars[i2][0]:
-                        if v not in cur_live: cur_live.append(v)
+        Live sets are computed as bitsets indexed by position in free_values, for each basic block by a worklist solver.
+        """
+        values = list(free_values)
+        index = {v: i for i, v in enumerate(values)}
 
-                # Variables live on output from this command
-                out_live = cur_live[:]
+        blocks, successors = get_basic_blocks(infos)
+        uses, defs, live_in = get_block_live_in(infos, blocks, successors, index)
 
-                # Add variables used in this command to current live variables
-                for v in command.inputs():
-                    if v in free_values and v not in cur_live: cur_live.append(v)
+        # Expand the block results to each command
+        live_vars = [None] * len(infos)
+        for b, (start, end) in enumerate(blocks):
+            cur_live = 0
+            for b2 in successors[b]: cur_live |= live_in[b2]
 
-                # Remove variables defined in this command to live variables
-                for v in command.outputs():
-                    if v in free_values:
-                        if v in cur_live: cur_live.remove(v)
-                        else:
-                            # If variable is defined in command but not live, make it live on output from this command.
-                            out_live.append(v)
+            for i in range(end - 1, start - 1, -1):
+                # If a variable is defined in a command but not live, make it live on output from this command.
+                out_live = cur_live | defs[i] & ~(cur_live | uses[i])
+                cur_live = (cur_live | uses[i]) & ~defs[i]
 
-                # Variables live on input from this command
-                in_live = cur_live[:]
-                live_vars[i] = (in_live, out_live)
+                live_vars[i] = ([values[j] for j in bits(cur_live)],
+                                [values[j] for j in bits(out_live)])
 
         return live_vars
 
     @staticmethod
-    def generate_graph(commands, free_values, live_vars):
+    def generate_graph(infos, free_values, live_vars):
         """Generate the conflict/preference graph.
-            free_values - List of ILValues to include in the graph.
+            infos - CommandInfo of each command.
+            free_values - Ordered set of ILValues to include in the graph, as from get_free_values.
             live_vars - Live range information from _get_live_vars.
         """
         g = NodeGraph(free_values)
-        for i, command in enumerate(commands):
+        for i, info in enumerate(infos):
             # Variables active during input
             for n1, n2 in itertools.combinations(live_vars[i][0], 2): g.add_conflict(n1, n2)
 
@@ -520,140 +1115,42 @@ class ASMGen:
             for n1, n2 in itertools.combinations(live_vars[i][1], 2): g.add_conflict(n1, n2)
 
             # Relative conflict set of this command
-            for n1 in command.rel_spot_conflict():
-                for n2 in command.rel_spot_conflict()[n1]:
+            for n1, conflicts in info.rel_spot_conflict.items():
+                for n2 in conflicts:
                     if n1 in free_values and n2 in free_values:
                         g.add_conflict(n1, n2)
 
             # Absolute conflict set of this command
-            for n in command.abs_spot_conflict():
-                for s in command.abs_spot_conflict()[n]:
+            for n, spot_list in info.abs_spot_conflict.items():
+                for s in spot_list:
                     if n in free_values:
-                        if s not in g.all_nodes():
+                        if not g.is_node(s):
                             g.add_imitation_node(s)
                         g.add_conflict(n, s)
 
             # Clobber set of this command
-            for s in command.clobber():
-                if s not in g.all_nodes(): g.add_imitation_node(s)
+            if info.clobber:
+                live_out = set(live_vars[i][1])
+                live_through = [n for n in live_vars[i][0] if n in live_out]
+            for s in info.clobber:
+                if not g.is_node(s): g.add_imitation_node(s)
 
                 # Add a conflict with dummy node for every variable live during both entry and exit from this command.
-                for n in live_vars[i][0]:
-                    if n in live_vars[i][1]: g.add_conflict(n, s)
+                for n in live_through: g.add_conflict(n, s)
 
             # Form preferences based on rel_spot_pref
-            for v1 in command.rel_spot_preference():
-                for v2 in command.rel_spot_preference()[v1]:
+            for v1, pref_list in info.rel_spot_preference.items():
+                for v2 in pref_list:
                     if g.is_node(v1) and g.is_node(v2): g.add_pref(v1, v2)
 
             # Form preferences based on abs_spot_pref
-            for v in command.abs_spot_preference():
-                for s in command.abs_spot_preference()[v]:
+            for v, spot_list in info.abs_spot_preference.items():
+                for s in spot_list:
                     if v in free_values:
-                        if s not in g.all_nodes(): g.add_imitation_node(s)
+                        if not g.is_node(s): g.add_imitation_node(s)
                         g.add_pref(v, s)
         return g
 
-    def simplify_all(self, removed_nodes, g):
-        """Repeat the Simplify step until no more can be done. Returns False if no simplification is done.
-            removed_nodes - stack of removed nodes to which this function adds the nodes it removes.
-        """
-
-        # Get nodes without preference edges
-        no_pref = [v for v in g.nodes() if not g.prefs(v)]
-
-        # Repeat simplification until no more nodes can be removed
-        did_something = False
-        while True:
-            rem = self.simplify_once(no_pref, g)
-            if rem:
-                removed_nodes.append(rem)
-                no_pref.remove(rem)
-                did_something = True
-            else:
-                break
-
-        return did_something
-
-    def simplify_once(self, nodes, g):
-        """ Remove and return a node in nodes if it has low conflict degree """
-        for v in nodes:
-            # If the node has low conflict degree remove it from the graph
-            if len(g.confs(v)) < len(self.alloc_registers):
-                return g.pop(v)
-
-    def coalesce_all(self, merged_nodes, g):
-        """Repeat the coalesce step until no more can be done. Returns False if no simplification is done.
-            merged_nodes - Mapping from node to list of nodes. Every node in the list of nodes has been merged into the
-            key node.
-        """
-        did_something = False
-        while True:
-            merge = self.coalesce_once(g)
-            if merge:
-                if merge[0] not in merged_nodes: merged_nodes[merge[0]] = []
-
-                merged_nodes[merge[0]].append(merge[1])
-                did_something = True
-            else:
-                break
-
-        return did_something
-
-    def coalesce_once(self, g):
-        """Perform one iteration of the coalesce step. Returns the merged pair if a merge was successfully completed.
-        The first element is the preserved node, and the second element is the removed node.
-        """
-        for v1 in g.nodes():
-            for v2 in g.prefs(v1):
-                # If the two nodes conflict, automatically continue.
-                if v1 in g.confs(v2): continue
-
-                total_confs = len(set(g.confs(v1)) | set(g.confs(v2)))
-
-                # If one is a spot, use a special heuristic.
-                if isinstance(v1, Spot):
-                    v1, v2 = v2, v1
-                if isinstance(v2, Spot):
-                    for T in g.confs(v1):
-                        if v2 in g.confs(T): continue
-                        if len(g.confs(T)) < len(self.alloc_registers): continue
-                        break
-                    else:
-                        # We can merge v1 into v2.
-                        g.merge(v2, v1)
-                        return v2, v1
-
-                # Otherwise, apply regular merging rules.
-                elif total_confs < len(self.alloc_registers):
-                    g.merge(v1, v2)
-                    return v1, v2
-
-    @staticmethod
-    def freeze(g):
-        """Remove one preference edge. This function finds two nodes, preferably of low conflict degree,
-        that are connected by a preference edge. Then, this preference edge is removed from the graph. Returns false if
-        nothing is done.
-        """
-
-        # Sort a list of nodes by conflict degree
-        nodes = sorted(g.all_nodes(), key=lambda n: len(g.confs(n)))
-        index_pairs = list(itertools.combinations(list(enumerate(nodes)), 2))
-
-        # Sort pairs to prioritize nodes which appear earlier in `nodes`
-        index_pairs.sort(key=lambda p: p[0][0] + p[1][0])
-
-        # Extract just the node pairs
-        pairs = [(p[0][1], p[1][1]) for p in index_pairs]
-
-        # Now, the earlier pairs in `pairs` have lower conflict degree and are thus superior candidates for freezing.
-        for n1, n2 in pairs:
-            if n1 in g.prefs(n2):
-                g.remove_pref(n1, n2)
-                return True
-
-        return False
-
     def generate_spotmap(self, removed_nodes, merged_nodes, g):
         """ Pop values off stack to generate spot assignments """
 
@@ -698,7 +1195,7 @@ class ASMGen:
 
         return spotmap
 
-    def generate_asm(self, commands, live_vars, spotmap):
+    def generate_asm(self, infos, live_vars, spotmap):
         """ Generate assembly code """
 
         max_offset = max(spot.rbp_offset() for spot in spotmap.values())
@@ -712,28 +1209,94 @@ class ASMGen:
         self.asm_code.add(asm_cmds.Sub(spots.ESP, offset_spot, 8))
 
         # Generate code for each command
-        for i, command in enumerate(commands):
-            self.asm_code.add(asm_cmds.Comment(type(command).__name__.upper()))
+        for i, info in enumerate(infos):
+            self.asm_code.add(asm_cmds.Comment(type(info.command).__name__.upper()))
+            info.command.make_asm(spotmap, spotmap, self.make_get_reg(info, live_vars[i], spotmap), self.asm_code)
+
+    def find_scratch_shortage(self, infos, live_vars, spotmap, stack_values, global_spotmap):
+        """Return the index of the first command whose code would find no register free for scratch with the given
+        registers allocated, or None if there is none. The calls each command makes to get_reg are read from its
+        scratch_regs, and given registers as get_reg would.
+            stack_values - Values which will be given a spot on the stack, in order.
+        """
+        probe_spotmap = dict(spotmap)
+        offset = 0
+        for v in stack_values:
+            offset += v.ctype.size
+            probe_spotmap[v] = MemSpot(spots.EBP, -offset)
+        probe_spotmap.update(global_spotmap)
+
+        for i, info in enumerate(infos):
+            busy_spots = self.get_busy_spots(info, live_vars[i], probe_spotmap)
+            taken = []
+            for pref, conf in info.command.scratch_regs(probe_spotmap):
+                r = self.choose_reg(pref, busy_spots.union(conf, taken))
+                if not r: return i
+                taken.append(r)
+
+        return None
+
+    @staticmethod
+    def choose_scratch_spill(info, live, spotmap, spill_costs):
+        """Return the value to spill so that the given command has a register free for scratch, the cheapest of those
+        held in a register across the command. Values the command reads are spilled last. Returns None if there is no
+        such value.
+        """
+        live_through = set(live[0]).intersection(live[1])
+        candidates = [v for v in live[0] if v in live_through and v in spotmap and v not in info.outputs]
+        if not candidates: return None
+        return min(candidates, key=lambda v: (v in info.inputs, spill_costs[v]))
+
+    @staticmethod
+    def get_busy_spots(info, live, spotmap):
+        """Return the set of spots a command may not use for scratch, which are those of the variables live both
+        entering and exiting the command, except where an output is stored.
+            info (CommandInfo) - Metadata of the command.
+            live - Tuple of the variables live coming into the command and the variables live exiting it.
+        """
+        busy_spots = set(spotmap[var] for var in set(live[0]) & set(live[1]))
+        for v in info.outputs: busy_spots.discard(spotmap[v])
+        return busy_spots
+
+    def choose_reg(self, pref, bad_spots):
+        """Return the first register, of the given preferences and then of all registers, which is not among the bad
+        spots, or None if every register is among them.
+        """
+        for s in (pref + self.all_registers):
+            if isinstance(s, RegSpot) and s not in bad_spots:
+                return s
+
+        return None
+
+    def make_get_reg(self, info, live, spotmap):
+        """Return the get_reg function passed to make_asm of a command, which returns a register the command may use
+        for scratch.
+            info (CommandInfo) - Metadata of the command.
+            live - Tuple of the variables live coming into the command and the variables live exiting it.
+        """
+        busy_spots = self.get_busy_spots(info, live, spotmap)
+
+        def get_reg(pref=None, conf=None):
+            # Spot is bad if it is busy or listed as a conflicting spot.
+            r = self.choose_reg(pref or [], busy_spots.union(conf or []))
+            if not r: raise SpillRequired("spill required for get_reg")
+            return r
 
-            def get_reg(pref=None, conf=None):
-                if not pref: pref = []
-                if not conf: conf = []
+        return get_reg
 
-                # Spot is bad if it is containing a variable that is live both entering and exiting this command.
-                bad_vars = set(live_vars[i][0]) & set(live_vars[i][1])
-                bad_spots = set(spotmap[var] for var in bad_vars)
 
-                # Spot is free if it is where an output is stored.
-                for v in command.outputs():
-                    bad_spots.discard(spotmap[v])
+# State of a process in the pool of ASMGen.allocate_parallel, as a tuple of an ASMGen, the commands of each function
+# and the global spotmap.
+_worker = None
 
-                # Spot is bad if it is listed as a conflicting spot.
-                bad_spots |= set(conf)
 
-                for s in (pref + self.all_registers):
-                    if isinstance(s, RegSpot) and s not in bad_spots:
-                        return s
+def _init_worker(functions, global_spotmap, arguments):
+    """ Set up a process in the pool of ASMGen.allocate_parallel """
+    global _worker
+    _worker = ASMGen(None, None, ASMCode(), arguments), functions, global_spotmap
 
-                raise NotImplementedError("spill required for get_reg")
 
-            command.make_asm(spotmap, spotmap, get_reg, self.asm_code)
+def _allocate_in_worker(func):
+    """ Allocate registers for the given function in a process of the pool, and return the packed FunctionAllocation """
+    asm_gen, functions, global_spotmap = _worker
+    return asm_gen.allocate_function(functions[func], global_spotmap).pack(global_spotmap)
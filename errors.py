@@ -1,5 +1,16 @@
 """Objects used for error reporting. The main executable catches an exception and prints it for the user."""
 
+from bisect import bisect_right
+import codecs
+import locale
+import mmap
+import os
+import re
+
+# Line boundaries recognized by str.splitlines, and the same boundaries in UTF-8 encoded text.
+_line_break = re.compile("\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+_line_break_utf8 = re.compile(b"\r\n|[\n\r\v\f\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
 
 class ErrorCollector:
     """Class that accumulates all errors and warnings encountered. We create a global instance of this class so all
@@ -33,41 +44,166 @@ class ErrorCollector:
 error_collector = ErrorCollector()
 
 
+class Source:
+    """Class representing the contents of a source file. Positions in the file refer to it by offset, and the line and
+    column of an offset are only worked out when they are needed, which is usually just to print an error.
+        file (str) - Name of the file.
+        data (str, or mmap) - Contents of the file. A memory-mapped file holds UTF-8 encoded text, which is decoded one
+        line at a time as it is needed.
+        line_starts (List[int]) - Offset in data at which each line of the file begins. Built on first use.
+
+    The offset of a character is the offset of its line in data plus the index of the character in its decoded line.
+    For text in a string this is just the index of the character.
+    """
+
+    __slots__ = ("file", "data", "line_starts")
+
+    def __init__(self, file, data):
+        """ Initialize Source object """
+        self.file = file
+        self.data = data
+        self.line_starts = None
+
+    @classmethod
+    def read(cls, file):
+        """Return the Source of the file with the given name. If files are read as UTF-8, the file is memory-mapped
+        rather than read into a string, so only the lines being lexed or shown in an error are decoded.
+        """
+        if codecs.lookup(locale.getpreferredencoding(False)).name != "utf-8":
+            with open(file) as c_file:
+                return cls(file, c_file.read())
+
+        with open(file, "rb") as c_file:
+            # An empty file cannot be mapped
+            if not os.fstat(c_file.fileno()).st_size: return cls(file, "")
+            return cls(file, mmap.mmap(c_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def lines(self):
+        """Generate the lines of the file as (offset, text) pairs. The text of each line has no line terminator, and lines
+        are split at the same boundaries as str.splitlines.
+        """
+        start = 0
+        for line_break in self._line_break().finditer(self.data):
+            yield start, self._decode(start, line_break.start())
+            start = line_break.end()
+
+        if start < len(self.data): yield start, self._decode(start, len(self.data))
+
+    def line_col(self, offset):
+        """ Return the line number and column, both counted from 1, of the given offset """
+        if self.line_starts is None:
+            self.line_starts = [0] + [line_break.end() for line_break in self._line_break().finditer(self.data)]
+
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def full_line(self, line):
+        """ Return the full text of the given line, without its line terminator """
+        self.line_col(0)
+        start = self.line_starts[line - 1]
+
+        line_break = self._line_break().search(self.data, start)
+        return self._decode(start, line_break.start() if line_break else len(self.data))
+
+    def _line_break(self):
+        """ Return the pattern of line boundaries in data """
+        return _line_break if isinstance(self.data, str) else _line_break_utf8
+
+    def _decode(self, start, end):
+        """ Return the text of data from offset start to offset end, exclusive """
+        text = self.data[start:end]
+        return text if isinstance(text, str) else text.decode("utf-8")
+
+
 class Position:
-    """Class representing a position in source code.
-        file (str) - Name of file in which this position is located.
-        line (int) - Line number in file at which this position is located.
-        col (int) - Horizontal column at which this position is located.
-        full_line (str) - Full text of the line containing this position.
-    Specifically, full_line[col + 1] should be this position.
+    """Class representing a position in source code. Position objects are immutable.
+        source (Source) - Source file in which this position is located.
+        offset (int) - Offset of this position in the source file.
+    The file, line, col and full_line of this position are computed from the source on access. Specifically,
+    full_line[col - 1] should be this position.
     """
 
-    def __init__(self, file, line, col, full_line):
+    __slots__ = ("source", "offset")
+
+    def __init__(self, source, offset):
         """ Initialize Position object """
-        self.file = file
-        self.line = line
-        self.col = col
-        self.full_line = full_line
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "offset", offset)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Position objects are immutable")
+
+    @property
+    def file(self):
+        """ Name of file in which this position is located """
+        return self.source.file
+
+    @property
+    def line(self):
+        """ Line number in file at which this position is located """
+        return self.source.line_col(self.offset)[0]
+
+    @property
+    def col(self):
+        """ Horizontal column at which this position is located """
+        return self.source.line_col(self.offset)[1]
+
+    @property
+    def full_line(self):
+        """ Full text of the line containing this position """
+        return self.source.full_line(self.line)
 
     def __add__(self, other):
         """ Increment Position column by one """
-        return Position(self.file, self.line, self.col + 1, self.full_line)
+        return Position(self.source, self.offset + 1)
 
 
 class Range:
-    """Class representing a continuous span between two positions.
-        start (Position) - start position, inclusive.
-        end (Position) - end position, inclusive.
+    """Class representing a continuous span between two positions. Range objects are immutable, and store only the
+    offsets of their positions so that a Range is all that is kept for the span of each token. The end is stored
+    relative to the start, since the short lengths of most ranges need no int object of their own.
+        source (Source) - Source file in which this range is located.
+        start_offset (int) - Offset of the start position, inclusive.
+        length (int) - Offset of the end position, inclusive, minus start_offset.
     """
 
+    __slots__ = ("source", "start_offset", "length")
+
     def __init__(self, start, end=None):
-        """ Initialize Range objects """
-        self.start = start
-        self.end = end or start
+        """Initialize Range objects.
+            start (Position) - start position, inclusive.
+            end (Position) - end position, inclusive. If not provided, the range covers only the start position.
+        """
+        end = end or start
+        object.__setattr__(self, "source", start.source)
+        object.__setattr__(self, "start_offset", start.offset)
+        object.__setattr__(self, "length", end.offset - start.offset)
+
+    @classmethod
+    def from_offsets(cls, source, start_offset, end_offset):
+        """ Return the Range between the given offsets in given source, without creating Position objects """
+        range_ = object.__new__(cls)
+        object.__setattr__(range_, "source", source)
+        object.__setattr__(range_, "start_offset", start_offset)
+        object.__setattr__(range_, "length", end_offset - start_offset)
+        return range_
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Range objects are immutable")
+
+    @property
+    def start(self):
+        """ start position, inclusive """
+        return Position(self.source, self.start_offset)
+
+    @property
+    def end(self):
+        """ end position, inclusive """
+        return Position(self.source, self.start_offset + self.length)
 
     def __add__(self, other):
         """ Add Range objects by concatenating their ranges """
-        return Range(self.start, other.end)
+        return Range.from_offsets(self.source, self.start_offset, other.start_offset + other.length)
 
 
 class CompilerError(Exception):
@@ -99,24 +235,31 @@ class CompilerError(Exception):
 
         # A position span is provided, and this is output to terminal.
         if self.span:
+            # The line and column of each position are computed on access, and the full line is decoded from the
+            # source, so fetch them once.
+            start, end = self.span.start, self.span.end
+            start_line, start_col = start.source.line_col(start.offset)
+            end_line, end_col = end.source.line_col(end.offset)
+            full_line = start.source.full_line(start_line)
+
             # Set "indicator" to display the ^^^s and ---s to indicate the error location.
             indicator = warn_color
-            indicator += " " * (self.span.start.col - 1)
+            indicator += " " * (start_col - 1)
 
-            if self.span.start.line == self.span.end.line and self.span.start.file == self.span.end.file:
-                if self.span.end.col == self.span.start.col:
+            if start_line == end_line and start.file == end.file:
+                if end_col == start_col:
                     indicator += "^"
                 else:
-                    indicator += "-" * (self.span.end.col - self.span.start.col + 1)
+                    indicator += "-" * (end_col - start_col + 1)
             else:
-                indicator += "-" * (len(self.span.start.full_line) - self.span.start.col + 1)
+                indicator += "-" * (len(full_line) - start_col + 1)
 
             indicator += reset_color
 
-            return (f"Error at file: {bold_color}{self.span.start.file}{reset_color};\n"
-                    f"Position: {bold_color}{self.span.start.line} line {self.span.start.col} symbol;\n"
+            return (f"Error at file: {bold_color}{start.file}{reset_color};\n"
+                    f"Position: {bold_color}{start_line} line {start_col} symbol;\n"
                     f"{color_code}{issue_type}:{reset_color} {self.descr}\n"
-                    f"  {self.span.start.full_line}\n"
+                    f"  {full_line}\n"
                     f"  {indicator}")
 
         # A position span is not provided and this is output to terminal.
@@ -0,0 +1,100 @@
+""" Control flow and liveness analysis of IL commands, shared by the IL optimizer and the register allocator """
+
+from il_cmds.control import Jump, Return
+
+
+def bits(bitset):
+    """ Generate the indices of the bits set in the given bitset, in increasing order """
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+def get_basic_blocks(infos, fallthrough=True):
+    """Split the commands into basic blocks, and find the blocks to which each block may pass control.
+        infos - Metadata of each command, such as its CommandInfo. Only the command, label_name, targets, inputs and
+        outputs attributes are read.
+        fallthrough (bool) - Whether every block is taken to fall through to the next one, even if it ends in an
+        unconditional jump or a return. If not, a block also ends at each return, and a block which ends in an
+        unconditional jump or a return does not fall through.
+        returns - tuple of a list of the (start, end) command indices of each block, end exclusive, and a list of
+        the indices of the successor blocks of each block.
+    """
+    # A block begins at the first command, at each label, and after each jump, or also after each return if
+    # blocks do not always fall through.
+    starts = [0] if infos else []
+    for i, info in enumerate(infos):
+        if info.label_name and starts[-1] != i: starts.append(i)
+        ends = info.targets or not fallthrough and isinstance(info.command, Return)
+        if ends and i + 1 < len(infos): starts.append(i + 1)
+
+    blocks = list(zip(starts, starts[1:] + [len(infos)]))
+    labels = {infos[start].label_name: b for b, (start, _) in enumerate(blocks)}
+
+    successors = []
+    for b, (_, end) in enumerate(blocks):
+        last = infos[end - 1]
+        falls = b + 1 < len(blocks) and (fallthrough or not isinstance(last.command, (Jump, Return)))
+        succ = [b + 1] if falls else []
+        for label in last.targets:
+            if labels[label] not in succ: succ.append(labels[label])
+        successors.append(succ)
+
+    return blocks, successors
+
+
+def get_block_live_in(infos, blocks, successors, index):
+    """Find which values are live coming into each basic block, by a worklist solver over bitsets.
+        infos - Metadata of each command, such as its CommandInfo. Only the command, label_name, targets, inputs and
+        outputs attributes are read.
+        blocks, successors - Basic blocks of the commands and their successors, as from get_basic_blocks.
+        index - Dictionary mapping each value for which to perform liveliness analysis to its bit.
+        returns - tuple of lists of the bitsets of the values used by each command, of the values defined by each
+        command, and of the values live coming into each block.
+    """
+    # Variables used and variables defined by each command
+    uses, defs = [], []
+    for info in infos:
+        used, defined = 0, 0
+        for v in info.inputs:
+            if v in index: used |= 1 << index[v]
+        for v in info.outputs:
+            if v in index: defined |= 1 << index[v]
+        uses.append(used)
+        defs.append(defined)
+
+    predecessors = [[] for _ in blocks]
+    for b, succ in enumerate(successors):
+        for b2 in succ: predecessors[b2].append(b)
+
+    # Variables a block uses before defining them, and variables a block defines
+    block_uses, block_defs = [], []
+    for start, end in blocks:
+        used, defined = 0, 0
+        for i in range(end - 1, start - 1, -1):
+            used = uses[i] & ~defs[i] | used & ~defs[i]
+            defined |= defs[i]
+        block_uses.append(used)
+        block_defs.append(defined)
+
+    # Solve for the variables live into each block, visiting later blocks first
+    live_in = [0] * len(blocks)
+    worklist = list(range(len(blocks)))
+    pending = set(worklist)
+    while worklist:
+        b = worklist.pop()
+        pending.discard(b)
+
+        live_out = 0
+        for b2 in successors[b]: live_out |= live_in[b2]
+
+        new_in = block_uses[b] | live_out & ~block_defs[b]
+        if new_in != live_in[b]:
+            live_in[b] = new_in
+            for b2 in predecessors[b]:
+                if b2 not in pending:
+                    worklist.append(b2)
+                    pending.add(b2)
+
+    return uses, defs, live_in
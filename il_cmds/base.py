@@ -112,6 +112,15 @@ class ILCommand:
         """
         raise NotImplementedError
 
+    def scratch_regs(self, spotmap):
+        """ Return the list of calls make_asm makes to get_reg with given spotmap.
+
+        Each call is a tuple of its list of Spot preferences and its list of unacceptable spots, as passed to get_reg.
+        The registers returned are held until make_asm returns, so a call may not return the register of an earlier
+        call. The register allocator reads this list to make sure each call can be given a register.
+        """
+        return []
+
     @staticmethod
     def is_immediate(spot):
         """ Return True if given spot is an immediate operand """
@@ -73,6 +73,17 @@ class GeneralCmp(ILCommand):
         if result != spotmap[self.output]:
             asm_code.add(asm_cmds.Mov(spotmap[self.output], result, out_size))
 
+    def scratch_regs(self, spotmap):
+        arg1_spot, arg2_spot = spotmap[self.arg1], spotmap[self.arg2]
+        calls = [([spotmap[self.output]], [arg1_spot, arg2_spot])]
+
+        # A second register is taken if both arguments are literals or both are in memory
+        if ((isinstance(arg1_spot, LiteralSpot) and isinstance(arg2_spot, LiteralSpot)) or
+                (isinstance(arg1_spot, MemSpot) and isinstance(arg2_spot, MemSpot))):
+            calls.append(([], []))
+
+        return calls
+
     def cmp_command(self):
         ctype = self.arg1.ctype
         if ctype.is_pointer() or (ctype.is_integral() and not ctype.signed): return self.unsigned_cmp_cmd
@@ -81,6 +81,9 @@ class GeneralJump(ILCommand):
         asm_code.add(asm_cmds.Cmp(cond_spot, zero_spot, size))
         asm_code.add(self.command(self.label))
 
+    def scratch_regs(self, spotmap):
+        return [([], [])] if isinstance(spotmap[self.cond], LiteralSpot) else []
+
 
 class JumpZero(GeneralJump):
     """ Jumps to a label if given condition is zero """
@@ -185,11 +188,9 @@ class Call(ILCommand):
             asm_code.add(asm_cmds.Mov(r, spotmap[self.func], func_size))
             func_spot = r
 
-        for arg, reg in zip(self.args, self.arg_regs):
-            if spotmap[arg] == reg: continue
-            asm_code.add(asm_cmds.Mov(reg, spotmap[arg], arg.ctype.size))
+        self.move_args(spotmap, asm_code)
 
-        if len(STR_EX) > 1: DIRECT_VAL.append(spots.LiteralSpot('_ret' + str(Call.counter-1)))
+        if len(STR_EX) > 1: DIRECT_VAL.append(spots.LiteralSpot('_ret' + str(Call.counter)))
         asm_code.add(asm_cmds.Call(func_spot, None, self.func.ctype.size))
         if len(STR_EX) > 1:
             asm_code.add(asm_cmds.Mov(DIRECT_VAL[Call.counter], func_spot, self.func.ctype.size))
@@ -197,3 +198,29 @@ class Call(ILCommand):
 
         if not self.void_return and spotmap[self.ret] != spots.EAX:
             asm_code.add(asm_cmds.Mov(spotmap[self.ret], spots.EAX, ret_size))
+
+    def move_args(self, spotmap, asm_code):
+        """Emit code to move the arguments into the argument registers. The moves are made as one parallel move, so
+        that no register is written before each argument held in it has been read.
+        """
+        # Spot each argument register is to be loaded from, and the size of its argument
+        moves = {reg: spotmap[arg] for arg, reg in zip(self.args, self.arg_regs) if spotmap[arg] != reg}
+        sizes = {reg: arg.ctype.size for arg, reg in zip(self.args, self.arg_regs)}
+
+        while moves:
+            # A register from which no move is left to read can be written
+            reg = next((reg for reg in moves if reg not in moves.values()), None)
+            if reg:
+                asm_code.add(asm_cmds.Mov(reg, moves.pop(reg), sizes[reg]))
+                continue
+
+            # Every register left to write is read by another move, so the moves form cycles of registers. Swapping
+            # one register with its source completes its move, and the moves which read that register read the source.
+            reg, source = moves.popitem()
+            asm_code.add(asm_cmds.Xchg(reg, source, 4))
+            moves = {r: source if s == reg else s for r, s in moves.items()}
+            moves = {r: s for r, s in moves.items() if r != s}
+
+    def scratch_regs(self, spotmap):
+        if spotmap[self.func] in self.arg_regs[0:len(self.args)]: return [([], self.arg_regs[0:len(self.args)])]
+        else: return []
@@ -52,6 +52,9 @@ class AddMult(ILCommand):
 
         if temp != spotmap[self.output]: asm_code.add(asm_cmds.Mov(spotmap[self.output], temp, size))
 
+    def scratch_regs(self, spotmap):
+        return [([spotmap[self.output], spotmap[self.arg1], spotmap[self.arg2]], [])]
+
 
 class BitwiseAnd(AddMult):
     """ BitwiseAnd - make bitwise AND operation with arg1 and arg2, then saves to output.
@@ -134,6 +137,16 @@ class BitShiftCmd(ILCommand):
             asm_code.add(self.Inst(temp_spot, arg2_spot, arg1_size, 1))
             if temp_spot != out_spot: asm_code.add(asm_cmds.Mov(out_spot, temp_spot, arg1_size))
 
+    def scratch_regs(self, spotmap):
+        arg1_spot, arg2_spot, out_spot = spotmap[self.arg1], spotmap[self.arg2], spotmap[self.output]
+
+        # If the first operand is moved out of ECX, the register it is moved to is then given again for the result
+        if not self.is_immediate8(arg2_spot) and arg2_spot != spots.ECX:
+            if arg1_spot == spots.ECX: return [([out_spot, arg1_spot], [arg2_spot, spots.ECX])]
+            arg2_spot = spots.ECX
+
+        return [] if out_spot == arg1_spot else [([out_spot, arg1_spot], [arg2_spot])]
+
 
 class RBitShift(BitShiftCmd):
     """ Right bitwise shift operator for IL value.
@@ -209,6 +222,11 @@ class DivMod(ILCommand):
         if spotmap[self.output] != self.return_reg:
             asm_code.add(asm_cmds.Mov(output_spot, self.return_reg, size))
 
+    def scratch_regs(self, spotmap):
+        if self.is_immediate(spotmap[self.arg2]) or spotmap[self.arg2] in [spots.EAX, spots.EDX]:
+            return [([], [spots.EAX, spots.EDX])]
+        else: return []
+
 
 class Div(DivMod):
     """ Divides given IL values.
@@ -128,6 +128,16 @@ class Set(ValueCmd):
             # If necessary, move from r_asm -> output_asm
             if r != spotmap[self.output]: asm_code.add(asm_cmds.Mov(spotmap[self.output], r, self.output.ctype.size))
 
+    def scratch_regs(self, spotmap):
+        out_spot, arg_spot = spotmap[self.output], spotmap[self.arg]
+
+        if self.output.ctype == ctypes.bool_t: return [([], [out_spot])] if isinstance(arg_spot, LiteralSpot) else []
+        elif isinstance(arg_spot, LiteralSpot): return []
+        elif self.output.ctype.size <= self.arg.ctype.size:
+            if out_spot == arg_spot or isinstance(out_spot, RegSpot) or isinstance(arg_spot, RegSpot): return []
+            else: return [([], [])]
+        else: return [([out_spot, arg_spot], [])]
+
     def set_bool(self, spotmap, get_reg, asm_code):
         """Emit code for SET command if arg is boolean type."""
 
@@ -178,6 +188,9 @@ class AddrOf(ILCommand):
             size = self.output.ctype.size
             asm_code.add(asm_cmds.Mov(spotmap[self.output], r, size))
 
+    def scratch_regs(self, spotmap):
+        return [([spotmap[self.output]], [])]
+
 
 class ReadAt(ValueCmd):
     """Reads value at given address.
@@ -212,6 +225,13 @@ class ReadAt(ValueCmd):
 
         self.move_data(output_spot, indir_spot, self.output.ctype.size, temp_reg, asm_code)
 
+    def scratch_regs(self, spotmap):
+        addr_spot, output_spot = spotmap[self.addr], spotmap[self.output]
+
+        calls = [] if isinstance(addr_spot, RegSpot) else [([], [output_spot])]
+        if not isinstance(output_spot, RegSpot): calls.append(([], [] if calls else [addr_spot]))
+        return calls
+
 
 class SetAt(ValueCmd):
     """Sets value at given address.
@@ -247,6 +267,13 @@ class SetAt(ValueCmd):
 
         self.move_data(indirect_spot, value_spot, self.val.ctype.size, temp_reg, asm_code)
 
+    def scratch_regs(self, spotmap):
+        addr_spot, value_spot = spotmap[self.addr], spotmap[self.val]
+
+        calls = [] if isinstance(addr_spot, RegSpot) else [([], [value_spot])]
+        if not isinstance(value_spot, RegSpot): calls.append(([], [] if calls else [addr_spot]))
+        return calls
+
 
 class RelCommand(ValueCmd, metaclass=ABCMeta):
     """Parent class for the relative commands."""
@@ -263,6 +290,10 @@ class RelCommand(ValueCmd, metaclass=ABCMeta):
     def get_rel_spot(self, spotmap, get_reg, asm_code):
         """Get a relative spot for the relative value."""
 
+        # The registers used when generating code for this command before are free again, since the command may be
+        # generated more than once, for each kind of ASM code.
+        self.used_regs = []
+
         # If there's no count, we only need to shift by the chunk
         if not self.count:
             return spotmap[self.base].shift(self.block)
@@ -285,10 +316,24 @@ class RelCommand(ValueCmd, metaclass=ABCMeta):
         if isinstance(spotmap[reg_val], LiteralSpot) or isinstance(spotmap[reg_val], RegSpot):
             return spotmap[reg_val]
 
-        val_spot = get_reg([], [spotmap[self.count]] + self.used_regs)
+        count_spots = [spotmap[self.count]] if self.count else []
+        val_spot = get_reg([], count_spots + self.used_regs)
         self.used_regs.append(val_spot)
         return val_spot
 
+    def rel_scratch_regs(self, reg_val, spotmap):
+        """Return the calls to get_reg made by get_rel_spot and then by get_reg_spot for reg_val, as returned by
+        scratch_regs.
+        """
+        calls = []
+        if self.count and not isinstance(spotmap[self.count], (LiteralSpot, RegSpot)):
+            calls.append(([], [spotmap[self.val]]))
+
+        if not isinstance(spotmap[reg_val], (LiteralSpot, RegSpot)):
+            calls.append(([], [spotmap[self.count]] if self.count else []))
+
+        return calls
+
 
 class SetRel(RelCommand):
     """Sets value relative to given object.
@@ -332,6 +377,9 @@ class SetRel(RelCommand):
         val_size = self.val.ctype.size
         self.move_data(rel_spot, spotmap[self.val], val_size, reg, asm_code)
 
+    def scratch_regs(self, spotmap):
+        return self.rel_scratch_regs(self.val, spotmap)
+
 
 class AddrRel(RelCommand):
     """Gets the address of a location relative to a given object. For further documentation, see SetRel.
@@ -359,6 +407,9 @@ class AddrRel(RelCommand):
 
         if out_spot != spotmap[self.output]: asm_code.add(asm_cmds.Mov(spotmap[self.output], out_spot, 8))
 
+    def scratch_regs(self, spotmap):
+        return self.rel_scratch_regs(self.output, spotmap)
+
 
 class ReadRel(RelCommand):
     """Reads the value at a location relative to a given object. For further documentation, see SetRel."""
@@ -384,3 +435,6 @@ class ReadRel(RelCommand):
 
         out_size = self.output.ctype.size
         self.move_data(spotmap[self.output], rel_spot, out_size, reg, asm_code)
+
+    def scratch_regs(self, spotmap):
+        return self.rel_scratch_regs(self.output, spotmap)
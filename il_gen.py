@@ -12,6 +12,8 @@ class ILCode:
         commands - Dictionary mapping function name to list of IL commands for that function.
         cur_func (str) - Name of the function current commands are for.
         label_num (int) - Unique identifier returned by get_label.
+        literal_values (Dict) - ILValue of each literal returned by get_literal, keyed on its value, ctype and whether
+        it is a null pointer constant.
     """
 
     def __init__(self):
@@ -21,6 +23,7 @@ class ILCode:
         self.label_num = 0
 
         self.static_inits, self.literals, self.string_literals = {}, {}, {}
+        self.literal_values = {}
 
     def copy(self):
         """Make copy of this object. Preserves identity of all ILValues stored within, but modifying the commands,
@@ -29,10 +32,11 @@ class ILCode:
         new = ILCode()
         new.commands = {name: self.commands[name].copy() for name in self.commands}
         new.cur_func = self.cur_func
-        self.label_num = self.label_num
-        self.static_inits = self.static_inits.copy()
-        self.literals = self.literals.copy()
-        self.string_literals = self.string_literals.copy()
+        new.label_num = self.label_num
+        new.static_inits = self.static_inits.copy()
+        new.literals = self.literals.copy()
+        new.string_literals = self.string_literals.copy()
+        new.literal_values = self.literal_values.copy()
         return new
 
     def start_func(self, func):
@@ -58,6 +62,22 @@ class ILCode:
         il_value.literal = IntegerLiteral(value)
         self.literals[il_value] = value
 
+    def get_literal(self, value, ctype, null_ptr_const=False):
+        """Return an ILValue with the given literal value. Literals are interned, so every request for the same value
+        and ctype returns the same ILValue.
+            value - Integer literal value, as an int or a string.
+            ctype (CType) - C type of the literal.
+            null_ptr_const (bool) - Whether the literal is a null pointer constant.
+        """
+        key = (int(value), ctype, null_ptr_const)
+        il_value = self.literal_values.get(key)
+        if il_value is None:
+            il_value = ILValue(ctype, null_ptr_const)
+            self.register_literal_var(il_value, value)
+            self.literal_values[key] = il_value
+
+        return il_value
+
     def register_string_literal(self, il_value, chars):
         """Register a string literal IL value.
             chars (List(int)) - Null-terminated list of character ASCII codes in the string.
@@ -0,0 +1,627 @@
+""" Optimization passes over the IL code, run between the AST -> IL and the IL -> ASM phases of the compiler """
+
+import il_cmds.compare as compare_cmds
+import il_cmds.control as control_cmds
+import il_cmds.math as math_cmds
+import il_cmds.value as value_cmds
+from flow import bits, get_basic_blocks, get_block_live_in
+from tree.utils import shift_into_range
+from copy import copy
+import itertools
+import ctypes
+
+
+def convert(val, ctype):
+    """ Convert a numerical value to given integral ctype, as a Set command does """
+    return int(val != 0) if ctype.is_bool() else shift_into_range(val, ctype)
+
+
+def _div(left, right):
+    """ Divide left by right, rounding toward zero as C does """
+    quot = abs(left) // abs(right)
+    return quot if (left < 0) == (right < 0) else -quot
+
+
+def _mod(left, right):
+    """ Remainder of dividing left by right, with the sign of left as C does """
+    return left - right * _div(left, right)
+
+
+def _shift_right(left, right, ctype):
+    """ Shift left to the right by right bits. RBitShift shifts arithmetically whatever the signedness of its type, so
+    an unsigned value with its top bit set is not folded.
+    """
+    if not ctype.signed and left >> (ctype.size * 8 - 1): raise ArithmeticError
+    return left >> right
+
+
+def _shift_count(right, ctype):
+    """ Return the shift count right, if shifting a value of given ctype by it is defined """
+    if not 0 <= right < ctype.size * 8: raise ArithmeticError
+    return right
+
+
+# Value computed by each math and compare command from the values of its inputs, in the ctype of its first input.
+# Functions raise ArithmeticError if the result is not defined, and the command is then left alone.
+FOLDS = {
+    math_cmds.Add: lambda left, right, ctype: left + right,
+    math_cmds.Subtr: lambda left, right, ctype: left - right,
+    math_cmds.Mult: lambda left, right, ctype: left * right,
+    math_cmds.BitwiseAnd: lambda left, right, ctype: left & right,
+    math_cmds.LBitShift: lambda left, right, ctype: left << _shift_count(right, ctype),
+    math_cmds.RBitShift: lambda left, right, ctype: _shift_right(left, _shift_count(right, ctype), ctype),
+    math_cmds.Div: lambda left, right, ctype: _div(left, right),
+    math_cmds.Mod: lambda left, right, ctype: _mod(left, right),
+    math_cmds.Neg: lambda arg, ctype: -arg,
+    math_cmds.Not: lambda arg, ctype: ~arg,
+    compare_cmds.EqualCmp: lambda left, right, ctype: int(left == right),
+    compare_cmds.NotEqualCmp: lambda left, right, ctype: int(left != right),
+    compare_cmds.LessCmp: lambda left, right, ctype: int(left < right),
+    compare_cmds.GreaterCmp: lambda left, right, ctype: int(left > right),
+    compare_cmds.LessOrEqCmp: lambda left, right, ctype: int(left <= right),
+    compare_cmds.GreaterOrEqCmp: lambda left, right, ctype: int(left >= right),
+}
+
+
+# Attributes in which each kind of command holds its inputs. Commands of kinds not listed are never given new inputs.
+INPUT_ATTRS = {
+    math_cmds.AddMult: ["arg1", "arg2"],
+    math_cmds.BitShiftCmd: ["arg1", "arg2"],
+    math_cmds.DivMod: ["arg1", "arg2"],
+    math_cmds.NegNot: ["arg"],
+    compare_cmds.GeneralCmp: ["arg1", "arg2"],
+    control_cmds.Label: [],
+    control_cmds.Jump: [],
+    control_cmds.GeneralJump: ["cond"],
+    control_cmds.Return: ["arg"],
+    control_cmds.Call: ["func", "args"],
+    value_cmds.LoadArg: [],
+    value_cmds.Set: ["arg"],
+    value_cmds.AddrOf: ["var"],
+    value_cmds.ReadAt: ["addr"],
+    value_cmds.SetAt: ["addr", "val"],
+    value_cmds.SetRel: ["val", "base", "count"],
+    value_cmds.AddrRel: ["base", "count"],
+    value_cmds.ReadRel: ["base", "count"],
+}
+
+
+# Attributes in which each kind of command holds its output. Commands of kinds not listed are never given new outputs.
+OUTPUT_ATTRS = {
+    math_cmds.AddMult: ["output"],
+    math_cmds.BitShiftCmd: ["output"],
+    math_cmds.DivMod: ["output"],
+    math_cmds.NegNot: ["output"],
+    compare_cmds.GeneralCmp: ["output"],
+    control_cmds.Call: ["ret"],
+    value_cmds.LoadArg: ["output"],
+    value_cmds.Set: ["output"],
+    value_cmds.AddrOf: ["output"],
+    value_cmds.ReadAt: ["output"],
+    value_cmds.AddrRel: ["output", "val"],
+    value_cmds.ReadRel: ["output", "val"],
+}
+
+
+def get_attrs(attrs, command):
+    """ Return the attributes listed for the kind of given command in attrs, or None if its kind is not listed """
+    return next((attrs[cls] for cls in type(command).__mro__ if cls in attrs), None)
+
+
+def replace_inputs(command, values):
+    """Return a copy of given command which reads each input found in the given dictionary from the value it maps to
+    instead, or the command itself if it reads none of them.
+    """
+    replaced = {}
+    for attr in get_attrs(INPUT_ATTRS, command) or []:
+        arg = getattr(command, attr)
+        if isinstance(arg, list): new_arg = [values.get(v, v) for v in arg]
+        else: new_arg = values.get(arg, arg) if arg else arg
+
+        if new_arg != arg: replaced[attr] = new_arg
+
+    if not replaced: return command
+
+    new_command = copy(command)
+    for attr, new_arg in replaced.items(): setattr(new_command, attr, new_arg)
+    return new_command
+
+
+def replace_output(command, value):
+    """ Return a copy of given command, which must be of a kind in OUTPUT_ATTRS, which outputs the given value """
+    new_command = copy(command)
+    for attr in get_attrs(OUTPUT_ATTRS, command): setattr(new_command, attr, value)
+    return new_command
+
+
+def is_copy(command, local_values):
+    """Return whether given command is a Set of a local value to another local value of the same scalar type, after
+    which the two values hold the same bits.
+    """
+    return (isinstance(command, value_cmds.Set) and command.output in local_values and command.arg in local_values and
+            command.output is not command.arg and command.output.ctype.size in {1, 2, 4, 8} and
+            command.output.ctype.is_scalar() and command.output.ctype.weak_compat(command.arg.ctype))
+
+
+# Kinds of command whose output depends on nothing but their inputs, and which have no other effect. Each inherits
+# whether the order of its inputs matters from its base class in this dictionary.
+PURE_COMMANDS = {
+    math_cmds.AddMult: lambda command: command.comm,
+    math_cmds.BitShiftCmd: lambda command: False,
+    math_cmds.DivMod: lambda command: False,
+    math_cmds.NegNot: lambda command: False,
+    compare_cmds.GeneralCmp: lambda command: isinstance(command, (compare_cmds.EqualCmp, compare_cmds.NotEqualCmp)),
+}
+
+
+def ctype_key(ctype):
+    """ Return a key which is equal for two scalar ctypes if a value has the same bits converted to either """
+    return ctype.is_pointer(), ctype.size, getattr(ctype, "signed", False), ctype.is_bool()
+
+
+def copies_bits(command):
+    """ Return whether given command is a Set which leaves the bits of its input in its output """
+    return (isinstance(command, value_cmds.Set) and command.output.ctype.is_scalar() and command.arg.ctype.is_scalar()
+            and ctype_key(command.output.ctype) == ctype_key(command.arg.ctype))
+
+
+class FlowInfo:
+    """Metadata of an ILCommand read by flow.get_basic_blocks and flow.get_block_live_in, in place of the CommandInfo
+    the register allocator reads. The optimization passes rewrite the commands after each pass, and most passes need
+    only their control flow, so the inputs and outputs are read from the command only when the liveness solver asks for
+    them.
+        command (ILCommand) - Command described.
+    """
+
+    __slots__ = ("command", "label_name", "targets")
+
+    def __init__(self, command):
+        """ Initialize FlowInfo from the given command """
+        self.command = command
+        self.label_name = command.label_name()
+        self.targets = command.targets()
+
+    @property
+    def inputs(self):
+        """ Return the inputs of the command """
+        return self.command.inputs()
+
+    @property
+    def outputs(self):
+        """ Return the outputs of the command """
+        return self.command.outputs()
+
+
+def get_blocks(commands):
+    """Split the commands into basic blocks, as flow.get_basic_blocks does, except that a block which ends in an
+    unconditional jump or a return does not fall through.
+        returns - tuple of the FlowInfo of each command, a list of the (start, end) command indices of each block,
+        end exclusive, and a list of the indices of the successor blocks of each block.
+    """
+    infos = [FlowInfo(command) for command in commands]
+    return (infos,) + get_basic_blocks(infos, fallthrough=False)
+
+
+def get_live_out(infos, blocks, successors, values):
+    """Find which of the given values are live coming out of each block, as ASMGen.get_live_vars does.
+        values - Set of the values for which to perform liveliness analysis.
+        returns - list of the set of values live coming out of each block.
+    """
+    values = list(values)
+    _, _, live_in = get_block_live_in(infos, blocks, successors, {v: i for i, v in enumerate(values)})
+
+    live_out = []
+    for succ in successors:
+        live = 0
+        for b2 in succ: live |= live_in[b2]
+        live_out.append({values[i] for i in bits(live)})
+
+    return live_out
+
+
+class ILOptimizer:
+    """Rewrites the IL code of each function into faster IL code with the same behaviour.
+        il_code (ILCode) - IL code to optimize.
+        symbol_table (SymbolTable) - Symbol table of the IL code, from which the storage of each variable is read.
+    """
+
+    def __init__(self, il_code, symbol_table):
+        """ Initialize ILOptimizer """
+        self.il_code = il_code
+        self.symbol_table = symbol_table
+
+    def optimize(self):
+        """ Run every optimization pass over the commands of each function """
+        for func in self.il_code.commands:
+            commands = self.il_code.commands[func]
+            commands = self.propagate_constants(commands)
+            commands = self.remove_unreachable(commands)
+            commands = self.number_values(commands)
+            commands = self.propagate_copies(commands)
+            commands = self.coalesce_copies(commands)
+            commands = self.remove_dead_stores(commands)
+            self.il_code.commands[func] = commands
+
+    def get_local_values(self, commands):
+        """Return the set of values output by the given commands which only change when they are output. This excludes
+        values which may be referenced, since they may be changed through a pointer, and values with static storage,
+        since they may be changed by a function call.
+        """
+        referenced = set()
+        for command in commands:
+            for line in command.references().values(): referenced.update(line)
+
+        local_values = set()
+        for command in commands:
+            for v in command.outputs():
+                if (v not in referenced and v not in self.il_code.literals and
+                        self.symbol_table.storage.get(v, self.symbol_table.AUTOMATIC) == self.symbol_table.AUTOMATIC):
+                    local_values.add(v)
+
+        return local_values
+
+    def get_literal(self, val, ctype):
+        """Return a literal ILValue of given integral ctype with the given value, or None if an ASM command can not
+        take the value as an immediate operand.
+        """
+        if ctypes.int_min <= val < 1 << 32: return self.il_code.get_literal(val, ctype)
+
+    def propagate_constants(self, commands):
+        """Propagate constant values through the given commands, by sparse conditional constant propagation over
+        their basic blocks. Math and compare commands whose inputs all have constant values are replaced with a Set of
+        the result, constant inputs of other math and compare commands are replaced with literals, and conditional
+        jumps on a constant condition are replaced with a Jump or removed.
+
+        The constant values of the local values coming into each reachable block are found first. A block is
+        reachable once any block which may pass control to it is, and a conditional jump on a constant only passes
+        control to one block. Blocks which are never found reachable are left as they are.
+            returns - optimized list of commands.
+        """
+        local_values = {v for v in self.get_local_values(commands) if v.ctype.is_integral()}
+        _, blocks, successors = get_blocks(commands)
+        labels = {commands[start].label_name(): b for b, (start, _) in enumerate(blocks)}
+
+        # Constant value of each local value coming into each block, or None if the block is not known to be reachable.
+        # A local value missing from the dictionary of a block may have more than one value there.
+        consts_in = [None] * len(blocks)
+        if blocks: consts_in[0] = {}
+
+        worklist = [0] if blocks else []
+        pending = set(worklist)
+        while worklist:
+            b = worklist.pop()
+            pending.discard(b)
+            start, end = blocks[b]
+
+            consts = dict(consts_in[b])
+            for command in commands[start:end]:
+                self.fold_command(command, consts, local_values)
+
+            # A conditional jump on a constant passes control either to its label or to the next block
+            last = commands[end - 1]
+            taken = successors[b]
+            if isinstance(last, control_cmds.GeneralJump) and self.get_const(last.cond, consts) is not None:
+                if self.jumps(last, consts): taken = [labels[last.label]]
+                else: taken = [b2 for b2 in taken if b2 == b + 1]
+
+            for b2 in taken:
+                if consts_in[b2] is None: new_consts = consts
+                else: new_consts = {v: val for v, val in consts_in[b2].items() if consts.get(v) == val}
+
+                if new_consts != consts_in[b2]:
+                    consts_in[b2] = new_consts
+                    if b2 not in pending:
+                        worklist.append(b2)
+                        pending.add(b2)
+
+        new_commands = []
+        for b, (start, end) in enumerate(blocks):
+            if consts_in[b] is None:
+                new_commands.extend(commands[start:end])
+                continue
+
+            consts = dict(consts_in[b])
+            for command in commands[start:end]:
+                new_command = self.rewrite_command(command, consts)
+                self.fold_command(command, consts, local_values)
+                if new_command: new_commands.append(new_command)
+
+        return new_commands
+
+    def get_const(self, v, consts):
+        """ Return the constant value of given value, or None if it is not known to be constant """
+        if v in self.il_code.literals and v.ctype.is_integral():
+            return convert(int(self.il_code.literals[v]), v.ctype)
+        return consts.get(v)
+
+    def jumps(self, command, consts):
+        """ Return whether the given conditional jump, whose condition is constant, jumps to its label """
+        return (self.get_const(command.cond, consts) == 0) == isinstance(command, control_cmds.JumpZero)
+
+    def fold(self, command, consts):
+        """ Return the constant value output by given math, compare or Set command, or None if it is not constant """
+        args = [self.get_const(v, consts) for v in command.inputs()]
+        ctype = command.inputs()[0].ctype
+        if None in args or not ctype.is_integral() or not command.output.ctype.is_integral(): return None
+
+        if isinstance(command, value_cmds.Set): return args[0]
+
+        try:
+            return FOLDS[type(command)](*[shift_into_range(arg, ctype) for arg in args], ctype)
+        except ArithmeticError:
+            return None
+
+    def fold_command(self, command, consts, local_values):
+        """ Update the constant values of the local values for the effect of the given command """
+        outputs = [v for v in command.outputs() if v in local_values]
+        if not outputs: return
+
+        val = None
+        if type(command) in FOLDS or isinstance(command, value_cmds.Set): val = self.fold(command, consts)
+
+        for v in outputs:
+            if val is None: consts.pop(v, None)
+            else: consts[v] = convert(val, v.ctype)
+
+    def rewrite_command(self, command, consts):
+        """Return the command which replaces given command, given the constant values coming into it, or None if the
+        command is removed.
+        """
+        if isinstance(command, control_cmds.GeneralJump):
+            if self.get_const(command.cond, consts) is None: return command
+            elif self.jumps(command, consts): return control_cmds.Jump(command.label)
+            else: return None
+
+        if type(command) not in FOLDS: return command
+
+        val = self.fold(command, consts)
+        if val is not None:
+            literal = self.get_literal(convert(val, command.output.ctype), command.output.ctype)
+            if literal: return value_cmds.Set(command.output, literal)
+
+        # Replace the inputs which have constant values with literals. A compare command with a literal first input
+        # swaps its inputs without flipping the comparison, so only equality comparisons may take one.
+        args = []
+        for i, v in enumerate(command.inputs()):
+            val = self.get_const(v, consts)
+            if i == 0 and isinstance(command, compare_cmds.GeneralCmp) and not isinstance(
+                    command, (compare_cmds.EqualCmp, compare_cmds.NotEqualCmp)): val = None
+            literal = self.get_literal(val, v.ctype) if val is not None else None
+            args.append(literal or v)
+
+        if args == command.inputs(): return command
+        return type(command)(command.output, *args)
+
+    def remove_unreachable(self, commands):
+        """Remove the blocks of the given commands to which control never passes, such as code after a Return or a
+        Jump which no jump targets. Then remove Jump commands to the command just after them, and labels to which no
+        command jumps.
+            returns - optimized list of commands.
+        """
+        _, blocks, successors = get_blocks(commands)
+
+        reachable = {0} if blocks else set()
+        worklist = list(reachable)
+        while worklist:
+            for b2 in successors[worklist.pop()]:
+                if b2 not in reachable:
+                    reachable.add(b2)
+                    worklist.append(b2)
+
+        new_commands = []
+        for b, (start, end) in enumerate(blocks):
+            if b in reachable: new_commands.extend(commands[start:end])
+
+        # A Jump to a label just after it passes control where the code falls through to anyway
+        new_commands = [command for command, next_command in zip(new_commands, new_commands[1:] + [None])
+                        if not isinstance(command, control_cmds.Jump) or not next_command or
+                        command.label != next_command.label_name()]
+
+        # Labels to which no command jumps only split blocks
+        targets = {label for command in new_commands for label in command.targets()}
+        return [command for command in new_commands if not command.label_name() or command.label_name() in targets]
+
+    def propagate_copies(self, commands):
+        """Propagate copies made by Set commands through the given commands. After Set(x, y), later commands read y
+        rather than x for as long as neither is output again, so that the copy into x is often left unused and can be
+        removed as a dead store. A Set of a value to a value it is already known to equal is removed.
+
+        Only copies between local values of the same scalar type are propagated, since for any other Set, x does not
+        hold the same bits as y, or may change without being output.
+            returns - optimized list of commands.
+        """
+        local_values = self.get_local_values(commands)
+        _, blocks, successors = get_blocks(commands)
+
+        # Value of which each local value coming into each block is a copy, or None if the block has not been reached.
+        copies_in = [None] * len(blocks)
+        if blocks: copies_in[0] = {}
+
+        worklist = [0] if blocks else []
+        pending = set(worklist)
+        while worklist:
+            b = worklist.pop()
+            pending.discard(b)
+            start, end = blocks[b]
+
+            copies = dict(copies_in[b])
+            for command in commands[start:end]:
+                self.copy_command(replace_inputs(command, copies), copies, local_values)
+
+            for b2 in successors[b]:
+                if copies_in[b2] is None: new_copies = copies
+                else: new_copies = {v: arg for v, arg in copies_in[b2].items() if copies.get(v) == arg}
+
+                if new_copies != copies_in[b2]:
+                    copies_in[b2] = new_copies
+                    if b2 not in pending:
+                        worklist.append(b2)
+                        pending.add(b2)
+
+        new_commands = []
+        for b, (start, end) in enumerate(blocks):
+            copies = dict(copies_in[b] or {})
+            for command in commands[start:end]:
+                command = replace_inputs(command, copies)
+                if (not isinstance(command, value_cmds.Set) or
+                        command.output is not command.arg and copies.get(command.output) is not command.arg):
+                    new_commands.append(command)
+                self.copy_command(command, copies, local_values)
+
+        return new_commands
+
+    @staticmethod
+    def copy_command(command, copies, local_values):
+        """ Update the copies known to be held in local values for the effect of the given command """
+        outputs = command.outputs()
+        if not outputs: return
+
+        # A value output no longer holds a copy, and no longer holds what was copied from it
+        for v in [v for v, arg in copies.items() if v in outputs or arg in outputs]: del copies[v]
+
+        if is_copy(command, local_values): copies[command.output] = command.arg
+
+    def coalesce_copies(self, commands):
+        """Coalesce each Set(x, t) in the given commands with the command before it in its block which outputs t, when
+        t is used nowhere else. That command outputs x instead, and the Set is removed. Neither t nor x may be used
+        between the two commands, and the command must not read x, since a command may write its output before it
+        has read all of its inputs.
+            returns - optimized list of commands.
+        """
+        local_values = self.get_local_values(commands)
+        infos, blocks, successors = get_blocks(commands)
+        live_out = get_live_out(infos, blocks, successors, local_values)
+
+        new_commands = []
+        for (start, end), live in zip(blocks, live_out):
+            # Local values live after each command of the block
+            live_after = []
+            for command in reversed(commands[start:end]):
+                live_after.append(live)
+                live = live - set(command.outputs()) | local_values.intersection(command.inputs())
+            live_after.reverse()
+
+            block_commands = []
+            for command, live in zip(commands[start:end], live_after):
+                if is_copy(command, local_values) and command.arg not in live:
+                    i = self.find_output(block_commands, command.arg, command.output)
+                    if i is not None:
+                        block_commands[i] = replace_output(block_commands[i], command.output)
+                        continue
+
+                block_commands.append(command)
+
+            new_commands.extend(block_commands)
+
+        return new_commands
+
+    @staticmethod
+    def find_output(block_commands, v, new_v):
+        """Return the index of the last of the given commands, which outputs only v, if v can be replaced with new_v in
+        it. Returns None if there is no such command, or if a command after it uses v or new_v.
+        """
+        for i in range(len(block_commands) - 1, -1, -1):
+            command = block_commands[i]
+            inputs, outputs = command.inputs(), command.outputs()
+            if outputs == [v]:
+                if new_v in inputs or not get_attrs(OUTPUT_ATTRS, command): return None
+                return i
+            if v in inputs or v in outputs or new_v in inputs or new_v in outputs: return None
+
+    def remove_dead_stores(self, commands):
+        """Remove commands from the given commands which have no effect but to output local values that are never used
+        after, repeating until every output left may be used. Commands which may write indirectly, and calls and
+        control flow commands, are always kept.
+            returns - optimized list of commands.
+        """
+        local_values = self.get_local_values(commands)
+
+        while True:
+            infos, blocks, successors = get_blocks(commands)
+            live_out = get_live_out(infos, blocks, successors, local_values)
+
+            new_commands = []
+            for (start, end), live in zip(blocks, live_out):
+                block_commands = []
+                for command in reversed(commands[start:end]):
+                    outputs = command.outputs()
+                    if (outputs and local_values.issuperset(outputs) and live.isdisjoint(outputs) and
+                            not command.indirect_write() and not command.targets() and
+                            not isinstance(command, control_cmds.Call)):
+                        continue
+
+                    live = live - local_values.intersection(outputs) | local_values.intersection(command.inputs())
+                    block_commands.append(command)
+
+                new_commands.extend(block_commands[::-1])
+
+            if len(new_commands) == len(commands): return new_commands
+            commands = new_commands
+
+    def number_values(self, commands):
+        """Remove recomputations from each block of the given commands by local value numbering. Each local value is
+        given a number in each block, such that two values with the same number hold the same bits. A pure math or
+        compare command, AddrOf or AddrRel which computes an expression of numbers already computed in the block, into
+        a local value which still holds the result, becomes a Set from that value. Copy propagation then usually
+        removes the Set.
+
+        Values which are not local may change without being output, so each of their reads gets a new number.
+            returns - optimized list of commands.
+        """
+        local_values = self.get_local_values(commands)
+        _, blocks, _ = get_blocks(commands)
+        numbers = itertools.count()
+
+        new_commands = []
+        for start, end in blocks:
+            value_nums = {}
+
+            # Local value holding the result of each expression computed in the block, and the expressions whose
+            # result each local value holds
+            results, held = {}, {}
+
+            def number(v):
+                if v in self.il_code.literals or v in local_values:
+                    if v not in value_nums: value_nums[v] = next(numbers)
+                    return value_nums[v]
+                return next(numbers)
+
+            for command in commands[start:end]:
+                key = self.expression_key(command, number)
+                result = results.get(key) if key else None
+                if result and result is command.output: continue
+                elif result: command = value_cmds.Set(command.output, result)
+
+                # The number of a value output is known if the command copies it from a value of the same bits
+                num = number(command.arg) if copies_bits(command) else None
+
+                for v in command.outputs():
+                    for old_key in held.pop(v, []): del results[old_key]
+                    value_nums.pop(v, None)
+
+                if num is not None and command.output in local_values: value_nums[command.output] = num
+                elif key and command.output in local_values:
+                    value_nums[command.output] = next(numbers)
+                    results[key] = command.output
+                    held.setdefault(command.output, []).append(key)
+
+                new_commands.append(command)
+
+        return new_commands
+
+    @staticmethod
+    def expression_key(command, number):
+        """Return a key for the expression computed by given command, equal for two commands which compute the same
+        bits, or None if the command is not a pure math or compare command, AddrOf or AddrRel.
+            number - Function which returns the value number of a value.
+        """
+        if isinstance(command, value_cmds.AddrOf): return value_cmds.AddrOf, command.var
+        elif isinstance(command, value_cmds.AddrRel):
+            return value_cmds.AddrRel, command.base, command.block, number(command.count) if command.count else None
+
+        comm = get_attrs(PURE_COMMANDS, command)
+        if not comm or not command.output.ctype.is_scalar(): return None
+
+        args = [(number(v), ctype_key(v.ctype)) for v in command.inputs()]
+        if comm(command): args.sort()
+        return (type(command), ctype_key(command.output.ctype)) + tuple(args)
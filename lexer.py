@@ -2,143 +2,251 @@
 generates a flat list of tokens present in that input file.
 """
 
-from errors import CompilerError, Position, Range, error_collector
+from errors import CompilerError, Range, Source, error_collector
 from token_kinds import symbol_kinds, keyword_kinds
 from tokens import Token
-from re import match
+from bisect import bisect_right
 import token_kinds
+import sys
+import re
 
 STR_EX = []
 
+# Prefix trie of the symbol representations, used for longest-match lookup of symbols. Each node is a dictionary
+# mapping the next character to the child node, and the None key of a node maps to the symbol kind ending there.
+_symbol_trie = {}
+for _kind in symbol_kinds:
+    _node = _symbol_trie
+    for _c in _kind.text_repr:
+        _node = _node.setdefault(_c, {})
+    _node[None] = _kind
+
+# Master pattern which splits off the lexical units that are not symbols or blocks. The alternatives are:
+#   space - run of whitespace, which just separates blocks.
+#   comment - start of a C-style comment. A following `=` makes this a `/` symbol followed by `*=` instead.
+#   line_comment - start of a C++-style comment. Again, `//=` is a `/` symbol followed by `/=`.
+#   quote - opening quote of a string or a character constant.
+_master = re.compile(r"(?P<space>\s+)|(?P<comment>/\*(?!=))|(?P<line_comment>//(?!=))|(?P<quote>[\"'])")
+
+# Run of characters at which no symbol can start. A block continues through characters which begin some symbol only if
+# no symbol actually matches there, like a single `|`.
+_block_chars = re.compile("[^\\s" + "".join(re.escape(c) for c in _symbol_trie) + "]*")
+
+# End of a C-style comment. As above, `*/=` does not end a comment.
+_comment_end = re.compile(r"\*/(?!=)")
+
+# Keyword kinds by their representation, and patterns of the other kinds of blocks.
+_keyword_map = {kind.text_repr: kind for kind in keyword_kinds}
+_binary = re.compile(r"^0[bB][01]+$")
+_identifier = re.compile(r"[_a-zA-Z][_a-zA-Z0-9]*$")
+
+
+class Line:
+    """Class representing a logical line of the input, that is a line after escaped newlines are joined. Positions of
+    characters in the line are not stored, but computed from their offsets when a token or an error needs them.
+        source (Source) - Source file this line comes from.
+        text (str) - Contents of the logical line, without the escaped newlines.
+        starts (List[int]) - Offset in text at which each of the joined physical lines begins.
+        offsets (List[int]) - Offset in the source file at which each of the joined physical lines begins.
+    """
 
-class Tagged:
-    """Class representing tagged characters.
-        c (char) - the character that is tagged.
-        p (Position) - position of the tagged character.
-        r (Range) - a length-one range for the character.
+    def __init__(self, source):
+        """ Initialize an empty line """
+        self.source = source
+        self.text = ""
+        self.starts = []
+        self.offsets = []
+
+    def add(self, offset, full_line):
+        """ Append the physical line at the given source offset with the given text to this line """
+        self.starts.append(len(self.text))
+        self.offsets.append(offset)
+        self.text += full_line
+
+    def remove_last(self):
+        """ Remove the last character of this line, which is an escaping backslash """
+        self.text = self.text[:-1]
+
+        # Physical lines appended after the removed character were empty, so they now begin at the new end.
+        for i, start in enumerate(self.starts):
+            if start > len(self.text): self.starts[i] = len(self.text)
+
+    def offset(self, index):
+        """ Return the offset in the source file of the character at the given offset in this line """
+        i = bisect_right(self.starts, index) - 1 if len(self.starts) > 1 else 0
+        return self.offsets[i] + index - self.starts[i]
+
+    def range(self, start, end):
+        """ Return the Range covering characters from offset start to offset end, both inclusive """
+        start_offset = self.offset(start)
+        return Range.from_offsets(self.source, start_offset, self.offset(end) if end != start else start_offset)
+
+
+class LexerFailed(Exception):
+    """ Raised in place of the next token by stop_at_errors, once the lexer has reported errors """
+    pass
+
+
+class TokenWindow:
+    """Indexable view of a stream of tokens. Tokens are read from the stream only when an index at or past them is
+    requested, and tokens which are released are dropped from the window. This lets the parser index into tokens as if
+    they were a list, while only the tokens between the oldest unreleased one and the furthest lookahead are in memory.
+        tokens - Iterator of the Token objects in the stream.
+        start (int) - Index of the first token kept in the window.
+        buffer (List[Token]) - Tokens kept in the window, beginning at index start.
+        done (bool) - Whether all tokens have been read from the stream.
     """
 
-    def __init__(self, c, p):
-        """ Initialize object """
-        self.c = c
-        self.p = p
-        self.r = Range(p, p)
+    def __init__(self, tokens):
+        """ Initialize the window over the given iterable of tokens """
+        self.tokens = iter(tokens)
+        self.start = 0
+        self.buffer = []
+        self.done = False
+
+    def has(self, index):
+        """ Return True if there is a token at the given index """
+        while self.start + len(self.buffer) <= index and not self.done:
+            try:
+                self.buffer.append(next(self.tokens))
+            except StopIteration:
+                self.done = True
+
+        return 0 <= index < self.start + len(self.buffer)
+
+    def release(self, index):
+        """ Drop all tokens before the given index from the window. They cannot be read afterwards """
+        if index > self.start:
+            del self.buffer[:index - self.start]
+            self.start = index
+
+    def __getitem__(self, index):
+        """ Return the token at the given index. Negative indices count from the end of the stream """
+        if index < 0: index += len(self)
+
+        if index < self.start:
+            raise IndexError("token was released from window")
+        elif not self.has(index):
+            raise IndexError("token index out of range")
+
+        return self.buffer[index - self.start]
+
+    def __len__(self):
+        """ Return the total number of tokens. This reads all remaining tokens of the stream into the window """
+        self.has(float("inf"))
+        return self.start + len(self.buffer)
 
 
 def tokenize(code, filename):
     """Convert given code into a flat list of Tokens.
-        lines - List of list of Tagged objects, where each embedded list is a separate line in the input program.
+        code (str, or Source) - Input file contents as a string, or the Source of the input file.
+        filename (str) - Input file name.
         return - List of Token objects.
     """
-    # Store tokens as they are generated
-    tokens = []
+    return list(iter_tokens(code, filename))
 
-    lines = split_to_tagged_lines(code, filename)
-    join_extended_lines(lines)
 
+def iter_tokens(code, filename):
+    """Generate the Tokens of given code one at a time. Lines are read and tokenized only as the tokens are consumed, so
+    only the current line is held in addition to the code itself. Errors are added to the error collector as lines
+    containing them are reached.
+        code (str, or Source) - Input file contents as a string, or the Source of the input file.
+        filename (str) - Input file name.
+        return - Iterator of Token objects.
+    """
     in_comment = False
-    for line in lines:
+    for line in split_to_lines(code, filename):
         try:
             line_tokens, in_comment = tokenize_line(line, in_comment)
-            tokens += line_tokens
         except CompilerError as e:
             error_collector.add(e)
+            continue
 
-    return tokens
+        yield from line_tokens
 
 
-def split_to_tagged_lines(text, filename):
-    """Split the input text into tagged lines. No newline escaping or other preprocessing is done by this function.
-        text (str) - Input file contents as a string.
-        filename (str) - Input file name.
-        return - Tagged lines. List of list of Tagged objects, where each second order list is a separate line in the
-        input program. No newline characters.
+def stop_at_errors(tokens):
+    """Generate the given Tokens until the lexer has reported an error. The rest of the tokens are then read, so every
+    lexer error is added to the error collector as it would be by tokenize, and LexerFailed is raised so that the parser
+    does not run over the tokens which were left after the errors.
+        tokens - Iterable of Token objects, such as the generator from iter_tokens.
+        return - Iterator of Token objects.
     """
-    lines = text.splitlines()
-    tagged_lines = []
-    for line_num, line in enumerate(lines):
-        tagged_line = []
-        for col, char in enumerate(line):
-            p = Position(filename, line_num + 1, col + 1, line)
-            tagged_line.append(Tagged(char, p))
-        tagged_lines.append(tagged_line)
+    tokens = iter(tokens)
+    for token in tokens:
+        if not error_collector.ok(): break
+        yield token
 
-        line_num += 1
+    for _ in tokens: pass
+    if not error_collector.ok(): raise LexerFailed
 
-    return tagged_lines
 
-
-def join_extended_lines(lines):
-    """Join together any lines which end in an escaped newline. This function modifies the given lines object in place.
-        lines - List of list of Tagged objects, where each embedded list is a separate line in the input program.
+def split_to_lines(text, filename):
+    """Split the input text into logical lines, joining together any lines which end in an escaped newline. Lines are
+    split at the same boundaries as str.splitlines, but generated one at a time.
+        text (str, or Source) - Input file contents as a string, or the Source of the input file.
+        filename (str) - Input file name.
+        return - Iterator of Line objects. No newline characters.
     """
+    source = text if isinstance(text, Source) else Source(filename, text)
+    physical = source.lines()
 
-    i = 0
-    while i < len(lines):
-        if lines[i] and lines[i][-1].c == "\\":
-            # There is a next line to collapse into this one
-            if i + 1 < len(lines):
-                del lines[i][-1]  # remove trailing backslash
-                lines[i] += lines[i + 1]  # concatenate with next line
-                del lines[i + 1]  # remove next line
+    for offset, full_line in physical:
+        line = Line(source)
+        line.add(offset, full_line)
 
-                # Decrement i, so this line is checked for a new trailing backslash.
-                i -= 1
+        # If the line ends in a backslash, remove it and concatenate the next line. The joined line is then checked again
+        # for a new trailing backslash.
+        while line.text.endswith("\\"):
+            line.remove_last()
 
-            # There is no next line to collapse into this one
-            else:
-                del lines[i][-1]  # remove trailing backslash
+            next_line = next(physical, None)
+            if not next_line: break
+
+            line.add(*next_line)
 
-        i += 1
+        yield line
 
 
 def tokenize_line(line, in_comment):
     """Tokenize the given single line.
-        line - List of Tagged objects.
+        line (Line) - Logical line to tokenize.
         in_comment - Whether the first character in this line is part of a C-style comment body.
         return - List of Token objects, and boolean indicating whether the next character is part of a comment body.
     """
     tokens = []
+    text = line.text
 
-    # line[block_start:block_end] is the section of the line currently being considered for conversion into a token;
-    # this string will be called the 'block'. Everything before the block has already been tokenized, and everything
-    # after has not yet been examined
-    block_start = 0
-    block_end = 0
+    # Everything before pos has already been tokenized, and everything after has not yet been examined.
+    pos = 0
+    while pos < len(text):
+        if in_comment:
+            # Skip to the end of the comment, or the rest of the line if the comment does not end here.
+            comment_end = _comment_end.search(text, pos)
+            if not comment_end: break
 
-    while block_end < len(line):
-        symbol_kind = match_symbol_kind_at(line, block_end)
-        next_ = match_symbol_kind_at(line, block_end + 1)
+            in_comment = False
+            pos = comment_end.end()
+            continue
 
-        if in_comment:
-            # If next characters end the comment...
-            if symbol_kind == token_kinds.star and next_ == token_kinds.slash:
-                in_comment = False
-                block_start = block_end + 2
-                block_end = block_start
-            # Otherwise, just skip one character.
-            else:
-                block_start = block_end + 1
-                block_end = block_start
+        unit = _master.match(text, pos)
+        kind = unit.lastgroup if unit else None
+
+        if kind == "space":
+            pos = unit.end()
 
-        # If next characters start a comment, process previous block and set in_comment to true.
-        elif symbol_kind == token_kinds.slash and next_ == token_kinds.star:
-            add_block(line[block_start:block_end], tokens)
+        # If next characters start a comment, the comment body begins right after the slash. Thus `/*/` is a comment.
+        elif kind == "comment":
             in_comment = True
+            pos += 1
 
         # If next two characters are //, we skip the rest of this line.
-        elif symbol_kind == token_kinds.slash and next_ == token_kinds.slash:
+        elif kind == "line_comment":
             break
 
-        # Skip spaces and process previous block.
-        elif line[block_end].c.isspace():
-            add_block(line[block_start:block_end], tokens)
-            block_start = block_end + 1
-            block_end = block_start
-
         # If next character is a quote, we read the whole string as a token.
-        elif symbol_kind in {token_kinds.dquote, token_kinds.squote}:
-            if symbol_kind == token_kinds.dquote:
+        elif kind == "quote":
+            if text[pos] == '"':
                 global STR_EX
                 STR_EX.append(1)
                 quote_str = '"'
@@ -149,9 +257,9 @@ def tokenize_line(line, in_comment):
                 kind = token_kinds.char_string
                 add_null = False
 
-            chars, end = read_string(line, block_end + 1, quote_str, add_null)
-            rep = block_to_str(line[block_end:end + 1])
-            r = Range(line[block_end].p, line[end].p)
+            chars, end = read_string(line, pos + 1, quote_str, add_null)
+            rep = text[pos:end + 1]
+            r = line.range(pos, end)
 
             if kind == token_kinds.char_string and len(chars) == 0:
                 err = "empty character constant"
@@ -161,58 +269,61 @@ def tokenize_line(line, in_comment):
                 error_collector.add(CompilerError(err, r))
 
             tokens.append(Token(kind, chars, rep, r=r))
-            block_start = end + 1
-            block_end = block_start
-
-        # If next character is another symbol, add previous block and then add the symbol.
-        elif symbol_kind:
-            symbol_start_index = block_end
-            symbol_end_index = block_end + len(symbol_kind.text_repr) - 1
-
-            r = Range(line[symbol_start_index].p, line[symbol_end_index].p)
-            symbol_token = Token(symbol_kind, r=r)
+            pos = end + 1
 
-            add_block(line[block_start:block_end], tokens)
-            tokens.append(symbol_token)
-
-            block_start = block_end + len(symbol_kind.text_repr)
-            block_end = block_start
-
-        # Include another character in the block.
         else:
-            block_end += 1
+            symbol_kind = match_symbol_kind_at(text, pos)
 
-    # Flush out anything that is left in the block to the output
-    add_block(line[block_start:block_end], tokens)
+            # If next character is a symbol, add the symbol.
+            if symbol_kind:
+                end = pos + len(symbol_kind.text_repr)
+                tokens.append(Token(symbol_kind, r=line.range(pos, end - 1)))
 
-    return tokens, in_comment
+            # Otherwise, read a block. A block which runs directly into a quote is dropped together with the characters
+            # it holds.
+            else:
+                end = match_block_end(text, pos)
+                if not text.startswith(("\"", "'"), end):
+                    add_block(line, pos, end, tokens)
 
+            pos = end
 
-def block_to_str(block):
-    """Convert the given block to a string.
-        block - list of Tagged characters.
-        return - string representation of the list of Tagged characters.
-    """
-    return "".join(c.c for c in block)
+    return tokens, in_comment
 
 
 def match_symbol_kind_at(content, start):
-    """Return the longest matching symbol token kind.
-        content - List of Tagged objects in which to search for match.
+    """Return the longest matching symbol token kind. The symbol trie is walked along the content, so this takes time
+    proportional to the length of the symbol found.
+        content (str) - String in which to search for match.
         start (int) - Index, inclusive, at which to start searching for a match.
         returns (TokenType or None) - Symbol token found, or None if no token is found.
     """
-    for symbol_kind in symbol_kinds:
-        try:
-            for i, c in enumerate(symbol_kind.text_repr):
-                if content[start + i].c != c:
-                    break
-            else:
-                return symbol_kind
-        except IndexError:
-            pass
+    node = _symbol_trie
+    symbol_kind = None
+    for i in range(start, len(content)):
+        node = node.get(content[i])
+        if node is None: break
+
+        symbol_kind = node.get(None, symbol_kind)
+
+    return symbol_kind
+
+
+def match_block_end(content, start):
+    """Return the end of the block which begins at given index. A block runs until whitespace or the start of a symbol.
+        content (str) - String in which the block is located.
+        start (int) - Index, inclusive, at which the block begins.
+        returns (int) - Index one past the last character of the block.
+    """
+    end = start
+    while end < len(content):
+        end = _block_chars.match(content, end).end()
+        if end == len(content) or content[end].isspace() or match_symbol_kind_at(content, end): break
+
+        # This character may begin a symbol, but none matches here.
+        end += 1
 
-    return None
+    return end
 
 
 def read_string(line, start, delim, null):
@@ -222,11 +333,12 @@ def read_string(line, start, delim, null):
     that were read, not the length of the string. The latter is the length of the lexed string list. The lexed string is
     a list of integers, where each integer is the ASCII value (between 0 and 128) of the corresponding character in the
     string. The returned lexed string includes a null-terminator.
-        line - List of Tagged objects for each character in the line.
+        line (Line) - Logical line containing the string.
         start - Index at which to start reading the string.
         delim - Delimiter with which the string ends, like `"` or `'`
         null - Whether to add a null-terminator to the returned character list
     """
+    text = line.text
     i = start
     chars = []
 
@@ -246,43 +358,45 @@ def read_string(line, start, delim, null):
     hexdigits = "0123456789abcdefABCDEF"
 
     while True:
-        if i >= len(line):
+        if i >= len(text):
             descr = "missing terminating quote"
-            raise CompilerError(descr, line[start - 1].r)
-        elif line[i].c == delim:
+            raise CompilerError(descr, line.range(start - 1, start - 1))
+        elif text[i] == delim:
             if null: chars.append(0)
             return chars, i
-        elif i + 1 < len(line) and line[i].c == "\\" and line[i + 1].c in escapes:
-            chars.append(escapes[line[i + 1].c])
+        elif i + 1 < len(text) and text[i] == "\\" and text[i + 1] in escapes:
+            chars.append(escapes[text[i + 1]])
             i += 2
-        elif i + 1 < len(line) and line[i].c == "\\" and line[i + 1].c in octdigits:
-            octal = line[i + 1].c
+        elif i + 1 < len(text) and text[i] == "\\" and text[i + 1] in octdigits:
+            octal = text[i + 1]
             i += 2
-            while i < len(line) and len(octal) < 3 and line[i].c in octdigits:
-                octal += line[i].c
+            while i < len(text) and len(octal) < 3 and text[i] in octdigits:
+                octal += text[i]
                 i += 1
             chars.append(int(octal, 8))
-        elif i + 2 < len(line) and line[i].c == "\\" and line[i + 1].c == "x" and line[i + 2].c in hexdigits:
-            hexa = line[i + 2].c
+        elif i + 2 < len(text) and text[i] == "\\" and text[i + 1] == "x" and text[i + 2] in hexdigits:
+            hexa = text[i + 2]
             i += 3
-            while i < len(line) and line[i].c in hexdigits:
-                hexa += line[i].c
+            while i < len(text) and text[i] in hexdigits:
+                hexa += text[i]
                 i += 1
             chars.append(int(hexa, 16))
         else:
-            chars.append(ord(line[i].c))
+            chars.append(ord(text[i]))
             i += 1
 
 
-def add_block(block, tokens):
+def add_block(line, start, end, tokens):
     """Convert block into a token if possible and add to tokens. If block is non-empty but cannot be made into a token,
     this function records a compiler error. We don't need to check for symbol kind tokens here because they are
     converted before they are shifted into the block.
-        block - block to convert into a token, as list of Tagged characters.
+        line (Line) - Logical line containing the block.
+        start, end (int) - Offsets of the block in the line, end exclusive.
         tokens (List[Token]) - List of the tokens so fat parsed.
     """
-    if block:
-        range_ = Range(block[0].p, block[-1].p)
+    if start < end:
+        block = line.text[start:end]
+        range_ = line.range(start, end - 1)
 
         keyword_kind = match_keyword_kind(block)
         if keyword_kind:
@@ -296,11 +410,12 @@ def add_block(block, tokens):
 
         identifier_name = match_identifier_name(block)
         if identifier_name:
+            # Intern the name, so that the many tokens of one identifier share a string
             tokens.append(Token(
-                token_kinds.identifier, identifier_name, r=range_))
+                token_kinds.identifier, sys.intern(identifier_name), r=range_))
             return
 
-        descr = f"unrecognized token at '{block_to_str(block)}'"
+        descr = f"unrecognized token at '{block}'"
         raise CompilerError(descr, range_)
 
 
@@ -309,40 +424,34 @@ def isbinary(token):
         token (int) - the int to check if it binary or not.
     returns (boolean) - True (1) if given int is in binary representation, False (0) if not.
     """
-    return 1 if match(r'^0[bB][01]+$', token) else 0
+    return 1 if _binary.match(token) else 0
 
 
-def match_keyword_kind(token_repr):
-    """Find the longest keyword token kind with representation token_repr.
-        token_repr - Token representation to match exactly, as list of Tagged characters.
+def match_keyword_kind(token_str):
+    """Find the keyword token kind with representation token_str.
+        token_str (str) - Token representation to match exactly.
         returns (TokenKind, or None) - Keyword token kind that matched.
     """
-    token_str = block_to_str(token_repr)
-    for keyword_kind in keyword_kinds:
-        if keyword_kind.text_repr == token_str:
-            return keyword_kind
-    return None
+    return _keyword_map.get(token_str)
 
 
-def match_number_string(token_repr):
+def match_number_string(token_str):
     """Return a string that represents the given constant number.
-        token_repr - List of Tagged characters.
+        token_str (str) - Token representation.
         returns (str, or None) - String representation of the number.
     """
-    token_str = block_to_str(token_repr)
     if token_str.isdigit():
         return token_str
     elif isbinary(token_str):
         return str(int(token_str, 2))
 
 
-def match_identifier_name(token_repr):
+def match_identifier_name(token_str):
     """Return a string that represents the name of an identifier.
-        token_repr - List of Tagged characters.
+        token_str (str) - Token representation.
         returns (str, or None) - String name of the identifier.
     """
-    token_str = block_to_str(token_repr)
-    if match(r"[_a-zA-Z][_a-zA-Z0-9]*$", token_str):
+    if _identifier.match(token_str):
         return token_str
     else:
         return None
@@ -4,10 +4,12 @@ import argparse
 import sys
 import lexer
 
-from errors import error_collector, CompilerError
+from errors import error_collector, CompilerError, Source
 from il_gen import ILCode, SymbolTable, Context
 from myparser.myparser import parse
-from asm_gen import ASMCode, MASMCode, ASMGen
+from myparser.utils import PackratCache
+from asm_gen import MASMCode, ASMGen
+from il_opt import ILOptimizer
 
 
 def main():
@@ -21,13 +23,24 @@ def main():
         input("\nPress Any Key To Exit...")
         return 1
 
-    token_list = lexer.tokenize(code, filename)
-    if not error_collector.ok():
+    # Tokens are read as the parser reaches them. A list of the tokens is kept only if they are to be displayed.
+    tokens = lexer.iter_tokens(code, filename)
+    if arguments.show_tokens: tokens = list(tokens)
+
+    # Parsing stops once the lexer reports an error, and only then are the lexer errors shown.
+    packrat = PackratCache() if arguments.packrat_parse else None
+    try:
+        ast_root = parse(lexer.stop_at_errors(tokens), packrat, arguments.pratt_parse)
+    except lexer.LexerFailed:
         error_collector.show()
         input("\nPress Any Key To Exit...")
         return 1
 
-    ast_root = parse(token_list)
+    # Display the packrat cache performance if indicated on the command line.
+    if arguments.show_parse_perf and packrat:  # pragma: no cover
+        print("packrat hits", packrat.hits)
+        print("packrat misses", packrat.misses)
+
     if not error_collector.ok():
         error_collector.show()
         input("\nPress Any Key To Exit...")
@@ -41,20 +54,27 @@ def main():
         input("\nPress Any Key To Exit...")
         return 1
 
+    # Optimize the IL generated if indicated on the command line.
+    if arguments.optimize_il: ILOptimizer(il_code, symbol_table).optimize()
+
     # Display the IL generated if indicated on the command line.
     if arguments.show_il: print(str(il_code))
 
     # Display the tokens generated if indicated on the command line.
-    if arguments.show_tokens: print(token_list)
+    if arguments.show_tokens: print(tokens)
 
     # Display the AST generated if indicated on the command line.
     if arguments.show_tree: print(ast_root)
 
-    asm_code, masm_code = ASMCode(), MASMCode()
-    ASMGen(il_code, symbol_table, asm_code, arguments).make_asm()
-    ASMGen(il_code, symbol_table, masm_code, arguments).make_asm()
+    # Only MASM code is saved, so registers are allocated and code is generated once, for MASM.
+    masm_code = MASMCode()
+    masm_gen = ASMGen(il_code, symbol_table, masm_code, arguments)
+    masm_gen.make_asm()
     masm_source = masm_code.full_code()
 
+    # Save the register allocator report if indicated on the command line.
+    if arguments.reg_alloc_report: write_report(masm_gen.report, arguments.reg_alloc_report)
+
     if not error_collector.ok():
         error_collector.show()
         input("\nPress Any Key To Exit...")
@@ -96,6 +116,38 @@ def get_arguments():
     parser.add_argument("-show-reg-alloc-perf", help="display register allocator performance info",
                         dest="show_reg_alloc_perf", action="store_true")
 
+    # Boolean flag for whether to memoize parse results while the parser backtracks
+    parser.add_argument("-packrat-parse", help="memoize parse results (packrat parsing)", dest="packrat_parse",
+                        action="store_true")
+
+    # Boolean flag for whether to parse binary operators by precedence climbing
+    parser.add_argument("-pratt-parse", help="parse binary operators by precedence climbing", dest="pratt_parse",
+                        action="store_true")
+
+    # Boolean flag for whether to print parser performance info
+    parser.add_argument("-show-parse-perf", help="display parser performance info", dest="show_parse_perf",
+                        action="store_true")
+
+    # Number of nodes to spill at once when allocating registers, or 0 to spill one at a time and restart allocation
+    parser.add_argument("-spill-batch", help="spill up to N cheapest nodes per round without restarting allocation",
+                        dest="spill_batch", type=int, metavar="N")
+
+    # Number of processes in which to allocate registers for the functions in parallel, or 1 to allocate them in turn
+    parser.add_argument("-jobs", help="allocate registers for the functions in N parallel processes", dest="jobs",
+                        type=int, metavar="N")
+
+    # Boolean flag for whether to allocate registers by linear scan rather than by coloring the conflict graph
+    parser.add_argument("-linear-scan", help="allocate registers by linear scan over live intervals",
+                        dest="linear_scan", action="store_true")
+
+    # File to which to write register allocator statistics for each function, as CSV or JSON
+    parser.add_argument("-reg-alloc-report", help="write per-function register allocator statistics to FILE, as CSV "
+                        "if FILE ends in .csv and as JSON otherwise", dest="reg_alloc_report", metavar="FILE")
+
+    # Boolean flag for whether to run the optimization passes over the generated IL
+    parser.add_argument("-optimize-il", help="optimize the generated IL before generating ASM", dest="optimize_il",
+                        action="store_true")
+
     # Boolean flag for whether to allocate any variables in registers
     parser.add_argument("-variables-on-stack", help="allocate all variables on the stack",
                         dest="variables_on_stack", action="store_true")
@@ -104,15 +156,16 @@ def get_arguments():
     parser.set_defaults(show_il=False)
     parser.set_defaults(show_tokens=False)
     parser.set_defaults(show_tree=False)
+    parser.set_defaults(spill_batch=0)
+    parser.set_defaults(jobs=1)
 
     return parser.parse_args()
 
 
 def read_file(arguments):
-    """ Read the file(s) in arguments and return the file contents """
+    """ Read the file(s) in arguments and return the Source of the file contents """
     try:
-        with open(arguments.filename) as c_file:
-            return c_file.read(), arguments.filename
+        return Source.read(arguments.filename), arguments.filename
     except IOError:
         descr = "could not read file: '{}'"
         error_collector.add(CompilerError(descr.format(arguments.filename)))
@@ -131,5 +184,18 @@ def write_asm(asm_source, asm_filename):
         error_collector.add(CompilerError(descr.format(asm_filename)))
 
 
+def write_report(report, report_filename):
+    """Save the given register allocator report to disk at report_filename.
+        report (AllocReport) - Statistics of each function allocated.
+        report_filename (str) - Filename to which to save the report.
+    """
+    try:
+        with open(report_filename, "w", newline="") as report_file:
+            report.write(report_file)
+    except IOError:
+        descr = "could not write register allocator report '{}'"
+        error_collector.add(CompilerError(descr.format(report_filename)))
+
+
 if __name__ == "__main__":
     sys.exit(main())
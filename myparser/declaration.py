@@ -1,7 +1,7 @@
 """ Parser logic that parses declaration nodes """
 
 from myparser.utils import (add_range, ParserError, match_token, token_is, raise_error, log_error, token_in)
-from errors import error_collector, CompilerError
+from errors import CompilerError
 from myparser.expression import parse_expression
 import tree.decl_tree as decl_nodes
 import tree.tree as nodes
@@ -58,9 +58,9 @@ def parse_abstract_declarator(index):
         node = node.child
 
     if node.identifier:
-        # add error to the error_collector because more of a semantic error than a parsing error
+        # add error to the error collector because more of a semantic error than a parsing error
         err = "expected abstract declarator, but identifier name was provided"
-        error_collector.add(CompilerError(err, node.identifier.r))
+        p.current().errors.add(CompilerError(err, node.identifier.r))
 
     return root, index
 
@@ -113,6 +113,7 @@ def parse_decl_specifiers(index, spec_qual=False):
     The returned `specs` list may contain two types of elements: tokens and Node objects.
     A Node object will be included for a struct declaration, and a token for all other declaration specifiers.
     """
+    tokens, symbols = p.current().tokens, p.current().symbols
     type_specs = set(ctypes.simple_types.keys())
     type_specs |= {token_kinds.signed_kw, token_kinds.unsigned_kw}
 
@@ -140,26 +141,26 @@ def parse_decl_specifiers(index, spec_qual=False):
             type_spec_class = STRUCT
 
         # Match a typedef name
-        elif not type_spec_class and token_is(index, token_kinds.identifier) and p.symbols.is_typedef(p.tokens[index]):
-            specs.append(p.tokens[index])
+        elif not type_spec_class and token_is(index, token_kinds.identifier) and symbols.is_typedef(tokens[index]):
+            specs.append(tokens[index])
             index += 1
             type_spec_class = TYPEDEF
 
         elif type_spec_class in {None, SIMPLE} and token_in(index, type_specs):
-            specs.append(p.tokens[index])
+            specs.append(tokens[index])
             index += 1
             type_spec_class = SIMPLE
 
         elif token_in(index, type_quals):
-            specs.append(p.tokens[index])
+            specs.append(tokens[index])
             index += 1
 
         elif token_in(index, storage_specs):
             if not spec_qual:
-                specs.append(p.tokens[index])
+                specs.append(tokens[index])
             else:
                 err = "storage specifier not permitted here"
-                error_collector.add(CompilerError(err, p.tokens[index].r))
+                p.current().errors.add(CompilerError(err, tokens[index].r))
             index += 1
 
         else:
@@ -235,12 +236,15 @@ def find_pair_forward(index, open_=token_kinds.open_paren, close=token_kinds.clo
         close - token kind representing the close parenthesis.
         mess - message for error on mismatch.
     """
+    tokens = p.current().tokens
     depth = 0
-    for i in range(index, len(p.tokens)):
-        if p.tokens[i].kind == open_: depth += 1
-        elif p.tokens[i].kind == close: depth -= 1
+    i = index
+    while tokens.has(i):
+        if tokens[i].kind == open_: depth += 1
+        elif tokens[i].kind == close: depth -= 1
 
         if depth == 0: break
+        i += 1
     else:
         # if loop did not break, no close paren was found
         raise_error(mess, index, ParserError.AT)
@@ -250,10 +254,11 @@ def find_pair_forward(index, open_=token_kinds.open_paren, close=token_kinds.clo
 def find_pair_backward(index, open_=token_kinds.open_paren, close=token_kinds.close_paren,
                        mess="mismatched parentheses in declaration"):
     """ Find the opening parenthesis for the closing at given index. Same parameters as _find_pair_forward above """
+    tokens = p.current().tokens
     depth = 0
     for i in range(index, -1, -1):
-        if p.tokens[i].kind == close: depth += 1
-        elif p.tokens[i].kind == open_: depth -= 1
+        if tokens[i].kind == close: depth += 1
+        elif tokens[i].kind == open_: depth -= 1
 
         if depth == 0: break
     else:
@@ -291,21 +296,22 @@ def _parse_declarator(start, end, is_typedef):
 
     Expects the declarator to start at start and end at end-1 inclusive. Returns a decl_nodes.Node.
     """
+    tokens = p.current().tokens
     decl = parse_declarator_raw(start, end, is_typedef)
-    decl.r = p.tokens[start].r + p.tokens[end - 1].r
+    decl.r = tokens[start].r + tokens[end - 1].r
     return decl
 
 
 def parse_declarator_raw(start, end, is_typedef):
     """Like _parse_declarator, but doesn't add `.r` range attribute."""
-
+    tokens = p.current().tokens
     if start == end: return decl_nodes.Identifier(None)
 
-    elif start + 1 == end and p.tokens[start].kind == token_kinds.identifier:
-        p.symbols.add_symbol(p.tokens[start], is_typedef)
-        return decl_nodes.Identifier(p.tokens[start])
+    elif start + 1 == end and tokens[start].kind == token_kinds.identifier:
+        p.current().symbols.add_symbol(tokens[start], is_typedef)
+        return decl_nodes.Identifier(tokens[start])
 
-    elif p.tokens[start].kind == token_kinds.star:
+    elif tokens[start].kind == token_kinds.star:
         const, index = find_const(start + 1)
         return decl_nodes.Pointer(_parse_declarator(index, end, is_typedef), const)
 
@@ -313,11 +319,11 @@ def parse_declarator_raw(start, end, is_typedef):
     if func_decl: return func_decl
 
     # First and last elements make a parenthesis pair
-    elif p.tokens[start].kind == token_kinds.open_paren and find_pair_forward(start) == end - 1:
+    elif tokens[start].kind == token_kinds.open_paren and find_pair_forward(start) == end - 1:
         return _parse_declarator(start + 1, end - 1, is_typedef)
 
     # Last element indicates an array type
-    elif p.tokens[end - 1].kind == token_kinds.close_sq_brack:
+    elif tokens[end - 1].kind == token_kinds.close_sq_brack:
         open_sq = find_pair_backward(end - 1, token_kinds.open_sq_brack, token_kinds.close_sq_brack,
                                      "mismatched square brackets in declaration")
 
@@ -366,11 +372,12 @@ def parse_struct_spec(index, node_type):
         index - index right past the type definition keyword.
         node_type - either decl_nodes.Struct.
     """
-    start_r = p.tokens[index - 1].r
+    tokens = p.current().tokens
+    start_r = tokens[index - 1].r
 
     name = None
     if token_is(index, token_kinds.identifier):
-        name = p.tokens[index]
+        name = tokens[index]
         index += 1
 
     members = None
@@ -381,5 +388,5 @@ def parse_struct_spec(index, node_type):
         err = "expected identifier or member list"
         raise_error(err, index, ParserError.AFTER)
 
-    r = start_r + p.tokens[index - 1].r
+    r = start_r + tokens[index - 1].r
     return node_type(name, members, r), index
@@ -1,6 +1,7 @@
 """ Parser logic that parses expression nodes """
 
-from myparser.utils import (add_range, match_token, token_is, ParserError, raise_error, log_error, token_in)
+from myparser.utils import (add_range, match_token, token_is, ParserError, raise_error, log_error, token_in,
+                            token_range)
 import tree.expr_tree as expr_nodes
 import tree.decl_tree as decl_nodes
 import myparser.utils as utils
@@ -16,11 +17,12 @@ def parse_expression(index):
 @add_range
 def parse_assignment(index):
     """ Parse an assignment expression """
+    tokens = utils.current().tokens
 
     left, index = parse_conditional(index)
 
-    if index < len(utils.tokens):
-        op = utils.tokens[index]
+    if tokens.has(index):
+        op = tokens[index]
         kind = op.kind
     else:
         op = None
@@ -44,9 +46,54 @@ def parse_assignment(index):
 @add_range
 def parse_conditional(index):
     """ Parse a conditional expression """
+    if utils.current().pratt: return parse_binary(index)
     return parse_logical_or(index)
 
 
+# Binary operators parsed by parse_binary, by token kind. Each has a precedence, where operators of higher precedence
+# bind more tightly, and the node produced for it. All of these operators are left associative.
+binary_operators = {token_kinds.bool_or: (1, expr_nodes.BoolOr),
+                    token_kinds.bool_and: (2, expr_nodes.BoolAnd),
+                    token_kinds.twoequals: (3, expr_nodes.Equality),
+                    token_kinds.notequal: (3, expr_nodes.Inequality),
+                    token_kinds.lt: (4, expr_nodes.LessThan),
+                    token_kinds.gt: (4, expr_nodes.GreaterThan),
+                    token_kinds.ltoe: (4, expr_nodes.LessThanOrEq),
+                    token_kinds.gtoe: (4, expr_nodes.GreaterThanOrEq),
+                    token_kinds.amp: (5, expr_nodes.BitwiseAnd),
+                    token_kinds.plus: (6, expr_nodes.Plus),
+                    token_kinds.minus: (6, expr_nodes.Minus),
+                    token_kinds.star: (7, expr_nodes.Mult),
+                    token_kinds.slash: (7, expr_nodes.Div),
+                    token_kinds.mod: (7, expr_nodes.Mod)}
+
+
+def parse_binary(index, min_prec=1):
+    """Parse binary operations with operators of at least the given precedence by precedence climbing. This parses the
+    same expressions into the same nodes as the descent from parse_logical_or to parse_multiplicative, but with one
+    call per operand rather than one call per precedence level.
+
+    As in that descent, where a node is tagged with a range only once it is returned from the parse function of its
+    level, a node gets a range only when no operator of its own precedence follows it.
+    """
+    tokens = utils.current().tokens
+    start = index
+    left, index = parse_unary(index)
+
+    while token_in(index, binary_operators):
+        op = tokens[index]
+        prec, node_type = binary_operators[op.kind]
+        if prec < min_prec: break
+
+        right, index = parse_binary(index + 1, prec + 1)
+        left = node_type(left, right, op)
+
+        if not token_in(index, binary_operators) or binary_operators[tokens[index].kind][0] < prec:
+            left.r = token_range(start, index)
+
+    return left, index
+
+
 @add_range
 def parse_logical_or(index):
     """ Parse logical or expression """
@@ -122,6 +169,7 @@ def parse_cast(index):
 @add_range
 def parse_unary(index):
     """ Parse unary expression """
+    tokens = utils.current().tokens
 
     unary_args = {token_kinds.incr: (parse_unary, expr_nodes.PreIncr),
                   token_kinds.decr: (parse_unary, expr_nodes.PreDecr),
@@ -133,7 +181,7 @@ def parse_unary(index):
                   token_kinds.compl: (parse_cast, expr_nodes.Compl)}
 
     if token_in(index, unary_args):
-        parse_func, NodeClass = unary_args[utils.tokens[index].kind]
+        parse_func, NodeClass = unary_args[tokens[index].kind]
         subnode, index = parse_func(index + 1)
         return NodeClass(subnode), index
     else:
@@ -143,6 +191,7 @@ def parse_unary(index):
 @add_range
 def parse_postfix(index):
     """ Parse postfix expression """
+    tokens = utils.current().tokens
     cur, index = parse_primary(index)
 
     while True:
@@ -158,7 +207,7 @@ def parse_postfix(index):
         elif token_is(index, token_kinds.dot) or token_is(index, token_kinds.arrow):
             index += 1
             match_token(index, token_kinds.identifier, ParserError.AFTER)
-            member = utils.tokens[index]
+            member = tokens[index]
 
             if token_is(index - 1, token_kinds.dot): cur = expr_nodes.ObjMember(cur, member)
             else: cur = expr_nodes.ObjPtrMember(cur, member)
@@ -193,24 +242,25 @@ def parse_postfix(index):
         else:
             return cur, index
 
-        cur.r = old_range + utils.tokens[index - 1].r
+        cur.r = old_range + tokens[index - 1].r
 
 
 @add_range
 def parse_primary(index):
     """ Parse primary expression """
+    tokens = utils.current().tokens
     if token_is(index, token_kinds.open_paren):
         node, index = parse_expression(index + 1)
         index = match_token(index, token_kinds.close_paren, ParserError.GOT)
         return expr_nodes.ParenExpr(node), index
     elif token_is(index, token_kinds.number):
-        return expr_nodes.Number(utils.tokens[index]), index + 1
-    elif token_is(index, token_kinds.identifier) and not utils.symbols.is_typedef(utils.tokens[index]):
-        return expr_nodes.Identifier(utils.tokens[index]), index + 1
+        return expr_nodes.Number(tokens[index]), index + 1
+    elif token_is(index, token_kinds.identifier) and not utils.current().symbols.is_typedef(tokens[index]):
+        return expr_nodes.Identifier(tokens[index]), index + 1
     elif token_is(index, token_kinds.string):
-        return expr_nodes.String(utils.tokens[index].content), index + 1
+        return expr_nodes.String(tokens[index].content), index + 1
     elif token_is(index, token_kinds.char_string):
-        chars = utils.tokens[index].content
+        chars = tokens[index].content
         return expr_nodes.Number(chars[0]), index + 1
     else:
         raise_error("expected expression", index, ParserError.GOT)
@@ -225,6 +275,7 @@ def parse_series(index, parse_base, separators):
         separators (Dict(TokenKind -> Node)) - The separators that join instances of the base symbol. Each separator
         corresponds to a Node, which is the Node produced to join two expressions connected with that separator.
     """
+    tokens = utils.current().tokens
     cur, index = parse_base(index)
     while True:
         for s in separators:
@@ -233,6 +284,6 @@ def parse_series(index, parse_base, separators):
         else:
             return cur, index
 
-        tok = utils.tokens[index]
+        tok = tokens[index]
         new, index = parse_base(index + 1)
         cur = separators[s](cur, new, tok)
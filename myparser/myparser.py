@@ -1,6 +1,7 @@
 """Entry point for the parser logic that converts a token list to an AST.
 
-Each parse_* function corresponds to a unique non-terminal symbol in the C grammar. It parses utils.tokens beginning at
+Each parse_* function corresponds to a unique non-terminal symbol in the C grammar. It parses the tokens of the running
+Parser (see utils.current) beginning at
 the given index to try to match a grammar rule that generates the desired symbol. If a match is found, it returns tuple
 (Node, index) where Node is an AST node for that match and index is one more than that of the last token consumed in
 that parse. If no match is not found, raises an appropriate ParserError.
@@ -10,32 +11,68 @@ it (using log_error), or pass the exception on to the caller. A function takes t
 possible parse paths to consider, and the second approach if the function cannot parse the entity from the tokens.
 """
 
-from myparser.utils import (add_range, log_error, ParserError, raise_error)
+from myparser.utils import (log_error, ParserError, raise_error, running, SimpleSymbolTable)
 from myparser.declaration import parse_declaration, parse_func_definition
 from errors import error_collector
+from lexer import TokenWindow
 import tree.tree as nodes
 import myparser.utils as p
 
 
-def parse(tokens_to_parse):
-    """Parse the given tokens into an AST. Also, as the entry point for the myparser, responsible for setting the tokens
-    global variable.
+class Parser:
+    """Class holding the state of one parse. The parse functions reach the Parser running in their thread through
+    utils.current, so separate Parser objects can parse in separate threads at the same time.
+        tokens (TokenWindow) - Window over the tokens being parsed.
+        symbols (SimpleSymbolTable) - Symbols declared so far in the parse.
+        best_error (ParserError) - The error logged which got furthest through the tokens.
+        packrat (PackratCache) - If given, parse results are memoized in this cache.
+        pratt (bool) - Whether to parse binary operators by precedence climbing.
+        errors (ErrorCollector) - Collector to which errors found in the parse are added.
     """
-    p.best_error = None
-    p.tokens = tokens_to_parse
 
-    with log_error():
-        return parse_root(0)[0]
+    def __init__(self, packrat=None, pratt=False, errors=error_collector):
+        """ Initialize a Parser with the given options """
+        self.tokens = None
+        self.symbols = SimpleSymbolTable()
+        self.best_error = None
+        self.packrat = packrat
+        self.pratt = pratt
+        self.errors = errors
 
-    error_collector.add(p.best_error)
-    return None
+    def parse(self, tokens_to_parse):
+        """Parse the given tokens into an AST. The tokens may be a list or any iterable, such as the generator from
+        lexer.iter_tokens, since they are read through a TokenWindow.
+        """
+        self.tokens = TokenWindow(tokens_to_parse)
+        with running(self):
+            with log_error():
+                return parse_root(0)[0]
+
+        self.errors.add(self.best_error)
+        return None
+
+
+def parse(tokens_to_parse, packrat=None, pratt=False):
+    """Parse the given tokens into an AST, with a new Parser.
+        packrat (PackratCache) - If given, parse results are memoized in this cache.
+        pratt (bool) - Whether to parse binary operators by precedence climbing.
+    """
+    return Parser(packrat, pratt).parse(tokens_to_parse)
 
 
-@add_range
 def parse_root(index):
-    """Parse the given tokens into an AST."""
+    """Parse the given tokens into an AST. The parser never goes back into an item once it is parsed, so the tokens of
+    each parsed item are released from the token window.
+    """
+    parser = p.current()
+    start_range = parser.tokens[index].r
     items = []
     while True:
+        # Keep the token before the next item, as errors after that token are reported at it. Memoized results from the
+        # items already parsed can not be used again either.
+        parser.tokens.release(index - 1)
+        if parser.packrat: parser.packrat.entries.clear()
+
         with log_error():
             item, index = parse_func_definition(index)
             items.append(item)
@@ -50,7 +87,9 @@ def parse_root(index):
         break
 
     # If there are tokens that remain unparsed, complain
-    if not p.tokens[index:]:
-        return nodes.Root(items), index
+    if not parser.tokens.has(index):
+        root = nodes.Root(items)
+        root.r = start_range + parser.tokens[index - 1].r
+        return root, index
     else:
         raise_error("unexpected token", index, ParserError.AT)
@@ -26,7 +26,7 @@ def parse_compound_statement(index):
     """ Parse a compound statement.
     A compound statement is a collection of several statements/declarations, enclosed in braces.
     """
-    p.symbols.new_scope()
+    p.current().symbols.new_scope()
     index = match_token(index, token_kinds.open_brack, ParserError.GOT)
 
     # Read block items (statements/declarations) until there are no more.
@@ -45,7 +45,7 @@ def parse_compound_statement(index):
         break
 
     index = match_token(index, token_kinds.close_brack, ParserError.GOT)
-    p.symbols.end_scope()
+    p.current().symbols.end_scope()
 
     return nodes.Compound(items), index
 
@@ -2,30 +2,67 @@
 
 from errors import CompilerError, Range
 from contextlib import contextmanager
-import copy
+from functools import partial, wraps
+import itertools
+import threading
 
-# In the myparser.py file, the main parse function sets this global variable to the list of tokens. Then, all functions
-# in myparser can reference this variable rather than passing around the tokens list everywhere.
-tokens = None
+# The Parser running in each thread. Rather than passing the state of the parse around everywhere, all functions in
+# myparser reach it through current().
+_running = threading.local()
+
+
+def current():
+    """ Return the Parser running in this thread """
+    return _running.parser
+
+
+@contextmanager
+def running(parser):
+    """ Run the given Parser in this thread for the duration of the context """
+    previous = getattr(_running, "parser", None)
+    _running.parser = parser
+    try:
+        yield
+    finally:
+        _running.parser = previous
 
 
 class SimpleSymbolTable:
     """Table to record every declared symbol. This is required to parse typedefs in C, because the parser must know
     whether a given identifier denotes a type or a value. For every declared identifier, the table records whether or
     not it is a type definition.
+
+    While a speculative parse is in progress, every change to the table records how to undo itself in an undo log, so
+    that a failed attempt can roll back just the changes it made (see log_error). The log also records how to redo each
+    change, which the packrat cache uses to repeat the changes made by a parse function.
+        undo_log (List[tuple]) - Undo function, redo function and version before the change, for each logged change.
+        depth (int) - Number of speculative parses in progress.
+        version (int) - Identifies the current contents of the table. Every change gives the table a new version, and
+        rolling back a change restores the version from before it.
     """
     def __init__(self):
         self.symbols = []
+        self.undo_log = []
+        self.depth = 0
+        self.version = next(_versions)
         self.new_scope()
 
     def new_scope(self):
         self.symbols.append({})
+        self.log_change(self.symbols.pop, self.new_scope)
 
     def end_scope(self):
-        self.symbols.pop()
+        table = self.symbols.pop()
+        self.log_change(partial(self.symbols.append, table), self.end_scope)
 
     def add_symbol(self, identifier, is_typedef):
-        self.symbols[-1][identifier.content] = is_typedef
+        table = self.symbols[-1]
+        name = identifier.content
+        if name in table: undo = partial(table.__setitem__, name, table[name])
+        else: undo = partial(table.pop, name)
+
+        table[name] = is_typedef
+        self.log_change(undo, partial(self.add_symbol, identifier, is_typedef))
 
     def is_typedef(self, identifier):
         name = identifier.content
@@ -34,8 +71,34 @@ class SimpleSymbolTable:
                 return table[name]
         return False
 
+    def begin(self):
+        """ Begin a speculative parse, and return a checkpoint to which its changes can be rolled back """
+        self.depth += 1
+        return len(self.undo_log)
+
+    def end(self):
+        """ End a speculative parse. Once no speculative parse is in progress, the changes can no longer be undone """
+        self.depth -= 1
+        if not self.depth: self.undo_log.clear()
+
+    def rollback(self, checkpoint):
+        """ Undo all changes made since the given checkpoint was returned by begin """
+        while len(self.undo_log) > checkpoint:
+            undo, _, self.version = self.undo_log.pop()
+            undo()
 
-symbols = SimpleSymbolTable()
+    def redo_since(self, checkpoint):
+        """ Return functions which repeat the changes made since the given checkpoint was returned by begin """
+        return [redo for _, redo, _ in self.undo_log[checkpoint:]]
+
+    def log_change(self, undo, redo):
+        """ Record a change just made to the table, given functions which undo and redo it """
+        if self.depth: self.undo_log.append((undo, redo, self.version))
+        self.version = next(_versions)
+
+
+# Source of symbol table versions. Versions are never reused, so a version always identifies the same table contents.
+_versions = itertools.count()
 
 
 class ParserError(CompilerError):
@@ -59,7 +122,7 @@ class ParserError(CompilerError):
         """Initialize a ParserError from the given arguments.
 
             message (str) - Base message to put in the error.
-            tokens (List[Token]) - List of tokens.
+            tokens (TokenWindow) - Window over the tokens.
             index (int) - Index of the offending token.
             message_type (int) - One of self.AT, self.GOT, or self.AFTER.
 
@@ -70,12 +133,13 @@ class ParserError(CompilerError):
         """
         self.amount_parsed = index
 
-        if len(tokens) == 0:
+        if not tokens.has(0):
             super().__init__(f"{message} at beginning of source")
             return
 
-        # If the index is too big, we're always using the AFTER form
-        if index >= len(tokens):
+        # If the index is too big, we're always using the AFTER form. All tokens have been read by then, so taking the
+        # length of the window is cheap.
+        if not tokens.has(index) and index > 0:
             index = len(tokens)
             message_type = self.AFTER
         # If the index is too small, we should not use the AFTER form
@@ -95,12 +159,87 @@ class ParserError(CompilerError):
 
 def raise_error(err, index, error_type):
     """Raise a parser error."""
-    global tokens
-    raise ParserError(err, index, tokens, error_type)
-
+    raise ParserError(err, index, current().tokens, error_type)
+
+
+class PackratCache:
+    """Memo of the results of parse_* functions decorated with add_range, for the opt-in packrat parsing mode. The
+    parser backtracks by trying several parse functions at the same index, and the memo saves them from parsing the same
+    tokens again.
+
+    A result is keyed on the parse function, its arguments and the version of the symbol table, since typedef names
+    change how tokens are parsed. Besides the node and index produced, or the ParserError raised, an entry records the
+    side effects of the call so that they are repeated when the entry is used. These are the changes made to the symbol
+    table, the errors added to the error collector, and the best error logged during the call.
+        entries (Dict[tuple, tuple]) - Cached entries, by parse function, arguments and symbol table version.
+        frames (List[List]) - For each call being recorded, a one element list holding the best error logged so far.
+        hits (int) - Number of calls answered from the memo.
+        misses (int) - Number of calls which ran the parse function.
+    """
 
-# Used to store the best error found in the parsing phase.
-best_error = None
+    def __init__(self):
+        """ Initialize an empty PackratCache """
+        self.entries = {}
+        self.frames = []
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, parse_func, index, args):
+        """ Return the result of parse_func(index, *args), from the memo if possible """
+        symbols, errors = current().symbols, current().errors
+        key = (parse_func, index, args, symbols.version)
+        entry = self.entries.get(key)
+        if entry:
+            self.hits += 1
+            return self.replay(entry)
+
+        self.misses += 1
+        issues = list(errors.issues)
+        checkpoint = symbols.begin()
+        frame = [None]
+        self.frames.append(frame)
+
+        try:
+            result = parse_func(index, *args)
+        except ParserError as e:
+            result = e
+        finally:
+            self.frames.pop()
+            redo = symbols.redo_since(checkpoint)
+            symbols.end()
+
+        new_issues = []
+        if len(errors.issues) != len(issues):
+            new_issues = [issue for issue in errors.issues if all(issue is not old for old in issues)]
+
+        self.entries[key] = result, redo, new_issues, frame[0]
+        if isinstance(result, ParserError): raise result
+        return result
+
+    def replay(self, entry):
+        """ Repeat the side effects of the call recorded in entry, and return or raise its result """
+        result, redo, issues, logged = entry
+        for change in redo: change()
+        for issue in issues: current().errors.add(issue)
+        if logged: note_error(logged)
+
+        if isinstance(result, ParserError): raise result.with_traceback(None)
+        return result
+
+    def note_error(self, error):
+        """ Record that the given error was logged in the calls being recorded """
+        for frame in self.frames:
+            if not frame[0] or error.amount_parsed >= frame[0].amount_parsed:
+                frame[0] = error
+
+
+def note_error(error):
+    """ Log the given ParserError, keeping it as best_error if it got at least as far as any error logged before """
+    parser = current()
+    if not parser.best_error or error.amount_parsed >= parser.best_error.amount_parsed:
+        parser.best_error = error
+
+    if parser.packrat: parser.packrat.note_error(error)
 
 
 @contextmanager
@@ -115,28 +254,28 @@ def log_error():
 
     The value of e.amount_parsed is used to determine the amount successfully parsed before encountering the error.
     """
-    global best_error, symbols
-
-    # back up the global symbols table, so if parsing fails we can reset it
-    symbols_bak = copy.deepcopy(symbols)
+    # Mark the state of the symbols table, so if parsing fails we can roll it back
+    symbols = current().symbols
+    checkpoint = symbols.begin()
     try:
         yield
     except ParserError as e:
-        if not best_error or e.amount_parsed >= best_error.amount_parsed:
-            best_error = e
-        symbols = symbols_bak
+        note_error(e)
+        symbols.rollback(checkpoint)
+    finally:
+        symbols.end()
 
 
 def token_is(index, kind):
     """Return true if the next token is of the given kind."""
-    global tokens
-    return len(tokens) > index and tokens[index].kind == kind
+    tokens = current().tokens
+    return tokens.has(index) and tokens[index].kind == kind
 
 
 def token_in(index, kinds):
     """Return true if the next token is in the given list/set of kinds."""
-    global tokens
-    return len(tokens) > index and tokens[index].kind in kinds
+    tokens = current().tokens
+    return tokens.has(index) and tokens[index].kind in kinds
 
 
 def match_token(index, kind, message_type, message=None):
@@ -144,28 +283,26 @@ def match_token(index, kind, message_type, message=None):
     If tokens[index] is of the expected kind, returns index + 1. Otherwise, raises a ParserError with the given message
     and message_type.
     """
-    global tokens
     if not message: message = f"expected '{kind.text_repr}'"
 
     if token_is(index, kind): return index + 1
-    else: raise ParserError(message, index, tokens, message_type)
+    else: raise ParserError(message, index, current().tokens, message_type)
 
 
 def token_range(start, end):
     """Generate a range that encompasses tokens[start] to tokens[end-1]"""
-    global tokens
+    tokens = current().tokens
 
-    start_index = min(start, len(tokens) - 1, end - 1)
-    end_index = min(end - 1, len(tokens) - 1)
+    end_index = end - 1 if tokens.has(end - 1) else len(tokens) - 1
+    start_index = min(start, end_index)
     return tokens[start_index].r + tokens[end_index].r
 
 
 def add_range(parse_func):
     """Return a decorated function that tags the produced node with a range. Accepts a parse_* function, and returns a
-    version of the function where the returned node has its range attribute set.
+    version of the function where the returned node has its range attribute set. If packrat parsing is enabled, the
+    decorated function is memoized through the packrat cache.
     """
-    global tokens
-
     def parse_with_range(index, *args):
         start_index = index
         node, end_index = parse_func(index, *args)
@@ -173,4 +310,17 @@ def add_range(parse_func):
 
         return node, end_index
 
-    return parse_with_range
+    params = parse_func.__code__.co_argcount - 1
+    defaults = parse_func.__defaults__ or ()
+
+    @wraps(parse_func)
+    def parse_with_memo(index, *args):
+        packrat = current().packrat
+        if packrat:
+            # Fill in default arguments, so that calls which leave them out share memo entries with calls which do not
+            args += defaults[len(defaults) - params + len(args):]
+            return packrat.call(parse_with_range, index, args)
+
+        return parse_with_range(index, *args)
+
+    return parse_with_memo
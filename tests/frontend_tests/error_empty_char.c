@@ -0,0 +1,2 @@
+// error: empty character constant
+int main() { return ''; }
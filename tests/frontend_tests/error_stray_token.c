@@ -0,0 +1,2 @@
+// error: unrecognized token at '@'
+int main() { int a = 1 @ 2; return a; }
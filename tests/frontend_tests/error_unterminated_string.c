@@ -0,0 +1,2 @@
+// error: missing terminating quote
+int main() { char *s = "abc; return 0; }
@@ -4,24 +4,42 @@ import main
 import unittest
 
 
-def compile_with_jackshenc(test_file_name):
-    """Compile given file with JackShenC. Errors are saved in the error collector."""
+def compile_with_jackshenc(test_file_name, optimize=False):
+    """Compile given file with JackShenC, optimizing the IL if optimize is set. Errors are saved in the error
+    collector.
+    """
 
     class MockArguments:
         filename = test_file_name
         show_il = False
+        show_tokens = False
+        show_tree = False
         show_reg_alloc_perf = False
         variables_on_stack = False
+        packrat_parse = False
+        pratt_parse = False
+        show_parse_perf = False
+        spill_batch = 0
+        linear_scan = False
+        reg_alloc_report = None
+        jobs = 1
+        optimize_il = optimize
 
     main.get_arguments = lambda: MockArguments()
 
     # Mock out error collector functions
     error_collector.show = lambda: True
 
+    # Mock out the prompts for a key press
+    main.input = lambda prompt: ""
+
+    # Mock out saving the generated assembly, so tests do not overwrite TestProgram.asm
+    main.write_asm = lambda asm_source, asm_filename: None
+
     main.main()
 
 
-def new(glob_str, dct):
+def new(glob_str, dct, optimize=False):
     """The implementation of __new__ used for generating tests."""
     def generate_test(test_file_name):
         def test_function(self):
@@ -51,28 +69,38 @@ def new(glob_str, dct):
                             line.split(warning_mark)[-1].strip())
                         exp_warning_lines.append(index + 2)
 
-            compile_with_jackshenc(test_file_name)
+            def check_compile(optimize_il):
+                compile_with_jackshenc(test_file_name, optimize_il)
+
+                act_errors = []
+                act_error_lines = []
 
-            act_errors = []
-            act_error_lines = []
+                act_warnings = []
+                act_warning_lines = []
 
-            act_warnings = []
-            act_warning_lines = []
+                for issue in error_collector.issues:
+                    if issue.warning:
+                        act_warnings.append(issue.descr)
+                        act_warning_lines.append(issue.span.start.line)
+                    else:
+                        act_errors.append(issue.descr)
+                        act_error_lines.append(issue.span.start.line)
 
-            for issue in error_collector.issues:
-                if issue.warning:
-                    act_warnings.append(issue.descr)
-                    act_warning_lines.append(issue.span.start.line)
-                else:
-                    act_errors.append(issue.descr)
-                    act_error_lines.append(issue.span.start.line)
+                self.assertListEqual(act_errors, exp_errors)
+                self.assertListEqual(act_error_lines, exp_error_lines)
 
-            self.assertListEqual(act_errors, exp_errors)
-            self.assertListEqual(act_error_lines, exp_error_lines)
+                self.assertListEqual(act_warnings, exp_warnings)
+                self.assertListEqual(act_warning_lines, exp_warning_lines)
 
-            self.assertListEqual(act_warnings, exp_warnings)
-            self.assertListEqual(act_warning_lines, exp_warning_lines)
+            # Optimized tests only cover programs which pass without optimizing; the others fail in FeatureTests.
+            if optimize:
+                try:
+                    check_compile(False)
+                except Exception:
+                    self.skipTest("fails without optimizing the IL")
+                error_collector.clear()
 
+            check_compile(optimize)
 
         return test_function
 
@@ -120,3 +148,18 @@ class FeatureTests(TestUtils, metaclass=MetaFeatureTests):
     """Frontend tests that test the lexer, preprocessor, and myparser."""
 
     pass
+
+
+class MetaOptimizedFeatureTests(type):
+    """Metaclass for creating feature tests which optimize the IL."""
+
+    def __new__(meta, name, bases, dct):
+        """Create OptimizedFeatureTests class."""
+        new("tests/feature_tests/*.c", dct, optimize=True)
+        return super().__new__(meta, name, bases, dct)
+
+
+class OptimizedFeatureTests(TestUtils, metaclass=MetaOptimizedFeatureTests):
+    """Feature tests compiled with the IL optimization passes, as with -optimize-il."""
+
+    pass
@@ -0,0 +1,619 @@
+"""Tests for the register allocator of the IL->ASM stage."""
+
+import csv
+import json
+import os
+import re
+import tempfile
+
+import asm_cmds
+import ctypes
+import lexer
+import main
+from asm_gen import AllocReport, ASMCode, ASMGen, IteratedCoalescing, MASMCode, NodeGraph, RegSpot
+from il_cmds.control import Call, DIRECT_VAL
+from il_gen import ILCode, ILValue, SymbolTable, Context
+from myparser.myparser import parse
+from tests.test_utils import TestUtils
+import il_cmds.math as math_cmds
+import spots
+
+
+class MockArguments:
+    """Command-line arguments read by ASMGen. Arguments not given take their default values."""
+
+    def __init__(self, **arguments):
+        """ Initialize MockArguments with the given arguments """
+        self.show_reg_alloc_perf = False
+        self.spill_batch = 0
+        self.linear_scan = False
+        self.reg_alloc_report = None
+        self.jobs = 1
+        self.__dict__.update(arguments)
+
+
+# Function in which eight values are live at once around a loop, more than there are registers
+MANY_LIVE_VALUES = """
+int main() {
+  int a = 1, b = 2, c = 3, d = 4, e = 5, f = 6, g = 7, h = 8;
+  for(int i = 0; i < 10; i++) {
+    a = a + b; b = b + c; c = c + d; d = d + e; e = e + f; f = f + g; g = g + h; h = h + a;
+  }
+  return a + b + c + d + e + f + g + h;
+}
+"""
+
+# Function in which the incremental spilling mode used to leave every register taken at a comparison which needs one
+# for scratch
+SCRATCH_AFTER_BATCH_SPILL = """
+int f(int b) {
+  int v0 = 3, v1 = 4, v2 = 5, v3 = 5, v5 = 0, v6 = 3, v7 = 2, v8 = 1, v9 = 1;
+  for(int k0 = 0; ; ) v8 = v2;
+  v6 = v0;
+  if(v3) {
+    for(int k2 = 0; ; ) {
+      while(v7 < 7) v6 = (v8 || v2 > v7) > v7;
+    }
+  }
+  v8 == (0 > v2);
+  v9 = v2;
+  return v0 + v5 + v6 + v7 + v9;
+}
+"""
+
+# Function in which linear scan used to leave every register taken at a comparison which needs one for scratch
+SCRATCH_AFTER_LINEAR_SCAN = """
+int f(int b) {
+  int v0 = 3, v1 = 4, v2 = 5, v3 = 5, v5 = 0, v6 = 3, v7 = 2, v8 = 1, v9 = 1;
+  for(int k0 = 0; ; ) v8 = v2;
+  v6 = v0;
+  if(v3) {
+    for(int k2 = 0; ; ) v6 = (v8 || v2 > v7) > v7;
+  }
+  v8;
+  v9 = v2;
+  v2 = v0 + v5 + v6 + v7 + v9;
+}
+"""
+
+# Function with values live across a call, which clobbers every register, and across a division, which clobbers EAX
+# and EDX and whose divisor may not be in either
+CALL_AND_DIVISION = """
+int f(int x) { return x + 1; }
+int main() {
+  int a = 7, b = 2;
+  int c = f(a);
+  int d = c + 1, e = c + 2, k = c + 3;
+  int h = d / e;
+  return b + c + e + h + k;
+}
+"""
+
+# Function which calls a function of two arguments computed into registers, returning 29. Linear scan used to put the
+# second argument in the register of the first, which was written before the second was read.
+COMPUTED_ARGUMENTS = """
+int f(int a, int b) { return a * 3 - b; }
+int main() {
+  int x = 6; int y = -2;
+  int arr[2]; arr[0] = 1;
+  int r = f(8 - y, x + 10 > arr[0]);
+  return r;
+}
+"""
+
+
+def make_asm(code, **arguments):
+    """Compile the given C source to ASM with the given command-line arguments.
+        returns - tuple of the ASMGen and the FunctionAllocation of each function.
+    """
+    il_code, symbol_table = ILCode(), SymbolTable()
+    parse(lexer.tokenize(code, "")).make_il(il_code, symbol_table, Context())
+
+    asm_gen = ASMGen(il_code, symbol_table, ASMCode(), MockArguments(**arguments))
+    return asm_gen, asm_gen.make_asm()
+
+
+def make_masm(code, **arguments):
+    """Compile the given C source to MASM with the given command-line arguments, as the compiler does, starting the
+    label and call counters from zero.
+        returns - full MASM code.
+    """
+    ASMCode.label_num, Call.counter = 0, 0
+    del DIRECT_VAL[:]
+
+    il_code, symbol_table = ILCode(), SymbolTable()
+    parse(lexer.tokenize(code, "")).make_il(il_code, symbol_table, Context())
+
+    masm_code = MASMCode()
+    ASMGen(il_code, symbol_table, masm_code, MockArguments(**arguments)).make_asm()
+    return masm_code.full_code()
+
+
+def run_asm(asm_code):
+    """Run the given ASM code from its main function, for the 32-bit integer commands the tests compile to.
+        returns - value returned by main.
+    """
+    lines = asm_code.lines
+    labels = {line.label: i for i, line in enumerate(lines) if isinstance(line, (asm_cmds.Label, asm_cmds.LabelFunc))}
+    regs = {reg: 0 for reg in ["eax", "ebx", "ecx", "edx", "esi", "edi", "ebp"]}
+    regs["esp"] = 1 << 16
+    memory = {}
+
+    def address(operand):
+        # An operand which is a name is a global variable, at the address of that name
+        if "[" not in operand: return operand
+
+        expr = operand[operand.index("[") + 1:-1]
+        if expr in labels: return expr
+        return eval(re.sub("[a-z]+", lambda match: str(regs[match.group()]), expr))
+
+    def read(operand):
+        if operand in regs: return regs[operand]
+        elif operand == "cl": return regs["ecx"] & 0xff
+        elif re.fullmatch("-?[0-9]+", operand): return int(operand)
+        else: return memory[address(operand)]
+
+    def write(operand, value):
+        if isinstance(value, int): value = (value + (1 << 31)) % (1 << 32) - (1 << 31)
+        if operand in regs: regs[operand] = value
+        else: memory[address(operand)] = value
+
+    def push(value):
+        regs["esp"] -= 4
+        memory[regs["esp"]] = value
+
+    def pop():
+        regs["esp"] += 4
+        return memory[regs["esp"] - 4]
+
+    conditions = {"je": lambda a, b: a == b, "jne": lambda a, b: a != b, "jg": lambda a, b: a > b,
+                  "jge": lambda a, b: a >= b, "jl": lambda a, b: a < b, "jle": lambda a, b: a <= b,
+                  "ja": lambda a, b: a % (1 << 32) > b % (1 << 32), "jae": lambda a, b: a % (1 << 32) >= b % (1 << 32),
+                  "jb": lambda a, b: a % (1 << 32) < b % (1 << 32), "jbe": lambda a, b: a % (1 << 32) <= b % (1 << 32)}
+    arithmetic = {"add": lambda a, b: a + b, "sub": lambda a, b: a - b, "imul": lambda a, b: a * b,
+                  "and": lambda a, b: a & b, "xor": lambda a, b: a ^ b, "sal": lambda a, b: a << b,
+                  "sar": lambda a, b: a >> b}
+
+    # The return address of main is None
+    push(None)
+    i, compared = labels["main"], None
+    while True:
+        line = lines[i]
+        i += 1
+        name = getattr(line, "name", None)
+
+        if name == "lea": regs[line.dest.asm_str(4)] = address(line.source.asm_str(0))
+        elif name in conditions:
+            if conditions[name](*compared): i = labels[line.target]
+        elif name == "jmp": i = labels[line.target]
+        elif name == "mov": write(line.dest, read(line.source))
+        elif name == "xchg":
+            dest, source = read(line.dest), read(line.source)
+            write(line.dest, source)
+            write(line.source, dest)
+        elif name in arithmetic: write(line.dest, arithmetic[name](read(line.dest), read(line.source)))
+        elif name == "neg": write(line.dest, -read(line.dest))
+        elif name == "not": write(line.dest, ~read(line.dest))
+        elif name == "cmp": compared = read(line.dest), read(line.source)
+        elif name == "cdq": regs["edx"] = -1 if regs["eax"] < 0 else 0
+        elif name == "idiv":
+            divisor = read(line.dest)
+            quotient = abs(regs["eax"]) // abs(divisor) * (1 if (regs["eax"] < 0) == (divisor < 0) else -1)
+            regs["eax"], regs["edx"] = quotient, regs["eax"] - quotient * divisor
+        elif name == "push": push(read(line.dest))
+        elif name == "pop": write(line.dest, pop())
+        elif name == "call":
+            push(i)
+            i = labels[read(line.dest) if line.dest in regs else line.dest]
+        elif name == "ret":
+            i = pop()
+            if i is None: return regs["eax"]
+        elif name: raise NotImplementedError(f"cannot run {name}")
+
+
+class RecordingASMGen(ASMGen):
+    """ASMGen which records, for each command it generates code for, the registers the calls to get_reg listed by
+    its scratch_regs would be given, and the registers its calls to get_reg are given.
+        calls - List of tuples of each command, the registers found from its scratch_regs and those it was given.
+    """
+
+    def __init__(self, *args):
+        """ Initialize RecordingASMGen with no calls recorded """
+        super().__init__(*args)
+        self.calls = []
+
+    def make_get_reg(self, info, live, spotmap):
+        """ Return the get_reg function of ASMGen, recording the registers it returns """
+        get_reg = super().make_get_reg(info, live, spotmap)
+        busy_spots = self.get_busy_spots(info, live, spotmap)
+
+        expected = []
+        for pref, conf in info.command.scratch_regs(spotmap):
+            expected.append(self.choose_reg(pref, busy_spots.union(conf, expected)))
+
+        regs = []
+        self.calls.append((info.command, expected, regs))
+
+        def recording_get_reg(pref=None, conf=None):
+            regs.append(get_reg(pref, conf))
+            return regs[-1]
+
+        return recording_get_reg
+
+
+class AllocationTests(TestUtils):
+    """Tests of the registers allocated to the values of whole functions."""
+
+    def assertValidAllocation(self, allocation):
+        """Assert that no two values live at once share a register, and that no value is given a register in conflict
+        with a command or clobbered by a command it is live across.
+        """
+        spotmap = allocation.spotmap
+        for info, (in_live, out_live) in zip(allocation.infos, allocation.live_vars):
+            for live in (in_live, out_live):
+                regs = [spotmap[v] for v in live if v in spotmap]
+                self.assertEqual(len(regs), len(set(regs)))
+
+            for v, spot_list in info.abs_spot_conflict.items():
+                self.assertNotIn(spotmap.get(v), spot_list)
+
+            for v in set(in_live).intersection(out_live):
+                self.assertNotIn(spotmap.get(v), info.clobber)
+
+        self.assertTrue(all(isinstance(spot, RegSpot) for spot in spotmap.values()))
+        self.assertFalse(set(spotmap).intersection(allocation.spilled))
+
+    def test_spill_rounds(self):
+        """Test that the incremental spilling mode spills over several rounds when too many values are live."""
+        for spill_batch in [0, 1, 2]:
+            with self.subTest(spill_batch=spill_batch):
+                _, (allocation,) = make_asm(MANY_LIVE_VALUES, spill_batch=spill_batch)
+                self.assertValidAllocation(allocation)
+                self.assertGreaterEqual(len(allocation.spilled), 3)
+                self.assertGreaterEqual(allocation.stats["spill_rounds"], 2)
+                self.assertLessEqual(allocation.stats["spill_rounds"], len(allocation.spilled))
+
+    def test_scratch_register(self):
+        """Test that a value is spilled so that each command which needs a register for scratch has one free."""
+        for spill_batch in [0, 1, 3]:
+            with self.subTest(spill_batch=spill_batch):
+                _, (allocation,) = make_asm(SCRATCH_AFTER_BATCH_SPILL, spill_batch=spill_batch)
+                self.assertValidAllocation(allocation)
+
+        for linear_scan in [False, True]:
+            with self.subTest(linear_scan=linear_scan):
+                _, (allocation,) = make_asm(SCRATCH_AFTER_LINEAR_SCAN, linear_scan=linear_scan)
+                self.assertValidAllocation(allocation)
+
+    def test_scratch_regs(self):
+        """Test that the calls to get_reg listed by scratch_regs of each command are given the registers its code gets
+        from get_reg.
+        """
+        codes = [MANY_LIVE_VALUES, SCRATCH_AFTER_BATCH_SPILL, SCRATCH_AFTER_LINEAR_SCAN, CALL_AND_DIVISION]
+        for filename in ["func_call.c", "declaration.c", "pointer.c", "struct.c"]:
+            with open("tests/feature_tests/" + filename) as c_file:
+                codes.append(c_file.read())
+
+        calls = 0
+        for i, code in enumerate(codes):
+            for arguments in [{}, {"spill_batch": 3}, {"linear_scan": True}]:
+                with self.subTest(code=i, **arguments):
+                    il_code, symbol_table = ILCode(), SymbolTable()
+                    parse(lexer.tokenize(code, "")).make_il(il_code, symbol_table, Context())
+                    asm_gen = RecordingASMGen(il_code, symbol_table, ASMCode(), MockArguments(**arguments))
+                    asm_gen.make_asm()
+
+                    for command, expected, regs in asm_gen.calls:
+                        # A shift gets the register its first operand was moved to once more, for the result
+                        if isinstance(command, math_cmds.BitShiftCmd): regs = regs[:len(expected)]
+                        self.assertEqual(regs, expected, type(command).__name__)
+                        calls += len(regs)
+
+        self.assertGreater(calls, 0)
+
+    def test_call_arguments(self):
+        """Test that a function called with arguments computed into registers is passed their values."""
+        for linear_scan in [False, True]:
+            with self.subTest(linear_scan=linear_scan):
+                asm_gen, _ = make_asm(COMPUTED_ARGUMENTS, linear_scan=linear_scan)
+                self.assertEqual(run_asm(asm_gen.asm_code), 29)
+
+    def test_call_argument_cycles(self):
+        """Test that arguments are passed their values when each argument register holds another argument."""
+        a, b, c, ret = [ILValue(ctypes.integer) for _ in range(4)]
+        func = ILValue(ctypes.PointerCType(ctypes.FunctionCType([ctypes.integer] * 3, ctypes.integer, False)))
+        ebx = RegSpot("ebx")
+
+        cases = [([spots.ESI, spots.EDX, spots.EDI], 231), ([spots.ESI, spots.EDI, spots.LiteralSpot("7")], 217)]
+        for arg_spots, expected in cases:
+            with self.subTest(arg_spots=arg_spots):
+                asm_code = ASMCode()
+
+                # Function which returns 100 * a + 10 * b + c
+                asm_code.add(asm_cmds.LabelFunc("f"))
+                asm_code.add(asm_cmds.Mov(spots.EAX, spots.EDI, 4))
+                asm_code.add(asm_cmds.Imul(spots.EAX, spots.LiteralSpot("100"), 4))
+                asm_code.add(asm_cmds.Mov(spots.ECX, spots.ESI, 4))
+                asm_code.add(asm_cmds.Imul(spots.ECX, spots.LiteralSpot("10"), 4))
+                asm_code.add(asm_cmds.Add(spots.EAX, spots.ECX, 4))
+                asm_code.add(asm_cmds.Add(spots.EAX, spots.EDX, 4))
+                asm_code.add(asm_cmds.Ret())
+
+                # Function which loads 1, 2 and 3 into EDI, ESI and EDX, and calls f with the arguments in them
+                asm_code.add(asm_cmds.LabelFunc("main"))
+                for reg, val in zip([spots.EDI, spots.ESI, spots.EDX], [1, 2, 3]):
+                    asm_code.add(asm_cmds.Mov(reg, spots.LiteralSpot(str(val)), 4))
+                asm_code.add(asm_cmds.Lea(ebx, spots.MemSpot("f")))
+
+                spotmap = {func: ebx, ret: spots.EAX, a: arg_spots[0], b: arg_spots[1], c: arg_spots[2]}
+                Call(func, [a, b, c], ret).make_asm(spotmap, spotmap, None, asm_code)
+                asm_code.add(asm_cmds.Ret())
+
+                self.assertEqual(run_asm(asm_code), expected)
+
+    def test_linear_scan_conflicts(self):
+        """Test that linear scan keeps values out of the registers in their absolute conflict lists, and out of the
+        registers clobbered by the commands they are live across.
+        """
+        asm_gen, (_, allocation) = make_asm(CALL_AND_DIVISION, linear_scan=True)
+        self.assertValidAllocation(allocation)
+        spotmap, names = allocation.spotmap, asm_gen.symbol_table.names
+
+        # The call clobbers every register, so the value live across it is spilled
+        self.assertIn("b", [names.get(v) for v in allocation.spilled])
+
+        # The divisor is kept out of EAX and EDX, and so are the values live across the division
+        (i, info), = [(i, info) for i, info in enumerate(allocation.infos) if isinstance(info.command, math_cmds.Div)]
+        self.assertIn(spotmap[info.command.arg2], [spots.ECX, spots.ESI, spots.EDI])
+
+        in_live, out_live = allocation.live_vars[i]
+        live_through = [v for v in in_live if v in out_live and v in spotmap]
+        self.assertTrue(live_through)
+        for v in live_through: self.assertNotIn(spotmap[v], [spots.EAX, spots.EDX])
+
+    def test_linear_scan_holes(self):
+        """Test that linear scan gives the register of a value to others in the holes of its live range, so that it
+        spills no value where coloring the conflict graph spills none.
+        """
+        with open("tests/feature_tests/addition.c") as c_file:
+            code = c_file.read()
+
+        for linear_scan in [False, True]:
+            with self.subTest(linear_scan=linear_scan):
+                _, (allocation,) = make_asm(code, linear_scan=linear_scan)
+                self.assertValidAllocation(allocation)
+                self.assertEqual(allocation.spilled, [])
+
+    def test_parallel_jobs(self):
+        """Test that allocating the functions in several processes gives the same MASM code as allocating them in
+        this one.
+        """
+        for filename in ["func_call.c", "declaration.c", "pointer.c", "struct.c"]:
+            with open("tests/feature_tests/" + filename) as c_file:
+                code = c_file.read()
+
+            for spill_batch in [0, 2]:
+                with self.subTest(filename=filename, spill_batch=spill_batch):
+                    self.assertEqual(make_masm(code, spill_batch=spill_batch, jobs=2),
+                                     make_masm(code, spill_batch=spill_batch))
+
+        with self.subTest(linear_scan=True):
+            code = MANY_LIVE_VALUES + CALL_AND_DIVISION.replace("main", "g")
+            self.assertEqual(make_masm(code, linear_scan=True, jobs=2), make_masm(code, linear_scan=True))
+
+    def test_reuse_allocations(self):
+        """Test that MASM code generated from the registers allocated for ASM code is the MASM code generated by
+        allocating them again.
+        """
+        for filename in ["func_call.c", "declaration.c", "pointer.c", "struct.c"]:
+            with open("tests/feature_tests/" + filename) as c_file:
+                code = c_file.read()
+
+            with self.subTest(filename=filename):
+                ASMCode.label_num, Call.counter = 0, 0
+                del DIRECT_VAL[:]
+                il_code, symbol_table = ILCode(), SymbolTable()
+                parse(lexer.tokenize(code, "")).make_il(il_code, symbol_table, Context())
+                il_label_num = ASMCode.label_num
+                allocations = ASMGen(il_code, symbol_table, ASMCode(), MockArguments()).make_asm()
+
+                ASMCode.label_num, Call.counter = il_label_num, 0
+                del DIRECT_VAL[:]
+                masm_code = MASMCode()
+                ASMGen(il_code, symbol_table, masm_code, MockArguments()).make_asm(allocations)
+                self.assertEqual(masm_code.full_code(), make_masm(code))
+
+    def test_report(self):
+        """Test that the register allocator report has a row of every field for each function, as CSV and as JSON."""
+        asm_gen, allocations = make_asm(CALL_AND_DIVISION, reg_alloc_report="report.json")
+        self.assertEqual(len(asm_gen.report.rows), 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            csv_filename, json_filename = os.path.join(directory, "report.csv"), os.path.join(directory, "report.json")
+            main.write_report(asm_gen.report, csv_filename)
+            main.write_report(asm_gen.report, json_filename)
+            self.assertNoIssues()
+
+            with open(csv_filename, newline="") as report_file:
+                reader = csv.DictReader(report_file)
+                csv_rows = list(reader)
+            self.assertEqual(reader.fieldnames, AllocReport.fields)
+
+            with open(json_filename) as report_file:
+                json_rows = json.load(report_file)
+
+        self.assertEqual([row["function"] for row in csv_rows], ["f", "main"])
+        self.assertEqual([list(row) for row in json_rows], [AllocReport.fields] * 2)
+        self.assertEqual([row["function"] for row in json_rows], ["f", "main"])
+
+        for row, allocation in zip(json_rows, allocations):
+            self.assertEqual(row["spilled_values"], len(allocation.spilled))
+            self.assertEqual(row["nodes"], allocation.stats["nodes"])
+        for csv_row, json_row in zip(csv_rows, json_rows):
+            self.assertEqual(csv_row["spilled_values"], str(json_row["spilled_values"]))
+
+
+class NodeGraphTests(TestUtils):
+    """Tests of the conflict and preference edges kept by NodeGraph."""
+
+    def test_edges(self):
+        """Test that edges are symmetric, and that popping a node removes its edges."""
+        g = NodeGraph(["a", "b", "c"])
+        g.add_conflict("a", "b")
+        g.add_conflict("b", "a")
+        g.add_pref("a", "c")
+
+        self.assertTrue(g.has_conf("b", "a"))
+        self.assertTrue(g.has_pref("c", "a"))
+        self.assertEqual((g.conf_degree("a"), g.conf_degree("b"), g.conf_degree("c")), (1, 1, 0))
+        self.assertEqual(g.count_edges(), (1, 1))
+
+        self.assertEqual(g.pop("a"), "a")
+        self.assertFalse(g.is_node("a"))
+        self.assertEqual((g.conf_degree("b"), g.prefs("c")), (0, []))
+        self.assertEqual(g.nodes(), ["b", "c"])
+
+    def test_imitation_nodes(self):
+        """Test that imitation nodes conflict with each other but are not real nodes."""
+        g = NodeGraph(["a"])
+        g.add_imitation_node(spots.EAX)
+        g.add_imitation_node(spots.ECX)
+
+        self.assertTrue(g.has_conf(spots.EAX, spots.ECX))
+        self.assertFalse(g.has_conf("a", spots.EAX))
+        self.assertEqual(g.nodes(), ["a"])
+        self.assertEqual(g.all_nodes(), ["a", spots.EAX, spots.ECX])
+
+    def test_merge(self):
+        """Test that a merged node takes the edges of both nodes, and that the degree of a node which conflicted with
+        both drops.
+        """
+        g = NodeGraph(["a", "b", "c", "d", "e"])
+        g.add_conflict("a", "c")
+        g.add_conflict("b", "c")
+        g.add_conflict("b", "d")
+        g.add_pref("b", "e")
+        g.add_pref("a", "b")
+
+        g.merge("a", "b")
+        self.assertFalse(g.is_node("b"))
+        self.assertEqual(sorted(g.confs("a")), ["c", "d"])
+        self.assertEqual(g.prefs("a"), ["e"])
+        self.assertEqual(g.prefs("e"), ["a"])
+        self.assertEqual((g.conf_degree("a"), g.conf_degree("c"), g.conf_degree("d")), (2, 1, 1))
+
+    def test_copy(self):
+        """Test that a copy of a graph does not share edges with it."""
+        g = NodeGraph(["a", "b"])
+        g.add_conflict("a", "b")
+        g2 = g.copy()
+        g2.pop("a")
+
+        self.assertTrue(g.has_conf("a", "b"))
+        self.assertEqual(g.conf_degree("b"), 1)
+        self.assertEqual(g2.conf_degree("b"), 0)
+
+
+class IteratedCoalescingTests(TestUtils):
+    """Tests of the worklists of IteratedCoalescing and the colors they lead to."""
+
+    def test_worklists(self):
+        """Test that each real node starts in the worklist for its conflict degree and preference edges, and that each
+        preference edge starts in the move worklist.
+        """
+        g = NodeGraph(["a", "b", "c", "d", "e"])
+        g.add_imitation_node(spots.EAX)
+        for n1, n2 in [("a", "b"), ("a", "c"), ("b", "c"), ("a", "d")]:
+            g.add_conflict(n1, n2)
+        g.add_pref("d", "e")
+        g.add_pref("e", spots.EAX)
+
+        coalescing = IteratedCoalescing(g, 3)
+        self.assertEqual(list(coalescing.simplify_list), ["b", "c"])
+        self.assertEqual(coalescing.freeze_buckets, [{"e": None}, {"d": None}, {}])
+        self.assertEqual(list(coalescing.moves.values()), [("d", "e"), ("e", spots.EAX)])
+        self.assertNotIn("a", coalescing.worklist)
+        self.assertNotIn(spots.EAX, coalescing.worklist)
+
+        # Removing a node moves the nodes it conflicted with to the worklists for their lower degrees
+        coalescing.remove("b")
+        self.assertEqual(sorted(coalescing.simplify_list), ["a", "c"])
+        self.assertIs(coalescing.worklist["a"], coalescing.simplify_list)
+        coalescing.remove("a")
+        self.assertEqual(coalescing.freeze_buckets, [{"d": None, "e": None}, {}, {}])
+        self.assertIs(coalescing.worklist["d"], coalescing.freeze_buckets[0])
+
+    def test_coalesce(self):
+        """Test that the nodes of a preference edge are merged when that leaves the merged node of low degree, and that
+        a preference edge between conflicting nodes is removed.
+        """
+        g = NodeGraph(["a", "b", "c"])
+        g.add_conflict("a", "c")
+        g.add_pref("a", "b")
+        g.add_pref("a", "c")
+
+        coalescing = IteratedCoalescing(g, 2)
+        coalescing.run()
+        self.assertEqual(coalescing.merged_nodes, {"a": ["b"]})
+        self.assertEqual(coalescing.stats["coalesced_moves"], 1)
+        self.assertEqual(coalescing.stats["frozen_prefs"], 0)
+        self.assertEqual(sorted(coalescing.removed_nodes), ["a", "c"])
+        self.assertEqual(g.nodes(), [])
+
+    def test_freeze(self):
+        """Test that a preference edge which cannot be coalesced waits in the active moves, and is frozen so that its
+        nodes can be simplified.
+        """
+        # Merging a and b would give a node which conflicts with both c and d
+        g = NodeGraph(["a", "b", "c", "d"])
+        for n1, n2 in [("a", "c"), ("b", "d"), ("c", "d")]:
+            g.add_conflict(n1, n2)
+        g.add_pref("a", "b")
+
+        coalescing = IteratedCoalescing(g, 2)
+        self.assertEqual(coalescing.simplify_list, {})
+        coalescing.coalesce(frozenset(("a", "b")), coalescing.moves.popitem()[1])
+        self.assertEqual(list(coalescing.active_moves.values()), [("a", "b")])
+
+        coalescing.freeze()
+        self.assertFalse(g.has_pref("a", "b"))
+        self.assertEqual((coalescing.active_moves, coalescing.freeze_buckets), ({}, [{}, {}]))
+        self.assertEqual(sorted(coalescing.simplify_list), ["a", "b"])
+        self.assertEqual(coalescing.stats["frozen_prefs"], 1)
+
+        coalescing.run()
+        self.assertEqual(coalescing.merged_nodes, {})
+        self.assertEqual(g.nodes(), [])
+
+    def test_colors(self):
+        """Test that nodes which conflict are given different registers, that no node is given a register it conflicts
+        with, and that coalesced nodes are given the same register.
+        """
+        asm_gen = ASMGen(ILCode(), SymbolTable(), ASMCode(), MockArguments())
+        nodes = ["v" + str(i) for i in range(8)]
+        g = NodeGraph(nodes)
+        g.add_imitation_node(spots.EAX)
+        g.add_imitation_node(spots.EDX)
+
+        # A clique of five values, a value which conflicts with all but one of them, and values which conflict with
+        # fewer of them and with a register
+        conflicts = [(n1, n2) for i, n1 in enumerate(nodes[:5]) for n2 in nodes[i + 1:5]]
+        conflicts += [("v5", n) for n in nodes[1:5]] + [("v6", n) for n in nodes[:3]]
+        conflicts += [("v7", spots.EAX), ("v7", "v0")]
+        for n1, n2 in conflicts: g.add_conflict(n1, n2)
+        g.add_pref("v7", "v6")
+        g.add_pref("v5", spots.EDX)
+
+        coalescing = IteratedCoalescing(g.copy(), len(asm_gen.alloc_registers))
+        coalescing.run()
+        self.assertEqual(coalescing.g.nodes(), [])
+        self.assertEqual(coalescing.merged_nodes, {"v6": ["v7"], spots.EDX: ["v5"]})
+
+        removed_nodes = coalescing.removed_nodes + [coalescing.g.pop(n) for n in coalescing.g.all_nodes()]
+        spotmap = asm_gen.generate_spotmap(removed_nodes, coalescing.merged_nodes, g)
+        self.assertTrue(set(nodes) <= set(spotmap))
+
+        for n1, n2 in conflicts:
+            self.assertNotEqual(spotmap.get(n1, n1), spotmap.get(n2, n2))
+        self.assertEqual(spotmap["v7"], spotmap["v6"])
+        self.assertEqual(spotmap["v5"], spots.EDX)
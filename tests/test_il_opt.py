@@ -0,0 +1,256 @@
+"""Tests for the optimization passes over the IL code."""
+
+import ctypes
+import il_cmds.control as control_cmds
+import il_cmds.math as math_cmds
+import il_cmds.value as value_cmds
+import lexer
+from asm_gen import ASMCode, ASMGen
+from il_gen import ILCode, ILValue, SymbolTable, Context
+from il_opt import ILOptimizer
+from myparser.myparser import parse
+from tests.test_asm_gen import MockArguments
+from tests.test_utils import TestUtils
+
+
+# Function whose optimized code used to leave every register taken at a command which needs one for scratch, since
+# copy propagation makes values live for longer
+SCRATCH_AFTER_COPY_PROPAGATION = """
+int main() {
+  int a = 0, b = 1, c = 2;
+  int arr[4];
+  int *p = &arr[1];
+  for(int i = 0; i < 4; i++) arr[i] = i;
+
+  b -= arr[b] % c;
+  if((~b - arr[c] / 7) % (*p >= a)) return 1;
+  return b + *p;
+}
+"""
+
+
+# Function with calls whose results are unused, one of which may write through its argument, and with a value only
+# used to compute a value in a later block which is never used
+CALLS_AND_DEAD_STORES = """
+int f(int *p) { *p = 1; return 0; }
+int g() { return 2; }
+int main() {
+  int a = 0, z = 3;
+  int *p = &a;
+  int w = z * 5;
+  f(p);
+  if(g()) *p = 4;
+  z = w + 1;
+  return a;
+}
+"""
+
+
+def make_il(code):
+    """Compile the given C source to IL.
+        returns - tuple of the ILCode and the SymbolTable.
+    """
+    il_code, symbol_table = ILCode(), SymbolTable()
+    parse(lexer.tokenize(code, "")).make_il(il_code, symbol_table, Context())
+    return il_code, symbol_table
+
+
+class ILOptimizerTests(TestUtils):
+    """Tests of the IL code given by the optimization passes."""
+
+    def setUp(self):
+        """ Create an ILOptimizer for IL code built by each test """
+        self.il_code, self.symbol_table = ILCode(), SymbolTable()
+        self.optimizer = ILOptimizer(self.il_code, self.symbol_table)
+
+    def literal(self, val):
+        """ Return the int literal of given value """
+        return self.il_code.get_literal(val, ctypes.integer)
+
+    def assertCommands(self, commands, expected):
+        """Assert that the given commands are of the kinds and read and write the values of the expected commands."""
+        self.assertEqual([(type(c), c.inputs(), c.outputs(), c.targets()) for c in commands],
+                         [(type(c), c.inputs(), c.outputs(), c.targets()) for c in expected])
+
+    def test_fold(self):
+        """Test that commands whose inputs are all constant become a Set of their result, and that constant inputs of
+        other commands become literals.
+        """
+        a, b, c, d, x = [ILValue(ctypes.integer) for _ in range(5)]
+        commands = [value_cmds.LoadArg(x, 0),
+                    value_cmds.Set(a, self.literal(6)),
+                    math_cmds.Mult(b, a, self.literal(7)),
+                    math_cmds.Add(c, b, x),
+                    math_cmds.Div(d, c, self.literal(0)),
+                    control_cmds.Return(d)]
+
+        self.assertCommands(self.optimizer.propagate_constants(commands),
+                            [value_cmds.LoadArg(x, 0),
+                             value_cmds.Set(a, self.literal(6)),
+                             value_cmds.Set(b, self.literal(42)),
+                             math_cmds.Add(c, self.literal(42), x),
+                             math_cmds.Div(d, c, self.literal(0)),
+                             control_cmds.Return(d)])
+
+    def test_fold_at_join(self):
+        """Test that a value is constant where blocks join only if it has the same value coming from each."""
+        a, b, r1, r2, x = [ILValue(ctypes.integer) for _ in range(5)]
+        commands = [value_cmds.LoadArg(x, 0),
+                    value_cmds.Set(a, self.literal(1)),
+                    value_cmds.Set(b, self.literal(1)),
+                    control_cmds.JumpZero(x, "join"),
+                    value_cmds.Set(a, self.literal(2)),
+                    value_cmds.Set(b, self.literal(1)),
+                    control_cmds.Label("join"),
+                    math_cmds.Add(r1, a, a),
+                    math_cmds.Add(r2, b, b),
+                    math_cmds.Add(r1, r1, r2),
+                    control_cmds.Return(r1)]
+
+        new_commands = self.optimizer.propagate_constants(commands)
+        self.assertCommands(new_commands[7:9], [math_cmds.Add(r1, a, a), value_cmds.Set(r2, self.literal(2))])
+
+    def test_prune_jumps(self):
+        """Test that a conditional jump on a constant becomes a Jump if it is taken and is removed if not."""
+        a, r = ILValue(ctypes.integer), ILValue(ctypes.integer)
+        commands = [value_cmds.Set(a, self.literal(0)),
+                    control_cmds.JumpNotZero(a, "one"),
+                    control_cmds.JumpZero(a, "two"),
+                    control_cmds.Label("one"),
+                    value_cmds.Set(r, self.literal(1)),
+                    control_cmds.Return(r),
+                    control_cmds.Label("two"),
+                    value_cmds.Set(r, self.literal(2)),
+                    control_cmds.Return(r)]
+
+        new_commands = self.optimizer.propagate_constants(commands)
+        self.assertCommands(new_commands, [value_cmds.Set(a, self.literal(0)), control_cmds.Jump("two")] +
+                            commands[3:])
+
+    def test_remove_unreachable(self):
+        """Test that blocks to which control never passes are removed, then jumps to the command just after them and
+        labels to which no command jumps.
+        """
+        r, x = ILValue(ctypes.integer), ILValue(ctypes.integer)
+        commands = [value_cmds.LoadArg(x, 0),
+                    control_cmds.JumpZero(x, "end"),
+                    control_cmds.Jump("body"),
+                    value_cmds.Set(r, self.literal(1)),
+                    control_cmds.Label("body"),
+                    value_cmds.Set(r, self.literal(2)),
+                    control_cmds.Jump("end"),
+                    control_cmds.Label("end"),
+                    control_cmds.Return(r),
+                    value_cmds.Set(r, self.literal(3)),
+                    control_cmds.Return(r)]
+
+        self.assertCommands(self.optimizer.remove_unreachable(commands),
+                            [value_cmds.LoadArg(x, 0),
+                             control_cmds.JumpZero(x, "end"),
+                             value_cmds.Set(r, self.literal(2)),
+                             control_cmds.Label("end"),
+                             control_cmds.Return(r)])
+
+    def test_remove_dead_stores(self):
+        """Test that commands whose outputs are never used are removed, repeatedly, but that calls and commands which
+        may write through a pointer are kept.
+        """
+        il_code, symbol_table = make_il(CALLS_AND_DEAD_STORES)
+        commands = ILOptimizer(il_code, symbol_table).remove_dead_stores(il_code.commands["main"])
+        names = symbol_table.names
+
+        self.assertEqual(len([c for c in commands if isinstance(c, control_cmds.Call)]), 2)
+        self.assertEqual(len([c for c in commands if isinstance(c, value_cmds.SetAt)]), 1)
+        self.assertFalse([c for c in commands if isinstance(c, math_cmds.AddMult)])
+        outputs = [names.get(v) for c in commands for v in c.outputs()]
+        self.assertNotIn("w", outputs)
+        self.assertNotIn("z", outputs)
+        self.assertIn("a", outputs)
+
+    def test_propagate_copies(self):
+        """Test that commands read the value copied rather than its copy until either is output again, and only where
+        every block passing control there holds the copy. A Set of a value to a copy of it is removed.
+        """
+        x, y, z, w, c = [ILValue(ctypes.integer) for _ in range(5)]
+        commands = [value_cmds.LoadArg(x, 0),
+                    value_cmds.LoadArg(c, 1),
+                    value_cmds.Set(y, x),
+                    value_cmds.Set(y, x),
+                    math_cmds.Add(z, y, y),
+                    control_cmds.JumpZero(c, "join"),
+                    value_cmds.Set(x, self.literal(1)),
+                    control_cmds.Label("join"),
+                    math_cmds.Add(w, y, z),
+                    value_cmds.Set(x, self.literal(2)),
+                    math_cmds.Add(w, w, y),
+                    control_cmds.Return(w)]
+
+        self.assertCommands(self.optimizer.propagate_copies(commands),
+                            commands[:3] + [math_cmds.Add(z, x, x)] + commands[5:8] +
+                            [math_cmds.Add(w, y, z), value_cmds.Set(x, self.literal(2)), math_cmds.Add(w, w, y),
+                             control_cmds.Return(w)])
+
+    def test_propagate_copies_in_block(self):
+        """Test that a copy is propagated while neither value is output again."""
+        x, y, z, w = [ILValue(ctypes.integer) for _ in range(4)]
+        commands = [value_cmds.LoadArg(x, 0),
+                    value_cmds.Set(y, x),
+                    math_cmds.Add(z, y, y),
+                    value_cmds.Set(x, self.literal(1)),
+                    math_cmds.Add(w, y, z),
+                    control_cmds.Return(w)]
+
+        self.assertCommands(self.optimizer.propagate_copies(commands),
+                            commands[:2] + [math_cmds.Add(z, x, x)] + commands[3:])
+
+    def test_coalesce_copies(self):
+        """Test that a Set from a value used nowhere else is coalesced with the command which outputs that value, but
+        not if the value is used again or if the command reads the value set.
+        """
+        a, b, t, x, r = [ILValue(ctypes.integer) for _ in range(5)]
+        args = [value_cmds.LoadArg(a, 0), value_cmds.LoadArg(b, 1), value_cmds.LoadArg(x, 2)]
+
+        commands = args + [math_cmds.Add(t, a, b), value_cmds.Set(x, t), control_cmds.Return(x)]
+        self.assertCommands(self.optimizer.coalesce_copies(commands),
+                            args + [math_cmds.Add(x, a, b), control_cmds.Return(x)])
+
+        commands = args + [math_cmds.Add(t, a, b), value_cmds.Set(x, t), math_cmds.Add(r, t, x),
+                           control_cmds.Return(r)]
+        self.assertCommands(self.optimizer.coalesce_copies(commands), commands)
+
+        commands = args + [math_cmds.Add(t, x, b), value_cmds.Set(x, t), control_cmds.Return(x)]
+        self.assertCommands(self.optimizer.coalesce_copies(commands), commands)
+
+    def test_number_values(self):
+        """Test that a pure command or AddrRel which computes the same expression as one before it in the block, into a
+        value which still holds the result, becomes a Set from that value.
+        """
+        a, b, t1, t2, t3, t4 = [ILValue(ctypes.integer) for _ in range(6)]
+        i, arr = ILValue(ctypes.longint), ILValue(ctypes.ArrayCType(ctypes.integer, 4))
+        p1, p2 = ILValue(ctypes.PointerCType(ctypes.integer)), ILValue(ctypes.PointerCType(ctypes.integer))
+        commands = [value_cmds.LoadArg(a, 0),
+                    value_cmds.LoadArg(b, 1),
+                    value_cmds.LoadArg(i, 2),
+                    math_cmds.Mult(t1, a, b),
+                    math_cmds.Mult(t2, b, a),
+                    value_cmds.AddrRel(p1, arr, 4, i),
+                    value_cmds.AddrRel(p2, arr, 4, i),
+                    value_cmds.Set(t1, self.literal(0)),
+                    math_cmds.Mult(t3, a, b),
+                    value_cmds.LoadArg(a, 3),
+                    math_cmds.Mult(t4, a, b),
+                    control_cmds.Return(t4)]
+
+        self.assertCommands(self.optimizer.number_values(commands),
+                            commands[:4] + [value_cmds.Set(t2, t1), commands[5], value_cmds.Set(p2, p1)] + commands[7:])
+
+    def test_scratch_register(self):
+        """Test that registers are allocated to optimized code in which every register holds a live value at a command
+        which needs one for scratch, by spilling a value.
+        """
+        il_code, symbol_table = make_il(SCRATCH_AFTER_COPY_PROPAGATION)
+        ILOptimizer(il_code, symbol_table).optimize()
+
+        (allocation,) = ASMGen(il_code, symbol_table, ASMCode(), MockArguments()).make_asm()
+        self.assertEqual(len(allocation.spilled), 1)
+        self.assertNoIssues()
@@ -1,8 +1,11 @@
 """Tests for the lexer phase of the compiler."""
 
+import os
+import tempfile
+
 import lexer
 import token_kinds
-from errors import error_collector
+from errors import error_collector, Source
 from tokens import Token
 from tests.test_utils import TestUtils
 
@@ -70,6 +73,17 @@ class LexerTests(TestUtils):
              Token(token_kinds.twoequals),
              Token(token_kinds.number, "10")])
 
+    def test_longest_symbol(self):
+        """Test that the lexer matches the longest symbol first."""
+        self.assertEqual(
+            lexer.tokenize("a+++b->c", ""),
+            [Token(token_kinds.identifier, "a"),
+             Token(token_kinds.incr),
+             Token(token_kinds.plus),
+             Token(token_kinds.identifier, "b"),
+             Token(token_kinds.arrow),
+             Token(token_kinds.identifier, "c")])
+
     def test_simple_string(self):
         """Test tokenizing simple string."""
         self.assertEqual(
@@ -109,3 +123,61 @@ class LexerTests(TestUtils):
                   Token(token_kinds.number, "15"),
                   Token(token_kinds.semicolon), Token(token_kinds.close_brack)]
         self.assertEqual(lexer.tokenize(content, ""), tokens)
+
+    def test_iter_tokens(self):
+        """Test that iter_tokens generates the same tokens as tokenize."""
+        content = "int a = 1;\nchar *b = \"x\\\n y\"; /* c\n d */ e;"
+        tokens = lexer.iter_tokens(content, "")
+        self.assertNotIsInstance(tokens, list)
+        self.assertEqual(list(tokens), lexer.tokenize(content, ""))
+
+    def test_token_window(self):
+        """Test reading and releasing tokens through a TokenWindow."""
+        window = lexer.TokenWindow(lexer.iter_tokens("a b\nc", ""))
+        self.assertEqual(window[1], Token(token_kinds.identifier, "b"))
+        self.assertEqual(len(window.buffer), 2)
+        self.assertTrue(window.has(2))
+        self.assertFalse(window.has(3))
+
+        window.release(2)
+        self.assertEqual(window[2], Token(token_kinds.identifier, "c"))
+        self.assertEqual(len(window), 3)
+        with self.assertRaises(IndexError): window[0]
+
+    def test_stop_at_errors(self):
+        """Test that stop_at_errors stops generating tokens at the first lexer error, after collecting every error."""
+        tokens = lexer.stop_at_errors(lexer.iter_tokens("a b\nc @\nd\ne @", ""))
+        self.assertEqual(next(tokens), Token(token_kinds.identifier, "a"))
+        self.assertEqual(next(tokens), Token(token_kinds.identifier, "b"))
+        with self.assertRaises(lexer.LexerFailed): next(tokens)
+        self.assertEqual([issue.span.start.line for issue in error_collector.issues], [2, 4])
+
+        error_collector.clear()
+        self.assertEqual(list(lexer.stop_at_errors(lexer.iter_tokens("a b", ""))), lexer.tokenize("a b", ""))
+
+    def test_token_range(self):
+        """Test the positions computed from the range of a token."""
+        tokens = lexer.tokenize("a\n  bc", "file.c")
+        start, end = tokens[1].r.start, tokens[1].r.end
+        self.assertEqual((start.file, start.line, start.col), ("file.c", 2, 3))
+        self.assertEqual((end.line, end.col), (2, 4))
+        self.assertEqual(start.full_line, "  bc")
+        self.assertEqual((tokens[0].r + tokens[1].r).end.col, 4)
+
+        with self.assertRaises(AttributeError):
+            tokens[1].content = "a"
+
+    def test_source_file(self):
+        """Test tokenizing the Source of a file read from disk."""
+        content = "int a; /* é */\r\n  b = \"€\";\r\n"
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "file.c")
+            with open(filename, "w", encoding="utf-8", newline="") as c_file:
+                c_file.write(content)
+
+            tokens = lexer.tokenize(Source.read(filename), filename)
+            self.assertEqual(tokens, lexer.tokenize(content, filename))
+
+            start = tokens[-2].r.start
+            self.assertEqual((start.line, start.col), (2, 7))
+            self.assertEqual(start.full_line, '  b = "€";')
@@ -0,0 +1,87 @@
+"""Tests for the parsing modes of the parser."""
+
+import glob
+import sys
+import threading
+
+import lexer
+from errors import ErrorCollector, Range, Source
+from myparser.myparser import Parser
+from myparser.utils import PackratCache
+from tokens import Token
+from tests.test_utils import TestUtils
+
+
+def dump(item):
+    """Return given AST node as nested tuples of its class, attributes, tokens and ranges, which compare equal for
+    equal trees.
+    """
+    if isinstance(item, (list, tuple)): return tuple(dump(i) for i in item)
+    elif isinstance(item, Token): return "Token", item.kind, item.content, dump(item.r)
+    elif isinstance(item, Range): return item.start_offset, item.length
+    elif hasattr(item, "__dict__"):
+        return (type(item).__name__,) + tuple((attr, dump(val)) for attr, val in sorted(vars(item).items()))
+    else: return item
+
+
+class ParserTests(TestUtils):
+    """Tests that the parsing modes of the parser give the same trees and errors as the default mode."""
+
+    def setUp(self):
+        """Find the test programs, which include programs with parse errors. Programs on which the default parser
+        raises an exception are left out.
+        """
+        self.files = []
+        for filename in sorted(glob.glob("tests/feature_tests/*.c") + glob.glob("tests/frontend_tests/*.c")):
+            try: self.parse(filename)
+            except Exception: continue
+            self.files.append(filename)
+
+    def parse(self, filename, packrat=None, pratt=False):
+        """Parse given file with a new Parser, and return the dump of its tree and its errors."""
+        tokens = lexer.tokenize(Source.read(filename), filename)
+        errors = ErrorCollector()
+        root = Parser(packrat, pratt, errors).parse(tokens)
+        return dump(root), [str(issue) for issue in errors.issues]
+
+    def test_pratt_parse(self):
+        """Test that parsing binary operators by precedence climbing gives the same trees and errors."""
+        for filename in self.files:
+            with self.subTest(filename=filename):
+                self.assertEqual(self.parse(filename, pratt=True), self.parse(filename))
+
+    def test_packrat_parse(self):
+        """Test that memoizing parse results gives the same trees and errors, in both parsing modes."""
+        hits = 0
+        for filename in self.files:
+            for pratt in [False, True]:
+                with self.subTest(filename=filename, pratt=pratt):
+                    packrat = PackratCache()
+                    self.assertEqual(self.parse(filename, packrat, pratt), self.parse(filename, pratt=pratt))
+                    hits += packrat.hits
+
+        self.assertGreater(hits, 0)
+
+    def test_parse_in_threads(self):
+        """Test that Parsers running at the same time in separate threads do not share state."""
+        expected = {filename: self.parse(filename) for filename in self.files}
+        results = [{}, {}]
+        barrier = threading.Barrier(2)
+
+        def parse_all(files, packrat, result):
+            barrier.wait()
+            for filename in files:
+                result[filename] = self.parse(filename, PackratCache() if packrat else None)
+
+        threads = [threading.Thread(target=parse_all, args=(self.files, False, results[0])),
+                   threading.Thread(target=parse_all, args=(self.files[::-1], True, results[1]))]
+        # Switch threads as often as possible, so that the parses interleave
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(results, [expected, expected])
@@ -36,15 +36,22 @@ class Token:
         rep (str) - The string representation of this token. If not provided, the content parameter is used.
 
         r (Range) - Range of positions that this token covers.
+
+    Token objects are immutable.
     """
 
+    __slots__ = ("kind", "content", "rep", "r")
+
     def __init__(self, kind, content="", rep="", r=None):
         """ Initialize this token """
-        self.kind = kind
+        object.__setattr__(self, "kind", kind)
+
+        object.__setattr__(self, "content", content if content else str(kind))
+        object.__setattr__(self, "rep", rep)
+        object.__setattr__(self, "r", r)
 
-        self.content = content if content else str(self.kind)
-        self.rep = rep
-        self.r = r
+    def __setattr__(self, name, value):
+        raise AttributeError("Token objects are immutable")
 
     def __eq__(self, other):
         """ Require equality of both token kind and content """
@@ -138,20 +138,15 @@ class Number(RExprNode):
         v = int(str(self.number))
 
         if ctypes.int_min <= v <= ctypes.int_max:
-            il_value = ILValue(ctypes.integer)
+            ctype = ctypes.integer
         elif ctypes.long_min <= v <= ctypes.long_max:
-            il_value = ILValue(ctypes.longint)
+            ctype = ctypes.longint
         else:
             err = "integer literal too large to be represented by any integer type"
             raise CompilerError(err, self.number.r)
 
-        il_code.register_literal_var(il_value, v)
-
         # Literal integer 0 is a null pointer constant
-        if v == 0:
-            il_value.null_ptr_const = True
-
-        return il_value
+        return il_code.get_literal(v, ctype, v == 0)
 
 
 class String(LExprNode):
@@ -238,9 +233,7 @@ class ArithBinOp(RExprNode):
                 try:
                     val = self.arith_const(shift_into_range(left.literal.val, left.ctype),
                                            shift_into_range(right.literal.val, right.ctype), left.ctype)
-                    out = ILValue(left.ctype)
-                    il_code.register_literal_var(out, val)
-                    return out
+                    return il_code.get_literal(val, left.ctype)
 
                 except NotImplementedError:
                     pass
@@ -402,8 +395,7 @@ class Minus(ArithBinOp, ABC):
 
             # Divide by size of object
             out = ILValue(ctypes.longint)
-            size = ILValue(ctypes.longint)
-            il_code.register_literal_var(size, str(left.ctype.arg.size))
+            size = il_code.get_literal(left.ctype.arg.size, ctypes.longint)
             il_code.add(math_cmds.Div(out, raw, size))
 
             return out
@@ -628,12 +620,10 @@ class BoolAndOr(RExprNode):
         out = ILValue(ctypes.integer)
 
         # ILValue for initial value of output variable.
-        init = ILValue(ctypes.integer)
-        il_code.register_literal_var(init, self.initial_value)
+        init = il_code.get_literal(self.initial_value, ctypes.integer)
 
         # ILValue for other value of output variable.
-        other = ILValue(ctypes.integer)
-        il_code.register_literal_var(other, 1 - self.initial_value)
+        other = il_code.get_literal(1 - self.initial_value, ctypes.integer)
 
         # Label which immediately precedes the line which sets out to 0 or 1.
         set_out = il_code.get_label()
@@ -804,11 +794,10 @@ class IncrDecr(RExprNode):
             raise CompilerError(err, self.expr.r)
 
         val = self.expr.make_il(il_code, symbol_table, c)
-        one = ILValue(val.ctype)
         if val.ctype.is_arith():
-            il_code.register_literal_var(one, 1)
+            one = il_code.get_literal(1, val.ctype)
         elif val.ctype.is_pointer() and val.ctype.arg.is_complete():
-            il_code.register_literal_var(one, val.ctype.arg.size)
+            one = il_code.get_literal(val.ctype.arg.size, val.ctype)
         elif val.ctype.is_pointer():
             err = "invalid arithmetic on pointer to incomplete type"
             raise CompilerError(err, self.expr.r)
@@ -879,14 +868,14 @@ class ArithUnOp(RExprNode):
         if expr.ctype.size < 4:
             expr = set_type(expr, ctypes.integer, il_code)
         if self.cmd:
-            out = ILValue(expr.ctype)
             # perform constant folding
             if expr.literal:
                 val = self.arith_const(expr.literal.val, expr.ctype)
                 val = shift_into_range(val, expr.ctype)
-                il_code.register_literal_var(out, val)
-            else:
-                il_code.add(self.cmd(out, expr))
+                return il_code.get_literal(val, expr.ctype)
+
+            out = ILValue(expr.ctype)
+            il_code.add(self.cmd(out, expr))
             return out
         return expr
 
@@ -949,12 +938,10 @@ class BoolNot(RExprNode):
         out = ILValue(ctypes.integer)
 
         # ILValue for zero.
-        zero = ILValue(ctypes.integer)
-        il_code.register_literal_var(zero, "0")
+        zero = il_code.get_literal(0, ctypes.integer)
 
         # ILValue for one.
-        one = ILValue(ctypes.integer)
-        il_code.register_literal_var(one, "1")
+        one = il_code.get_literal(1, ctypes.integer)
 
         # Label which skips the line which sets out to 0.
         end = il_code.get_label()
@@ -1146,8 +1133,7 @@ class ObjMember(ObjLookup):
         else:
             struct_addr = head_lv.addr(il_code)
 
-            shift = ILValue(ctypes.longint)
-            il_code.register_literal_var(shift, str(offset))
+            shift = il_code.get_literal(offset, ctypes.longint)
 
             out = ILValue(PointerCType(ctype))
             il_code.add(math_cmds.Add(out, struct_addr, shift))
@@ -1164,8 +1150,7 @@ class ObjPtrMember(ObjLookup):
             raise CompilerError(err, self.r)
 
         offset, ctype = self.get_offset_info(struct_addr.ctype.arg)
-        shift = ILValue(ctypes.longint)
-        il_code.register_literal_var(shift, str(offset))
+        shift = il_code.get_literal(offset, ctypes.longint)
 
         out = ILValue(PointerCType(ctype))
         il_code.add(math_cmds.Add(out, struct_addr, shift))
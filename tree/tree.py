@@ -6,7 +6,6 @@ import il_cmds.control as control_cmds
 import tree.decl_tree as decl_nodes
 import il_cmds.value as value_cmds
 from errors import CompilerError
-from il_gen import ILValue
 import token_kinds
 import ctypes
 
@@ -419,8 +418,7 @@ class DeclInfo:
 
         self.body.make_il(il_code, symbol_table, c, no_scope=True)
         if not il_code.always_returns() and is_main:
-            zero = ILValue(ctypes.integer)
-            il_code.register_literal_var(zero, 0)
+            zero = il_code.get_literal(0, ctypes.integer)
             il_code.add(control_cmds.Return(zero))
         elif not il_code.always_returns():
             il_code.add(control_cmds.Return(None))
@@ -151,9 +151,7 @@ class RelativeLValue(LValue):
 
         self.fixed_block = new_block
 
-        scale = ILValue(ctypes.longint)
-        scale_factor = str(int(self.block / new_block))
-        il_code.register_literal_var(scale, scale_factor)
+        scale = il_code.get_literal(int(self.block / new_block), ctypes.longint)
 
         self.fixed_count = ILValue(ctypes.longint)
         il_code.add(math_cmds.Mult(self.fixed_count, resized_count, scale))
@@ -247,11 +245,9 @@ def set_type(il_value, ctype, il_code, output=None):
     if not output and il_value.ctype.compatible(ctype): return il_value
     elif output == il_value: return il_value
     elif not output and il_value.literal:
-        output = ILValue(ctype)
         if ctype.is_integral(): val = shift_into_range(il_value.literal.val, ctype)
         else: val = il_value.literal.val
-        il_code.register_literal_var(output, val)
-        return output
+        return il_code.get_literal(val, ctype)
     else:
         if not output: output = ILValue(ctype)
         il_code.add(value_cmds.Set(output, il_value))
@@ -309,8 +305,7 @@ def get_size(ctype, num, il_code):
 
     long_num = set_type(num, ctypes.longint, il_code)
     total = ILValue(ctypes.longint)
-    size = ILValue(ctypes.longint)
-    il_code.register_literal_var(size, str(ctype.size))
+    size = il_code.get_literal(ctype.size, ctypes.longint)
     il_code.add(math_cmds.Mult(total, long_num, size))
 
     return total